@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+from trading.services import start_background_services  # noqa: E402 (precisa do Django configurado)
+
+start_background_services()
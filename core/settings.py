@@ -87,6 +87,93 @@ DATABASES = {
     'default': env.db('DATABASE_URL', default='sqlite:///db.sqlite3')
 }
 
+# Trading
+# Fan-out das operações para todas as contas (ver trading/executor.py)
+
+TRADING_FANOUT_MAX_WORKERS = env.int('TRADING_FANOUT_MAX_WORKERS', default=32)
+TRADING_ACCOUNT_TIMEOUT = env.float('TRADING_ACCOUNT_TIMEOUT', default=10.0)
+TRADING_BROADCAST_DEADLINE = env.float('TRADING_BROADCAST_DEADLINE', default=20.0)
+# Prazo total do close-all: contas que não fecharam até lá são reportadas como timeout
+TRADING_FLATTEN_DEADLINE = env.float('TRADING_FLATTEN_DEADLINE', default=5.0)
+# Leituras (saldo, posições) têm um pool próprio; com ele cheio, ou com ordens em andamento,
+# as views de leitura respondem do cache local em vez de consultar a Bybit
+TRADING_READ_FANOUT_MAX_WORKERS = env.int('TRADING_READ_FANOUT_MAX_WORKERS', default=8)
+TRADING_READ_LANE_MAX_PENDING = env.int('TRADING_READ_LANE_MAX_PENDING', default=256)
+TRADING_READS_YIELD_TO_WRITES = env.bool('TRADING_READS_YIELD_TO_WRITES', default=True)
+# Cache curto por conta das leituras de saldo e posições (get-balance/, get-positions/), com
+# coalescência de polls concorrentes e ETag; ?max_age=<s> escolhe a idade aceita até o máximo
+TRADING_READ_CACHE_TTL = env.float('TRADING_READ_CACHE_TTL', default=1.0)
+TRADING_READ_CACHE_MAX_AGE = env.float('TRADING_READ_CACHE_MAX_AGE', default=30.0)
+# Views assíncronas (trading/async_views.py): corrotinas não ocupam threads, o limite pode ser maior
+TRADING_ASYNC_FANOUT_MAX_CONCURRENCY = env.int('TRADING_ASYNC_FANOUT_MAX_CONCURRENCY', default=256)
+# Sinais de ordens divididos entre N processos, cada um dono das contas com pk % N (ver trading/shards.py);
+# 0 roda todas as contas no processo que recebeu o request
+TRADING_SHARDS = env.int('TRADING_SHARDS', default=0)
+# JSON dos sinais, das respostas e da Bybit (ver utils/fast_json.py): "orjson" ou "json" (biblioteca padrão);
+# sem o orjson instalado, usa "json"
+TRADING_JSON_BACKEND = env('TRADING_JSON_BACKEND', default='orjson')
+
+# Sessões da Bybit reaproveitadas por conta e aquecidas no start do wsgi/asgi (ver trading/sessions.py)
+TRADING_WARM_SESSIONS = env.bool('TRADING_WARM_SESSIONS', default=True)
+
+# Saldos atualizados em segundo plano para dimensionar ordens sem consultar a carteira (ver trading/account_state.py)
+# 0 desliga a atualização; saldos mais velhos que TRADING_BALANCE_MAX_AGE são buscados na hora
+TRADING_BALANCE_REFRESH_INTERVAL = env.float('TRADING_BALANCE_REFRESH_INTERVAL', default=0)
+TRADING_BALANCE_MAX_AGE = env.float('TRADING_BALANCE_MAX_AGE', default=30.0)
+
+# Regras dos instrumentos (tickSize, qtyStep, limites) gravadas em InstrumentRule (ver trading/instruments.py)
+# 0 desliga a atualização periódica; símbolos fora da tabela são buscados na primeira ordem
+TRADING_INSTRUMENT_REFRESH_INTERVAL = env.float('TRADING_INSTRUMENT_REFRESH_INTERVAL', default=3600)
+
+# Streams privados da Bybit (posições e carteira) mantendo o estado local das contas (ver trading/streams.py)
+TRADING_ACCOUNT_STREAMS = env.bool('TRADING_ACCOUNT_STREAMS', default=False)
+TRADING_STREAM_SYNC_INTERVAL = env.float('TRADING_STREAM_SYNC_INTERVAL', default=60.0)
+TRADING_BYBIT_WS_URL = env('TRADING_BYBIT_WS_URL', default=None)
+
+# Endereço REST alternativo da Bybit (ex: servidor local de testes em trading/mock_bybit.py)
+TRADING_BYBIT_HTTP_URL = env('TRADING_BYBIT_HTTP_URL', default=None)
+
+# Limites de requisições da Bybit por IP e por conta (ver trading/rate_limit.py)
+TRADING_RATE_LIMIT = env.bool('TRADING_RATE_LIMIT', default=True)
+TRADING_IP_RATE_LIMIT = env.int('TRADING_IP_RATE_LIMIT', default=600)
+TRADING_IP_RATE_WINDOW = env.float('TRADING_IP_RATE_WINDOW', default=5.0)
+# Fração da cota do IP que leituras (saldo, posições) não podem usar: fica para ordens
+TRADING_RATE_LIMIT_READ_RESERVE = env.float('TRADING_RATE_LIMIT_READ_RESERVE', default=0.2)
+# Menor que o recv_window (5s) da assinatura: esperar mais faria a Bybit recusar a requisição
+TRADING_RATE_LIMIT_MAX_WAIT = env.float('TRADING_RATE_LIMIT_MAX_WAIT', default=4.0)
+
+# Retries de ordens com orderLinkId (ver TradingApi._send_order)
+TRADING_ORDER_RETRIES = env.int('TRADING_ORDER_RETRIES', default=3)
+TRADING_ORDER_RETRY_DEADLINE = env.float('TRADING_ORDER_RETRY_DEADLINE', default=5.0)
+TRADING_ORDER_RETRY_BACKOFF = env.float('TRADING_ORDER_RETRY_BACKOFF', default=0.2)
+
+# Ordens dimensionadas e assinadas para todas as contas antes do primeiro envio (ver views._dispatch)
+TRADING_PRESIGNED_ORDERS = env.bool('TRADING_PRESIGNED_ORDERS', default=True)
+# Contas com saldo recente no AccountBook são dimensionadas juntas, em uma passada NumPy (ver trading/sizing.py)
+TRADING_BATCH_SIZING = env.bool('TRADING_BATCH_SIZING', default=True)
+
+# Dry-run de todas as views de broadcast: ordens vão para o MatchingEngine de trading/simulation.py
+# em vez da Bybit (por request: ?dry_run=1)
+TRADING_DRY_RUN = env.bool('TRADING_DRY_RUN', default=False)
+
+# Fila de sinais no banco (ver trading/jobs.py e o comando run_signal_worker)
+TRADING_JOB_BATCH_SIZE = env.int('TRADING_JOB_BATCH_SIZE', default=100)
+# Maior que TRADING_BROADCAST_DEADLINE: um lote termina antes de a reserva vencer
+TRADING_JOB_LEASE = env.float('TRADING_JOB_LEASE', default=60.0)
+TRADING_JOB_MAX_ATTEMPTS = env.int('TRADING_JOB_MAX_ATTEMPTS', default=3)
+TRADING_JOB_POLL_INTERVAL = env.float('TRADING_JOB_POLL_INTERVAL', default=0.5)
+# Worker da fila dentro do processo servidor (wsgi/asgi), sem rodar o comando à parte
+TRADING_JOB_WORKER = env.bool('TRADING_JOB_WORKER', default=False)
+
+# Histórico de ordens e execuções (ver trading/history.py)
+TRADING_HISTORY = env.bool('TRADING_HISTORY', default=True)
+# Grava em uma thread própria, depois da resposta; False grava na thread do request
+TRADING_HISTORY_BACKGROUND = env.bool('TRADING_HISTORY_BACKGROUND', default=True)
+
+# Cache de dados de mercado compartilhado (ver trading/market_data.py)
+TRADING_TICKER_TTL = env.float('TRADING_TICKER_TTL', default=0.5)
+TRADING_INSTRUMENT_TTL = env.float('TRADING_INSTRUMENT_TTL', default=3600.0)
+
 JAZZMIN_SETTINGS = {
     "site_title": "Bybit Genius",
     "site_header": "Painel Bybit Genius",
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+from trading.services import start_background_services  # noqa: E402 (precisa do Django configurado)
+
+start_background_services()
@@ -0,0 +1,157 @@
+import threading
+import time
+
+from .exposure import ExposureAggregator
+
+
+class AccountState():
+    """
+    Estado local de uma conta: saldo USDT e posições abertas.
+
+    O saldo pode vir do atualizador periódico ou do stream de carteira; as posições
+    só são consideradas confiáveis enquanto a conta tem um stream privado conectado
+    e já sincronizado com um snapshot REST (`streaming`).
+
+    :param exposure: (ExposureAggregator) Recebe cada mudança de posições da conta.
+    """
+    def __init__(self, exposure: ExposureAggregator | None = None) -> None:
+        self._lock = threading.Lock()
+        self._exposure = exposure
+        self.balance = None
+        self.balance_at = None
+        self.positions = {}
+        self.positions_at = None
+        self.seeded = False
+        self.stream = None
+
+    @property
+    def streaming(self) -> bool:
+        """True se saldo e posições estão sendo mantidos pelo stream privado."""
+        return self.seeded and self.stream is not None and self.stream.is_connected()
+
+    def set_balance(self, balance: float) -> None:
+        with self._lock:
+            self.balance = float(balance)
+            self.balance_at = time.monotonic()
+
+    def get_balance(self, max_age: float | None = None) -> tuple | None:
+        """
+        Retorna o saldo conhecido e a idade dele em segundos.
+
+        Com o stream ativo o saldo é sempre aceito, porque a Bybit envia toda mudança;
+        sem stream, só é aceito se tiver no máximo `max_age` segundos.
+        :return: (tuple) (saldo, idade) ou None.
+        """
+        with self._lock:
+            if self.balance is None:
+                return None
+            age = time.monotonic() - self.balance_at
+            if max_age is not None and age > max_age and not self.streaming:
+                return None
+            return self.balance, age
+
+    def set_positions(self, positions: dict) -> None:
+        """Substitui todas as posições (snapshot), no formato de TradingApi.get_positions."""
+        with self._lock:
+            old, self.positions = self.positions, dict(positions)
+            if self._exposure is not None:
+                self._exposure.apply(old, self.positions, accounts=int(self.positions_at is None))
+            self.positions_at = time.monotonic()
+
+    def update_positions(self, positions: dict, closed: list) -> None:
+        """Aplica uma atualização parcial: posições alteradas e símbolos fechados."""
+        with self._lock:
+            touched = [*positions, *closed]
+            old = {symbol: self.positions[symbol] for symbol in touched if symbol in self.positions}
+            self.positions.update(positions)
+            for symbol in closed:
+                self.positions.pop(symbol, None)
+            if self._exposure is not None:
+                new = {symbol: self.positions[symbol] for symbol in touched if symbol in self.positions}
+                self._exposure.apply(old, new, accounts=int(self.positions_at is None))
+            self.positions_at = time.monotonic()
+
+    def detach(self) -> None:
+        """Tira as posições da conta da exposição agregada (conta saiu do AccountBook)."""
+        with self._lock:
+            if self._exposure is not None and self.positions_at is not None:
+                self._exposure.apply(self.positions, {}, accounts=-1)
+            self._exposure = None
+
+    def get_positions(self) -> dict:
+        with self._lock:
+            return {symbol: dict(position) for symbol, position in self.positions.items()}
+
+    def get_positions_snapshot(self) -> tuple | None:
+        """
+        Retorna as últimas posições conhecidas (do stream ou da última consulta REST)
+        e a idade delas em segundos, ou None se nunca foram lidas.
+        """
+        with self._lock:
+            if self.positions_at is None:
+                return None
+            positions = {symbol: dict(position) for symbol, position in self.positions.items()}
+            return positions, time.monotonic() - self.positions_at
+
+
+class AccountBook():
+    """
+    Estado local de todas as contas do processo, indexado pela pk do TradingUser.
+    Mantido fora do caminho crítico de um sinal.
+
+    `exposure` soma as posições conhecidas de todas as contas por símbolo (ver
+    trading/exposure.py), atualizado a cada mudança de posições de uma conta.
+    """
+    def __init__(self) -> None:
+        self._accounts = {}
+        self._lock = threading.Lock()
+        self.exposure = ExposureAggregator()
+
+    def account(self, pk) -> AccountState:
+        """Retorna o estado da conta, criando-o se necessário."""
+        state = self._accounts.get(pk)
+        if state is None:
+            with self._lock:
+                state = self._accounts.get(pk)
+                if state is None:
+                    state = self._accounts[pk] = AccountState(self.exposure)
+        return state
+
+    def set_balance(self, pk, balance: float) -> None:
+        self.account(pk).set_balance(balance)
+
+    def get_balance(self, pk, max_age: float | None = None) -> tuple | None:
+        """
+        Retorna o saldo conhecido da conta e a idade dele.
+
+        :param pk: Chave primária do TradingUser.
+        :param max_age: (float) Idade máxima aceita, em segundos. None aceita qualquer idade.
+        :return: (tuple) (saldo, idade em segundos) ou None se não houver saldo aceitável.
+        """
+        state = self._accounts.get(pk)
+        return None if state is None else state.get_balance(max_age)
+
+    def get_positions(self, pk) -> tuple | None:
+        """
+        Retorna as últimas posições conhecidas da conta e a idade delas.
+
+        :return: (tuple) (posições, idade em segundos) ou None.
+        """
+        state = self._accounts.get(pk)
+        return None if state is None else state.get_positions_snapshot()
+
+    def drop(self, pk) -> None:
+        with self._lock:
+            state = self._accounts.pop(pk, None)
+        if state is not None:
+            state.detach()
+
+    def clear(self) -> None:
+        with self._lock:
+            states = list(self._accounts.values())
+            self._accounts.clear()
+        for state in states:
+            state.detach()
+
+
+book = AccountBook()
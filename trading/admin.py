@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import TradingUser, Leverage
+from .models import InstrumentRule, Leverage, Order, SignalExecution, SignalJob, SignalTask, TradingUser
 
 # Register your models here.
 class TradingUserAdmin(admin.ModelAdmin):
@@ -22,5 +22,40 @@ class LeverageAdmin(admin.ModelAdmin):
 
     readonly_fields = ("updated_at",)
 
+class SignalTaskInline(admin.TabularInline):
+    model = SignalTask
+    fields = ("account", "status", "attempts", "error", "updated_at")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+class SignalJobAdmin(admin.ModelAdmin):
+    list_display = ("signal_id", "kind", "status", "total_tasks", "created_at", "finished_at")
+    list_filter = ("kind", "status", "created_at")
+    search_fields = ("signal_id",)
+
+    readonly_fields = ("created_at", "finished_at")
+    inlines = [SignalTaskInline]
+
+class SignalExecutionAdmin(admin.ModelAdmin):
+    list_display = ("signal_id", "kind", "symbol", "total_accounts", "successful", "created_at")
+    list_filter = ("kind", "symbol", "created_at")
+    search_fields = ("signal_id",)
+
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ("account", "kind", "symbol", "side", "qty", "status", "reconciled", "created_at")
+    list_filter = ("kind", "status", "symbol", "created_at")
+    search_fields = ("account__user__username", "symbol", "order_id", "order_link_id")
+    list_select_related = ("account__user",)
+
+class InstrumentRuleAdmin(admin.ModelAdmin):
+    list_display = ("symbol", "status", "tick_size", "qty_step", "min_order_qty", "min_notional", "updated_at")
+    list_filter = ("status",)
+    search_fields = ("symbol",)
+
 admin.site.register(TradingUser, TradingUserAdmin)
 admin.site.register(Leverage, LeverageAdmin)
+admin.site.register(SignalJob, SignalJobAdmin)
+admin.site.register(SignalExecution, SignalExecutionAdmin)
+admin.site.register(Order, OrderAdmin)
+admin.site.register(InstrumentRule, InstrumentRuleAdmin)
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class TradingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'trading'
+
+    def ready(self):
+        from django.conf import settings
+        from utils import fast_json
+        from . import sessions  # noqa: F401 (registra os signals do registro de sessões)
+
+        fast_json.use(settings.TRADING_JSON_BACKEND)
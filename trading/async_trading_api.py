@@ -0,0 +1,413 @@
+import asyncio
+import time
+import uuid
+import weakref
+from datetime import datetime as dt, timezone
+
+import httpx
+from django.conf import settings
+from pybit.exceptions import FailedRequestError, InvalidRequestError
+
+from utils import fast_json
+from utils.cache import AsyncTTLCache
+from . import rate_limit, timing
+from .instruments import instruments
+from .signing import RECV_WINDOW, auth_headers, encode_body, encode_query
+from .timing import stage
+from .trading_api import (
+    PreparedOrder, batch_chunks, batch_leg_order, batch_leg_results, calc_tp_sl, flatten_orders, flatten_results,
+    format_position,
+    is_duplicate_order, is_retryable, retry_delay, sent_order
+)
+
+
+def _event_hooks() -> dict:
+    hooks = timing.httpx_event_hooks()
+    if settings.TRADING_RATE_LIMIT:
+        for event, limit_hooks in rate_limit.httpx_event_hooks().items():
+            hooks[event] = limit_hooks + hooks[event]
+    return hooks
+
+
+def bybit_endpoint(demo: bool = False) -> str:
+    """URL base REST da Bybit (real ou demo), ou TRADING_BYBIT_HTTP_URL se configurada."""
+    if settings.TRADING_BYBIT_HTTP_URL:
+        return settings.TRADING_BYBIT_HTTP_URL
+    return "https://api-demo.bybit.com" if demo else "https://api.bybit.com"
+
+
+# ============================================================
+# Envia uma requisição à API v5 e trata retCode como o pybit
+# ============================================================
+async def _request(client: httpx.AsyncClient, method: str, path: str, params: dict,
+                   api_key: str | None = None, api_secret: str | None = None) -> dict:
+    """
+    Envia uma requisição (assinada se houver api_key) e retorna o JSON da resposta.
+    Erros seguem as exceções do pybit: FailedRequestError para HTTP != 200 e
+    InvalidRequestError para retCode != 0.
+    """
+    if method == "GET":
+        payload = encode_query(params)
+        url = f"{path}?{payload}" if payload else path
+        headers = auth_headers(api_key, api_secret, payload) if api_key else {}
+        response = await client.get(url, headers=headers)
+    else:
+        payload = encode_body(params)
+        headers = auth_headers(api_key, api_secret, payload) if api_key else {}
+        response = await client.post(path, content=payload, headers=headers)
+    return _check_response(response, method, path, payload)
+
+
+def _check_response(response: httpx.Response, method: str, path: str, payload: str) -> dict:
+    now = dt.now(timezone.utc).strftime("%H:%M:%S")
+    if response.status_code != 200:
+        raise FailedRequestError(
+            request=f"{method} {path}: {payload}", message="HTTP status code is not 200.",
+            status_code=response.status_code, time=now, resp_headers=response.headers
+        )
+    data = fast_json.loads(response.content)
+    if data.get("retCode"):
+        raise InvalidRequestError(
+            request=f"{method} {path}: {payload}", message=data["retMsg"],
+            status_code=data["retCode"], time=now, resp_headers=response.headers
+        )
+    return data
+
+
+class AsyncMarketData():
+    """
+    Versão asyncio do MarketData: ticker e informações do instrumento em cache,
+    compartilhados pelas contas de um mesmo event loop.
+    """
+    def __init__(self, demo: bool = False) -> None:
+        self._client = httpx.AsyncClient(
+            base_url=bybit_endpoint(demo), timeout=settings.TRADING_ACCOUNT_TIMEOUT, event_hooks=_event_hooks()
+        )
+        self._tickers = AsyncTTLCache()
+        self._instruments = AsyncTTLCache()
+
+    async def _first(self, path: str, symbol: str) -> dict:
+        data = await _request(self._client, "GET", path, {"category": "linear", "symbol": symbol})
+        return data["result"]["list"][0]
+
+    async def get_ticker(self, symbol: str) -> dict:
+        return await self._tickers.get(
+            symbol, settings.TRADING_TICKER_TTL, lambda: self._first("/v5/market/tickers", symbol)
+        )
+
+    async def get_instrument(self, symbol: str) -> dict:
+        return await self._instruments.get(
+            symbol, settings.TRADING_INSTRUMENT_TTL, lambda: self._first("/v5/market/instruments-info", symbol)
+        )
+
+
+_async_market_data = weakref.WeakKeyDictionary()
+
+
+def get_async_market_data(demo: bool = False) -> AsyncMarketData:
+    """Retorna o AsyncMarketData do event loop atual para o ambiente (real ou demo)."""
+    per_loop = _async_market_data.setdefault(asyncio.get_running_loop(), {})
+    if demo not in per_loop:
+        per_loop[demo] = AsyncMarketData(demo)
+    return per_loop[demo]
+
+
+class AsyncTradingApi():
+    """
+    Versão asyncio do TradingApi: mesmas operações e mesmos retornos, com um cliente
+    HTTP assíncrono (httpx) e assinatura própria das requisições, para que um processo
+    ASGI atenda muitas contas sem uma thread por chamada em andamento.
+
+    :param api_key: (str) Sua API key gerada na conta da Bybit.
+    :param api_secret: (str) Sua API secret gerada na conta da Bybit.
+    :param demo: (bool) Se True, usa o ambiente demo da Bybit.
+    :param timeout: (float) Tempo limite de cada requisição HTTP, em segundos.
+    :param state: (AccountState) Estado local da conta, como no TradingApi: saldo e posições
+        lidos da API são gravados nele, e com o stream privado ativo as posições vêm dele.
+    """
+    def __init__(self, api_key: str, api_secret: str, demo: bool = False, timeout: float = 10,
+                 state=None) -> None:
+        self._api_key = api_key
+        self._api_secret = api_secret
+        self._client = httpx.AsyncClient(
+            base_url=bybit_endpoint(demo), timeout=timeout,
+            limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=60), event_hooks=_event_hooks()
+        )
+        self._limiter = rate_limit.get_limiter() if settings.TRADING_RATE_LIMIT else None
+        self._market_data = get_async_market_data(demo)
+        self._state = state
+
+    async def _call(self, method: str, path: str, **params) -> dict:
+        return await _request(self._client, method, path, params, self._api_key, self._api_secret)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def ping(self) -> int:
+        try:
+            data = await _request(self._client, "GET", "/v5/market/time", {})
+            return int(data["result"]["timeSecond"])
+        except Exception as e:
+            raise RuntimeError(f"Erro ao conectar com a Bybit: {e}") from e
+
+    async def get_usdt_balance(self) -> float:
+        try:
+            with stage("balance"):
+                data = await self._call("GET", "/v5/account/wallet-balance", accountType="UNIFIED")
+            for coin in data["result"]["list"][0]["coin"]:
+                if coin["coin"] == "USDT":
+                    balance = float(coin["walletBalance"])
+                    if self._state is not None:
+                        self._state.set_balance(balance)
+                    return balance
+            raise RuntimeError("USDT balance not found")
+        except Exception as e:
+            raise RuntimeError(f"Erro ao obter saldo: {e}") from e
+
+    async def _get_symbol_price(self, symbol: str) -> float:
+        try:
+            with stage("ticker"):
+                return float((await self._market_data.get_ticker(symbol))["lastPrice"])
+        except Exception as e:
+            raise RuntimeError(f"Erro ao obter preço de {symbol}: {e}") from e
+
+    async def _get_symbol_info(self, symbol: str):
+        try:
+            with stage("instrument"):
+                return await instruments.aget(symbol, self._market_data)
+        except Exception as e:
+            raise RuntimeError(f"Erro ao obter informações do símbolo {symbol}: {e}") from e
+
+    async def _get_tp_sl(self, percent: float, symbol: str, profit: float, max_loss: float, side: str,
+                         leverage: int = 1, balance: float | None = None, sized=None) -> tuple:
+        try:
+            if sized is not None:
+                if isinstance(sized, Exception):
+                    raise sized
+                return sized
+            if balance is None:
+                balance, price, rule = await asyncio.gather(
+                    self.get_usdt_balance(), self._get_symbol_price(symbol), self._get_symbol_info(symbol)
+                )
+            else:
+                price, rule = await asyncio.gather(self._get_symbol_price(symbol), self._get_symbol_info(symbol))
+            with stage("sizing"):
+                return calc_tp_sl(balance, price, rule, percent, profit, max_loss, side, leverage)
+        except Exception as e:
+            raise RuntimeError(f"Erro ao calcular TP e SL: {e}") from e
+
+    async def set_leverage(self, leverage: str, symbol: str):
+        try:
+            return await self._call(
+                "POST", "/v5/position/set-leverage",
+                category="linear", symbol=symbol, buyLeverage=str(leverage), sellLeverage=str(leverage)
+            )
+        except Exception as e:
+            if "not modified" in str(e).lower():
+                return
+            raise RuntimeError(f"Erro ao setar alavancagem: {e}") from e
+
+    async def switch_position_mode(self, mode: int):
+        try:
+            return await self._call("POST", "/v5/position/switch-mode", category="linear", mode=mode)
+        except Exception as e:
+            raise RuntimeError(f"Erro ao mudar modo de posição: {e}") from e
+
+    async def _find_order(self, link_id: str) -> dict | None:
+        try:
+            data = await self._call("GET", "/v5/order/realtime", category="linear", orderLinkId=link_id)
+            orders = data["result"]["list"]
+            return orders[0] if orders else None
+        except Exception:
+            return None
+
+    def _sign_order(self, order: dict) -> httpx.Request:
+        """Monta a requisição assinada do /v5/order/create, sem enviá-la."""
+        payload = encode_body(order)
+        return self._client.build_request(
+            "POST", "/v5/order/create", content=payload,
+            headers=auth_headers(self._api_key, self._api_secret, payload)
+        )
+
+    async def _send_prepared(self, prepared: PreparedOrder) -> dict:
+        """Mesmas regras de TradingApi._send_prepared: a assinatura é conferida depois da vez no RateLimiter."""
+        if self._limiter is None:
+            return await self._send_signed(prepared.request)
+        await self._limiter.acquire_async(self._api_key, "/v5/order/create")
+        request = prepared.request if prepared.fresh(RECV_WINDOW) else self._sign_order(prepared.order)
+        request.extensions[rate_limit.ACQUIRED] = True
+        return await self._send_signed(request)
+
+    async def _send_signed(self, request: httpx.Request) -> dict:
+        response = await self._client.send(request)
+        return _check_response(response, request.method, request.url.path, request.content.decode())
+
+    async def _send_order(self, prepared: PreparedOrder | None = None, **order) -> dict:
+        """Mesmas regras de TradingApi._send_order; erros de transporte do httpx também são repetidos."""
+        link_id = order["orderLinkId"]
+        deadline = time.monotonic() + settings.TRADING_ORDER_RETRY_DEADLINE
+        attempt = 1
+        while True:
+            try:
+                if attempt == 1 and prepared is not None and prepared.fresh(RECV_WINDOW):
+                    data = await self._send_prepared(prepared)
+                else:
+                    data = await self._call("POST", "/v5/order/create", **order)
+                return sent_order(data["result"]["orderId"], link_id, attempt, False)
+            except Exception as e:
+                if is_duplicate_order(e):
+                    existing = await self._find_order(link_id)
+                    return sent_order(existing and existing["orderId"], link_id, attempt, True)
+                delay = retry_delay(attempt - 1)
+                if not (is_retryable(e) or isinstance(e, httpx.TransportError)) \
+                        or attempt > settings.TRADING_ORDER_RETRIES or time.monotonic() + delay > deadline:
+                    raise
+            await asyncio.sleep(delay)
+            existing = await self._find_order(link_id)
+            if existing is not None:
+                return sent_order(existing["orderId"], link_id, attempt, True)
+            attempt += 1
+
+    async def prepare_order_tp_sl(self, percent: float, symbol: str, profit: float, max_loss: float,
+                                  side: str, leverage: int = 1, balance: float | None = None,
+                                  order_link_id: str | None = None, sign: bool = True,
+                                  sized=None) -> PreparedOrder:
+        try:
+            qty, tp, sl, amount = await self._get_tp_sl(
+                percent, symbol, profit, max_loss, side, leverage, balance, sized
+            )
+            order = {
+                "category": "linear", "symbol": symbol, "side": side, "orderType": "Market", "qty": qty,
+                "takeProfit": tp, "stopLoss": sl, "timeInForce": "GoodTillCancel",
+                "orderLinkId": order_link_id or uuid.uuid4().hex,
+            }
+            request = None
+            if sign:
+                with stage("sign"):
+                    request = self._sign_order(order)
+            return PreparedOrder(order, {"qty": qty, "tp": tp, "sl": sl, "order_amount": amount}, request)
+        except Exception as e:
+            raise RuntimeError(f"Erro ao colocar ordem: {e}") from e
+
+    async def send_order(self, prepared: PreparedOrder) -> dict:
+        try:
+            with stage("order_submit"):
+                sent = await self._send_order(prepared, **prepared.order)
+            return {**prepared.sized, **sent}
+        except Exception as e:
+            raise RuntimeError(f"Erro ao colocar ordem: {e}") from e
+
+    async def place_order_tp_sl(self, percent: float, symbol: str, profit: float, max_loss: float,
+                                side: str, leverage: int = 1, balance: float | None = None,
+                                order_link_id: str | None = None) -> dict:
+        return await self.send_order(await self.prepare_order_tp_sl(
+            percent, symbol, profit, max_loss, side, leverage, balance, order_link_id, False
+        ))
+
+    async def _leg_order(self, leg: dict, leverages: dict, balance: float, link_id: str | None = None) -> tuple:
+        if leg["symbol"] not in leverages:
+            raise ValueError("Leverage matching query does not exist.")
+        price, rule = await asyncio.gather(
+            self._get_symbol_price(leg["symbol"]), self._get_symbol_info(leg["symbol"])
+        )
+        return batch_leg_order(leg, balance, price, rule, leverages[leg["symbol"]], link_id)
+
+    async def place_batch_order_tp_sl(self, legs: list, leverages: dict, balance: float | None = None,
+                                      link_ids: list | None = None) -> list:
+        try:
+            if balance is None:
+                balance = await self.get_usdt_balance()
+        except Exception as e:
+            raise RuntimeError(f"Erro ao colocar ordens em lote: {e}") from e
+
+        results = [None] * len(legs)
+        orders = []
+        sized_legs = await asyncio.gather(
+            *(self._leg_order(leg, leverages, balance, link_ids and link_ids[index]) for index, leg in enumerate(legs)),
+            return_exceptions=True
+        )
+        for index, (leg, sized) in enumerate(zip(legs, sized_legs)):
+            if isinstance(sized, Exception):
+                results[index] = {"symbol": leg["symbol"], "side": leg["side"], "error": str(sized)}
+            else:
+                orders.append((index, *sized))
+
+        await self._send_batch(orders, results, "Erro ao colocar ordens em lote")
+        return results
+
+    async def _send_batch(self, orders: list, results: list, error: str) -> None:
+        """Versão de TradingApi._send_batch com os lotes enviados ao mesmo tempo."""
+        async def send(chunk):
+            try:
+                with stage("order_submit"):
+                    response = await self._call(
+                        "POST", "/v5/order/create-batch", category="linear", request=[order for _, order, _ in chunk]
+                    )
+                for index, result in batch_leg_results(chunk, response):
+                    results[index] = result
+            except Exception as e:
+                for index, order, _ in chunk:
+                    results[index] = {"symbol": order["symbol"], "side": order["side"], "error": f"{error}: {e}"}
+
+        await asyncio.gather(*(send(chunk) for chunk in batch_chunks(orders)))
+
+    async def _positions(self) -> dict:
+        """Mesmas regras de TradingApi._positions: do estado local com o stream privado ativo, senão da API."""
+        if self._state is not None and self._state.streaming:
+            return self._state.get_positions()
+        positions = await self._fetch_positions()
+        if self._state is not None and not self._state.streaming:
+            self._state.set_positions(positions)  # snapshot para leituras servidas do cache
+        return positions
+
+    async def _fetch_positions(self) -> dict:
+        data = await self._call("GET", "/v5/position/list", category="linear", settleCoin="USDT")
+        return {order["symbol"]: format_position(order) for order in data["result"]["list"] if order["side"]}
+
+    async def get_positions(self):
+        try:
+            positions = await self._positions()
+            if not positions:
+                return "Não há posições abertas."
+            return positions
+        except Exception as e:
+            raise RuntimeError(f"Erro ao obter posições: {e}") from e
+
+    async def close_order(self, symbol: str, order_link_id: str | None = None) -> dict:
+        try:
+            with stage("positions"):
+                order = (await self._positions()).get(symbol, False)
+            if not order:
+                raise ValueError(f"Não há posição para {symbol}")
+            order_side = "Buy" if order["side"].lower() == "sell" else "Sell"
+            with stage("order_submit"):
+                sent = await self._send_order(
+                    category="linear", symbol=symbol, side=order_side, orderType="Market",
+                    qty=order["qty"], reduceOnly=True, orderLinkId=order_link_id or uuid.uuid4().hex
+                )
+            return {**order, **sent}
+        except Exception as e:
+            raise RuntimeError(f"Erro ao fechar ordem: {e}") from e
+
+    async def close_all(self, link_id=None) -> list:
+        try:
+            with stage("positions"):
+                positions = await self._positions()
+        except Exception as e:
+            raise RuntimeError(f"Erro ao fechar posições: {e}") from e
+
+        orders = flatten_orders(positions, link_id)
+        results = [None] * len(orders)
+        await self._send_batch(orders, results, "Erro ao fechar posições")
+        return flatten_results(orders, results)
+
+    async def change_tp_sl(self, symbol: str, tp: str | None, sl: str | None) -> dict:
+        try:
+            with stage("tp_sl_submit"):
+                return await self._call(
+                    "POST", "/v5/position/trading-stop",
+                    category="linear", symbol=symbol, takeProfit=tp, stopLoss=sl,
+                    tpTriggerBy="LastPrice", slTriggerBy="LastPrice"
+                )
+        except Exception as e:
+            raise RuntimeError(f"Erro ao configurar TP e SL: {e}") from e
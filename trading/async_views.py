@@ -0,0 +1,312 @@
+# pylint: disable=no-member
+
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+from utils.fast_json import JsonResponse
+from utils.request_methods import post
+from .account_state import book
+from .async_trading_api import get_async_market_data
+from .executor import async_fan_out, async_iter_fan_out, check_deadline, reads_saturated
+from .instruments import instruments
+from .metrics import metrics
+from .models import TradingUser, Leverage, Order
+from .read_cache import async_read_cache, etag, invalidate, max_age, not_modified, snapshot
+from .sessions import async_sessions
+from .simulation import async_dry_run_sessions
+from .timing import stage, timed_view
+from .trading_api import order_link_id
+from .views import (
+    _balance_entry, _batch_entry, _cached_balance, _cached_balance_entry, _cached_positions,
+    _cached_positions_success, _completed, _dry_run, _encode_record, _entry, _flatten_entry, _instrument,
+    _invalid_legs, _known_balance, _load_instruments, _merge_prepare_timings, _not_modified, _presize,
+    _read_lane, _record_batch, _record_flatten, _record_orders, _save_leverages, _signal_id, _snapshot_entry,
+    _stream_format, _streaming_response, _summary, _timed_prepare
+)
+
+# Versões asyncio das views de trading.py, para rodar sob ASGI (uvicorn/daphne):
+# o fan-out entre as contas acontece no event loop, sem ocupar uma thread por chamada.
+
+async def _users(**filters):
+    with stage("orm_load"):
+        return [user async for user in TradingUser.objects.for_broadcast().filter(**filters)]
+
+async def _quotes(users, symbol):
+    """Versão asyncio de views._quotes."""
+    quotes = {}
+    for demo in {user.demo for user in users}:
+        market_data = get_async_market_data(demo)
+        try:
+            ticker = await market_data.get_ticker(symbol)
+            quotes[demo] = (float(ticker["lastPrice"]), await instruments.aget(symbol, market_data))
+        except Exception:
+            pass  # essas contas dimensionam sozinhas e reportam o erro
+    return quotes
+
+def _registry(request):
+    """Versão asyncio de views._registry."""
+    return async_dry_run_sessions if _dry_run(request) else async_sessions
+
+async def _dispatch(users, prepare, send):
+    """Versão asyncio de views._dispatch: `prepare` e `send` são corrotinas."""
+    deadline = settings.TRADING_BROADCAST_DEADLINE
+    if not settings.TRADING_PRESIGNED_ORDERS:
+        async def task(user):
+            return await send(user, await prepare(user))
+        return task, deadline
+
+    end = time.monotonic() + deadline
+    prepare, timings = _timed_prepare(prepare, asynchronous=True)
+    with stage("prepare"):
+        prepared = {
+            id(user): (value, error) for user, value, error in await async_fan_out(users, prepare, deadline=deadline)
+        }
+
+    async def task(user):
+        _merge_prepare_timings(timings, user)
+        value, error = prepared[id(user)]
+        if error is not None:
+            raise error
+        check_deadline(end, deadline)
+        return await send(user, value)
+    return task, max(end - time.monotonic(), 0.0)
+
+async def _respond(request, users, task, on_success=None, entry=None, on_complete=None, lane="write",
+                   deadline=None, conditional=False):
+    """Versão asyncio de views._respond; `on_complete` roda em uma thread (pode acessar o banco)."""
+    if entry is None:
+        entry = lambda user, value, error: _entry(user, value, error, on_success)
+    task, entry, timings = _instrument(request, task, entry, asynchronous=True)
+    stream = _stream_format(request)
+    dry_run = _dry_run(request)
+    if dry_run:
+        on_complete = None
+
+    if stream is None:
+        outcomes = await async_fan_out(users, task, deadline=deadline, lane=lane)
+        if lane == "write":
+            invalidate(users)
+        tag = etag(outcomes) if conditional and timings is None else None
+        if tag is not None and not_modified(request, tag):
+            return _not_modified(tag)
+        result = [entry(user, value, error) for user, value, error in outcomes]
+        if on_complete is not None:
+            await sync_to_async(on_complete)(list(zip(users, result)))
+        response = _completed(users, result, timings, dry_run)
+        if tag is not None:
+            response["ETag"] = tag
+        return response
+
+    async def content():
+        outcomes = []
+        async for user, value, error in async_iter_fan_out(users, task, deadline=deadline, lane=lane):
+            outcomes.append((user, entry(user, value, error)))
+            yield _encode_record(stream, "result", outcomes[-1][1])
+        if lane == "write":
+            invalidate(users)
+        if on_complete is not None:
+            await sync_to_async(on_complete)(outcomes)
+        yield _encode_record(stream, "completed", _summary(users, [r for _, r in outcomes], timings, dry_run))
+
+    return _streaming_response(stream, content())
+
+@timed_view
+async def get_balance_view(request):
+    if request.method != "GET":
+        return JsonResponse({"status": "error", "message": "Only GET allowed"}, status=405)
+
+    try:
+        ttl = max_age(request)
+    except ValueError as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    users = await _users()
+
+    registry = _registry(request)
+    cache = async_read_cache if registry is async_sessions else None
+    lane = _read_lane(cache, "balance", users, ttl)
+    if lane is not None and registry is async_sessions and reads_saturated():
+        metrics.increment("reads_served_from_cache_total", view="get_balance")
+
+        async def cached(user):
+            return _cached_balance(user)
+
+        return await _respond(request, users, cached, entry=_cached_balance_entry, lane=None)
+
+    async def task(user):
+        fetch = lambda: registry.get(user).get_usdt_balance()
+        return snapshot(await fetch()) if cache is None else await cache.get("balance", user, ttl, fetch)
+
+    return await _respond(request, users, task, entry=_snapshot_entry(_balance_entry, time.monotonic()), lane=lane,
+                          conditional=True)
+
+@csrf_exempt
+@timed_view
+async def place_order_view(request):
+    wanted_keys = ["percent", "symbol", "profit", "max_loss", "side"]
+    percent, symbol, profit, max_loss, side = post(request, wanted_keys)
+    users = await _users(is_active=True)
+    with stage("orm_load"):
+        leverages = await sync_to_async(Leverage.objects.by_user)(symbol)
+        await sync_to_async(_load_instruments)()
+    registry = _registry(request)
+    with stage("batch_sizing"):
+        # Em dry-run cada conta dimensiona com o saldo simulado
+        presized = {} if registry is not async_sessions else \
+            _presize(users, leverages, await _quotes(users, symbol), percent, profit, max_loss, side)
+    known_balance = _known_balance if registry is async_sessions else lambda user: (None, 0.0)
+    signal_id = _signal_id(request)
+
+    async def prepare(user):
+        if user.user_id not in leverages:
+            raise Leverage.DoesNotExist("Leverage matching query does not exist.")
+        balance, balance_age, sized = presized.get(user.pk) or (*known_balance(user), None)
+        return balance_age, await registry.get(user).prepare_order_tp_sl(
+            percent, symbol, profit, max_loss, side, leverages[user.user_id], balance,
+            order_link_id(signal_id, user.pk), sized=sized
+        )
+
+    async def send(user, prepared):
+        balance_age, order = prepared
+        order = await registry.get(user).send_order(order)
+        order["balance_age"] = round(balance_age, 3)
+        return order
+
+    task, deadline = await _dispatch(users, prepare, send)
+    params = {"percent": percent, "symbol": symbol, "profit": profit, "max_loss": max_loss, "side": side}
+    return await _respond(request, users, task, lambda user, order: {"message": order}, on_complete=_record_orders(
+        "place_order", signal_id, params, Order.OPEN, lambda entry: entry["message"]
+    ), deadline=deadline)
+
+@csrf_exempt
+@timed_view
+async def place_batch_order_view(request):
+    wanted_keys = ["legs"]
+    values = post(request, wanted_keys)
+    if isinstance(values, JsonResponse):
+        return values
+    legs = values[0]
+    invalid = _invalid_legs(legs)
+    if invalid:
+        return JsonResponse({"status": "error", "message": invalid}, status=400)
+    users = await _users(is_active=True)
+    with stage("orm_load"):
+        leverages = await sync_to_async(Leverage.objects.by_user_and_symbol)({leg["symbol"] for leg in legs})
+        await sync_to_async(_load_instruments)()
+    signal_id = _signal_id(request)
+    registry = _registry(request)
+
+    async def task(user):
+        known = book.get_balance(user.pk, settings.TRADING_BALANCE_MAX_AGE) if registry is async_sessions else None
+        balance = known[0] if known else None
+        link_ids = [order_link_id(signal_id, user.pk, leg) for leg in range(len(legs))]
+        return await registry.get(user).place_batch_order_tp_sl(
+            legs, leverages.get(user.user_id, {}), balance, link_ids
+        )
+
+    return await _respond(request, users, task, entry=_batch_entry, on_complete=_record_batch(signal_id, legs))
+
+@csrf_exempt
+@timed_view
+async def close_order_view(request):
+    wanted_keys = ["symbol"]
+    symbol = post(request, wanted_keys)[0]
+
+    users = await _users(is_active=True)
+    signal_id = _signal_id(request)
+    registry = _registry(request)
+
+    async def task(user):
+        order = await registry.get(user).close_order(
+            symbol=symbol, order_link_id=order_link_id(signal_id, user.pk)
+        )
+        order["PnL"] = order.pop("uPnL")
+        return order
+
+    return await _respond(request, users, task, lambda user, order: {
+        "message": "Order closed successfully.",
+        "details": order
+    }, on_complete=_record_orders("close_order", signal_id, {"symbol": symbol}, Order.CLOSE,
+                                  lambda entry: entry["details"]))
+
+@csrf_exempt
+@timed_view
+async def close_all_view(request):
+    if request.method != "POST":
+        return JsonResponse({"status": "error", "message": "Only POST allowed"}, status=405)
+
+    users = await _users(is_active=True)
+    signal_id = _signal_id(request)
+    registry = _registry(request)
+
+    async def task(user):
+        return await registry.get(user).close_all(lambda symbol: order_link_id(signal_id, user.pk, symbol))
+
+    return await _respond(request, users, task, entry=_flatten_entry, on_complete=_record_flatten(signal_id),
+                          deadline=settings.TRADING_FLATTEN_DEADLINE)
+
+@csrf_exempt
+@timed_view
+async def set_leverage_view(request):
+    wanted_keys = ["leverage", "symbol"]
+    leverage, symbol = post(request, wanted_keys)
+
+    users = await _users()
+    registry = _registry(request)
+
+    return await _respond(
+        request,
+        users,
+        lambda user: registry.get(user).set_leverage(leverage=leverage, symbol=symbol),
+        lambda user, response: {"message": f"Leverage successfully set to {leverage} for symbol {symbol}"},
+        on_complete=lambda outcomes: _save_leverages(outcomes, symbol, leverage)
+    )
+
+@csrf_exempt
+@timed_view
+async def update_tp_sl_view(request):
+    wanted_keys = ["symbol", "tp", "sl"]
+    symbol, tp, sl = post(request, wanted_keys)
+
+    users = await _users(is_active=True)
+    registry = _registry(request)
+
+    return await _respond(
+        request,
+        users,
+        lambda user: registry.get(user).change_tp_sl(symbol=symbol, tp=tp, sl=sl),
+        lambda user, response: {"message": f"TP/SL successfully updated to TP: {tp}, SL: {sl} for symbol {symbol}"},
+        on_complete=_record_orders("update_tp_sl", _signal_id(request), {"symbol": symbol, "tp": tp, "sl": sl},
+                                   Order.TP_SL, lambda entry: {"tp": tp, "sl": sl})
+    )
+
+@timed_view
+async def get_positions_view(request):
+    if request.method != "GET":
+        return JsonResponse({"status": "error", "message": "Only GET allowed"}, status=405)
+
+    try:
+        ttl = max_age(request)
+    except ValueError as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    users = await _users()
+
+    registry = _registry(request)
+    cache = async_read_cache if registry is async_sessions else None
+    lane = _read_lane(cache, "positions", users, ttl)
+    if lane is not None and registry is async_sessions and reads_saturated():
+        metrics.increment("reads_served_from_cache_total", view="get_positions")
+
+        async def cached(user):
+            return _cached_positions(user)
+
+        return await _respond(request, users, cached, _cached_positions_success, lane=None)
+
+    async def task(user):
+        fetch = lambda: registry.get(user).get_positions()
+        return snapshot(await fetch()) if cache is None else await cache.get("positions", user, ttl, fetch)
+
+    entry = lambda user, position, error: _entry(user, position, error, lambda user, position: {"message": position})
+    return await _respond(request, users, task, entry=_snapshot_entry(entry, time.monotonic()), lane=lane,
+                          conditional=True)
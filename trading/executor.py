@@ -0,0 +1,283 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+
+class AccountTimeoutError(RuntimeError):
+    """Conta não respondeu dentro do tempo limite por conta ou do prazo total."""
+
+
+def check_deadline(end: float, deadline: float) -> None:
+    """Levanta AccountTimeoutError se o prazo total (`deadline` segundos, até o time.monotonic() `end`) passou."""
+    if time.monotonic() >= end:
+        raise AccountTimeoutError(f"Prazo total excedido ({deadline}s)")
+
+
+# ============================================================
+# Pools de threads compartilhados entre todas as views, um por lane
+# ============================================================
+class Lane():
+    """
+    Pool de threads de um tipo de operação, com a contagem de tarefas em andamento.
+
+    Ordens ("write") e leituras ("read") têm pools separados: uma rajada de leituras
+    nunca ocupa as threads de que uma ordem precisa.
+    """
+    def __init__(self, name: str, max_workers: int) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"fanout-{name}")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Tarefas na fila ou em execução."""
+        return self._pending
+
+    def _add(self, delta: int) -> None:
+        with self._lock:
+            self._pending += delta
+
+    def submit(self, fn, *args):
+        self._add(1)
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(lambda _: self._add(-1))
+        return future
+
+    async def run(self, coroutine):
+        """Conta uma corrotina como tarefa em andamento da lane (fan-out assíncrono)."""
+        self._add(1)
+        try:
+            return await coroutine
+        finally:
+            self._add(-1)
+
+
+_lanes = {}
+_lanes_lock = threading.Lock()
+
+
+def _lane_workers(name: str) -> int:
+    if name == "read":
+        return settings.TRADING_READ_FANOUT_MAX_WORKERS
+    return settings.TRADING_FANOUT_MAX_WORKERS
+
+
+def get_lane(name: str = "write") -> Lane:
+    """
+    Retorna a lane do processo, criando-a na primeira chamada.
+
+    O tamanho do pool é o limite de concorrência: TRADING_FANOUT_MAX_WORKERS para
+    "write" e TRADING_READ_FANOUT_MAX_WORKERS para "read".
+    """
+    if name not in _lanes:
+        with _lanes_lock:
+            if name not in _lanes:
+                _lanes[name] = Lane(name, _lane_workers(name))
+    return _lanes[name]
+
+
+def get_executor(lane: str = "write") -> ThreadPoolExecutor:
+    """Retorna o pool de threads compartilhado da lane."""
+    return get_lane(lane).executor
+
+
+def reads_saturated() -> bool:
+    """
+    True se as leituras devem ser servidas do cache em vez de consultar a Bybit:
+    a lane de leitura passou de TRADING_READ_LANE_MAX_PENDING tarefas ou, com
+    TRADING_READS_YIELD_TO_WRITES, há ordens em andamento.
+    """
+    if get_lane("read").pending >= settings.TRADING_READ_LANE_MAX_PENDING:
+        return True
+    return settings.TRADING_READS_YIELD_TO_WRITES and get_lane("write").pending > 0
+
+
+# ============================================================
+# Executa uma tarefa para cada conta em paralelo
+# ============================================================
+def iter_fan_out(accounts, task, account_timeout: float | None = None, deadline: float | None = None,
+                 lane: str | None = "write"):
+    """
+    Executa `task(account)` para cada conta no pool compartilhado da lane e entrega
+    os resultados na ordem em que terminam.
+
+    Uma conta que passa de `account_timeout` segundos desde que começou a rodar, ou
+    que não terminou até o prazo total `deadline`, é reportada com AccountTimeoutError.
+    Threads já em execução não podem ser interrompidas; o timeout HTTP do TradingApi
+    é quem limita o tempo real que elas ficam presas.
+
+    :param accounts: (iterable) Contas (ex: TradingUser) a processar.
+    :param task: (callable) Função chamada com uma conta; não deve acessar o banco.
+    :param account_timeout: (float) Tempo máximo por conta, em segundos.
+    :param deadline: (float) Tempo máximo do fan-out inteiro, em segundos.
+    :param lane: (str) "write" ou "read". None roda as tarefas em sequência na thread
+        atual, sem limites de tempo (tarefas que não acessam a rede, ex: leitura de cache).
+    :return: (generator) tuplas (account, value, error).
+    """
+    if lane is None:
+        for account in accounts:
+            try:
+                yield account, task(account), None
+            except Exception as e:
+                yield account, None, e
+        return
+
+    if account_timeout is None:
+        account_timeout = settings.TRADING_ACCOUNT_TIMEOUT
+    if deadline is None:
+        deadline = settings.TRADING_BROADCAST_DEADLINE
+
+    lane = get_lane(lane)
+    end = time.monotonic() + deadline
+    started = {}
+
+    def run(index, account):
+        started[index] = time.monotonic()
+        return task(account)
+
+    futures = {}
+    for index, account in enumerate(accounts):
+        futures[lane.submit(run, index, account)] = (index, account)
+    pending = set(futures)
+
+    try:
+        while pending:
+            now = time.monotonic()
+            if now >= end:
+                break
+            timeout = end - now
+            for future in pending:
+                index = futures[future][0]
+                if index in started:
+                    timeout = min(timeout, started[index] + account_timeout - now)
+
+            done, pending = wait(pending, timeout=max(timeout, 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                account = futures[future][1]
+                try:
+                    yield account, future.result(), None
+                except Exception as e:
+                    yield account, None, e
+
+            now = time.monotonic()
+            expired = {
+                future for future in pending
+                if futures[future][0] in started and now - started[futures[future][0]] >= account_timeout
+            }
+            for future in expired:
+                yield futures[future][1], None, AccountTimeoutError(
+                    f"Tempo limite por conta excedido ({account_timeout}s)"
+                )
+            pending -= expired
+
+        for future in pending:
+            future.cancel()
+            yield futures[future][1], None, AccountTimeoutError(f"Prazo total excedido ({deadline}s)")
+    finally:
+        # Consumidor que parou antes do fim (ex: cliente do streaming desconectou): as contas
+        # que ainda não começaram não são executadas
+        for future in futures:
+            future.cancel()
+
+
+def fan_out(accounts, task, account_timeout: float | None = None, deadline: float | None = None,
+            lane: str | None = "write") -> list:
+    """
+    Igual a iter_fan_out, mas espera todas as contas e devolve os resultados na
+    mesma ordem das contas recebidas.
+
+    :return: (list) tuplas (account, value, error).
+    """
+    accounts = list(accounts)
+    position = {id(account): index for index, account in enumerate(accounts)}
+    results = list(iter_fan_out(accounts, task, account_timeout, deadline, lane))
+    results.sort(key=lambda item: position[id(item[0])])
+    return results
+
+
+# ============================================================
+# Versão asyncio do fan-out (views assíncronas)
+# ============================================================
+async def async_iter_fan_out(accounts, task, account_timeout: float | None = None, deadline: float | None = None,
+                             lane: str | None = "write"):
+    """
+    Executa a corrotina `task(account)` para cada conta no event loop atual, com no
+    máximo TRADING_ASYNC_FANOUT_MAX_CONCURRENCY em andamento ao mesmo tempo
+    (TRADING_READ_FANOUT_MAX_WORKERS na lane "read"), e entrega os resultados na
+    ordem em que terminam. Com `lane` None as tarefas rodam em sequência.
+
+    Mesmas regras de tempo de iter_fan_out: `account_timeout` conta a partir do início
+    da conta e `deadline` vale para o fan-out inteiro; aqui as chamadas são canceladas de fato.
+
+    :return: (async generator) tuplas (account, value, error).
+    """
+    if lane is None:
+        for account in accounts:
+            try:
+                yield account, await task(account), None
+            except Exception as e:
+                yield account, None, e
+        return
+
+    if account_timeout is None:
+        account_timeout = settings.TRADING_ACCOUNT_TIMEOUT
+    if deadline is None:
+        deadline = settings.TRADING_BROADCAST_DEADLINE
+
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    lane = get_lane(lane)
+    semaphore = asyncio.Semaphore(
+        settings.TRADING_READ_FANOUT_MAX_WORKERS if lane.name == "read" else settings.TRADING_ASYNC_FANOUT_MAX_CONCURRENCY
+    )
+
+    async def run(account):
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(task(account), account_timeout)
+            except asyncio.TimeoutError:
+                raise AccountTimeoutError(f"Tempo limite por conta excedido ({account_timeout}s)") from None
+
+    futures = {asyncio.ensure_future(lane.run(run(account))): account for account in accounts}
+    pending = set(futures)
+
+    try:
+        while pending:
+            timeout = end - loop.time()
+            if timeout <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    yield futures[future], None, future.exception()
+                else:
+                    yield futures[future], future.result(), None
+
+        for future in pending:
+            future.cancel()
+            yield futures[future], None, AccountTimeoutError(f"Prazo total excedido ({deadline}s)")
+    finally:
+        # Consumidor que parou antes do fim (aclose, cliente do streaming desconectou): as
+        # contas em andamento ou ainda na fila do semáforo são canceladas
+        for future in futures:
+            future.cancel()
+
+
+async def async_fan_out(accounts, task, account_timeout: float | None = None, deadline: float | None = None,
+                        lane: str | None = "write") -> list:
+    """
+    Igual a async_iter_fan_out, mas espera todas as contas e devolve os resultados
+    na mesma ordem das contas recebidas.
+
+    :return: (list) tuplas (account, value, error).
+    """
+    accounts = list(accounts)
+    position = {id(account): index for index, account in enumerate(accounts)}
+    results = [item async for item in async_iter_fan_out(accounts, task, account_timeout, deadline, lane)]
+    results.sort(key=lambda item: position[id(item[0])])
+    return results
@@ -0,0 +1,107 @@
+import threading
+from decimal import Decimal, InvalidOperation
+
+ZERO = Decimal(0)
+
+
+def _decimal(value) -> Decimal:
+    try:
+        return Decimal(str(value)) if value not in (None, "") else ZERO
+    except InvalidOperation:
+        return ZERO
+
+
+def _text(value: Decimal) -> str:
+    return f"{value.normalize():f}" if value else "0"
+
+
+class SymbolExposure():
+    """Totais de um símbolo somando todas as contas com posição aberta nele."""
+    __slots__ = ("accounts", "long_qty", "short_qty", "notional", "net_notional", "upnl")
+
+    def __init__(self) -> None:
+        self.accounts = 0
+        self.long_qty = ZERO
+        self.short_qty = ZERO
+        self.notional = ZERO
+        self.net_notional = ZERO
+        self.upnl = ZERO
+
+    def add(self, position: dict, sign: int) -> None:
+        """Soma (sign=1) ou tira (sign=-1) a contribuição de uma posição."""
+        qty, value = _decimal(position.get("qty")) * sign, _decimal(position.get("value")) * sign
+        if str(position.get("side", "")).lower() == "sell":
+            self.short_qty += qty
+            self.net_notional -= value
+        else:
+            self.long_qty += qty
+            self.net_notional += value
+        self.notional += value
+        self.upnl += _decimal(position.get("uPnL")) * sign
+        self.accounts += sign
+
+    def as_dict(self) -> dict:
+        return {
+            "accounts": self.accounts,
+            "long_qty": _text(self.long_qty),
+            "short_qty": _text(self.short_qty),
+            "net_qty": _text(self.long_qty - self.short_qty),
+            "notional": _text(self.notional),
+            "net_notional": _text(self.net_notional),
+            "uPnL": _text(self.upnl),
+        }
+
+
+# ============================================================
+# Exposição agregada de todas as contas, atualizada por diferença
+# ============================================================
+class ExposureAggregator():
+    """
+    Exposição líquida, valor, uPnL e número de contas por símbolo, somando as
+    posições conhecidas de todas as contas do AccountBook.
+
+    Cada mudança nas posições de uma conta (snapshot REST, atualização do stream
+    privado ou conta removida) tira a contribuição antiga dos símbolos afetados e soma
+    a nova: o custo é proporcional aos símbolos que mudaram, e ler os totais custa
+    O(símbolos), qualquer que seja o número de contas. Os valores são somados em
+    Decimal, então somar e tirar a mesma posição volta exatamente ao total anterior.
+    """
+    def __init__(self) -> None:
+        self._symbols = {}
+        self._accounts = 0
+        self._lock = threading.Lock()
+
+    def apply(self, old: dict, new: dict, accounts: int = 0) -> None:
+        """
+        Troca a contribuição de uma conta: `old` e `new` são as posições por símbolo
+        antes e depois da mudança (só os símbolos afetados; ausente = sem posição).
+
+        :param accounts: (int) +1 na primeira leitura de posições da conta, -1 quando
+            ela sai do AccountBook.
+        """
+        with self._lock:
+            self._accounts += accounts
+            for sign, positions in ((-1, old), (1, new)):
+                for symbol, position in positions.items():
+                    exposure = self._symbols.get(symbol)
+                    if exposure is None:
+                        exposure = self._symbols[symbol] = SymbolExposure()
+                    exposure.add(position, sign)
+                    if not exposure.accounts:
+                        del self._symbols[symbol]
+
+    def snapshot(self) -> dict:
+        """
+        :return: (dict) "accounts" (contas com posições conhecidas) e "symbols":
+            {symbol: totais} com quantidades e valores em string, como na Bybit.
+        """
+        with self._lock:
+            return {
+                "accounts": self._accounts,
+                "symbols": {symbol: exposure.as_dict() for symbol, exposure in sorted(self._symbols.items())},
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._symbols.clear()
+            self._accounts = 0
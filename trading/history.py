@@ -0,0 +1,136 @@
+import logging
+import queue
+import threading
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Order, SignalExecution
+
+logger = logging.getLogger(__name__)
+
+
+def _decimal(value) -> Decimal | None:
+    if value in (None, ""):
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        return None
+
+
+# ============================================================
+# Converte o resultado de uma conta em uma linha do histórico
+# ============================================================
+def order_row(account, kind: str, symbol: str, side: str = "", order: dict | None = None,
+              error=None) -> dict:
+    """
+    Monta a linha de Order de uma conta, sem acessar o banco.
+
+    :param account: (TradingUser) Conta.
+    :param kind: (str) Order.OPEN, Order.CLOSE ou Order.TP_SL.
+    :param order: (dict) Retorno de place_order_tp_sl, de close_order (posição fechada)
+        ou de uma perna de place_batch_order_tp_sl; para TP/SL, {"tp", "sl"}.
+    :param error: Erro da conta; None se deu certo.
+    :return: (dict) campos de Order.
+    """
+    order = order or {}
+    if kind == Order.CLOSE and order.get("side"):
+        # A ordem de fechamento é no lado oposto ao da posição
+        side = "Buy" if order["side"].lower() == "sell" else "Sell"
+    return {
+        "account": account,
+        "kind": kind,
+        "symbol": symbol,
+        "side": side or "",
+        "qty": _decimal(order.get("qty")),
+        "take_profit": _decimal(order.get("tp")) if kind != Order.CLOSE else None,
+        "stop_loss": _decimal(order.get("sl")) if kind != Order.CLOSE else None,
+        "order_amount": _decimal(order.get("order_amount")),
+        "order_id": order.get("order_id") or "",
+        "order_link_id": order.get("order_link_id") or "",
+        "reconciled": bool(order.get("reconciled")),
+        "status": Order.ERROR if error is not None else Order.SUCCESS,
+        "error": "" if error is None else str(error),
+    }
+
+
+# ============================================================
+# Grava um sinal inteiro com um INSERT por tabela
+# ============================================================
+def write(execution: dict, rows: list) -> SignalExecution:
+    """
+    Grava o SignalExecution e as Orders de um sinal em uma transação: dois INSERTs
+    (bulk_create), qualquer que seja o número de contas.
+    """
+    with transaction.atomic():
+        signal = SignalExecution.objects.create(**execution)
+        Order.objects.bulk_create([Order(execution=signal, created_at=signal.created_at, **row) for row in rows])
+    return signal
+
+
+class HistoryWriter():
+    """
+    Grava o histórico de ordens em uma thread própria, fora do caminho da resposta.
+
+    Os sinais entram em uma fila só depois do commit da transação atual (em autocommit,
+    na hora); dentro de uma transação que não chega a ser confirmada nada é gravado.
+    Com TRADING_HISTORY_BACKGROUND desligado, grava na própria thread (ex: testes).
+    """
+    def __init__(self) -> None:
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, execution: dict, rows: list) -> None:
+        if not settings.TRADING_HISTORY_BACKGROUND:
+            write(execution, rows)
+            return
+        transaction.on_commit(lambda: self._enqueue(execution, rows))
+
+    def _enqueue(self, execution, rows):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="order-history", daemon=True)
+                self._thread.start()
+        self._queue.put((execution, rows))
+
+    def _run(self):
+        while True:
+            execution, rows = self._queue.get()
+            try:
+                write(execution, rows)
+            except Exception as e:
+                logger.warning("Falha ao gravar histórico do sinal %s: %s", execution.get("signal_id"), e)
+            finally:
+                connection.close_if_unusable_or_obsolete()
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """Espera a gravação de tudo que já está na fila."""
+        self._queue.join()
+
+
+history = HistoryWriter()
+
+
+def record(kind: str, signal_id: str, params: dict, symbol: str, rows: list) -> None:
+    """
+    Envia ao histórico um sinal executado.
+
+    :param kind: (str) Tipo do sinal (ex: "place_order", "close_order").
+    :param rows: (list) Linhas montadas com order_row, uma por conta (ou perna).
+    """
+    if not settings.TRADING_HISTORY or not rows:
+        return
+    history.submit({
+        "signal_id": signal_id,
+        "kind": kind,
+        "symbol": symbol,
+        "params": params,
+        "total_accounts": len({row["account"].pk for row in rows}),
+        "successful": len([row for row in rows if row["status"] == Order.SUCCESS]),
+        "created_at": timezone.now(),
+    }, rows)
@@ -0,0 +1,170 @@
+import logging
+import threading
+from decimal import ROUND_DOWN, ROUND_HALF_UP, Decimal
+
+from django.utils import timezone
+
+from .models import InstrumentRule
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal("0.01")
+
+
+class InvalidOrderError(ValueError):
+    """Ordem recusada localmente pelas regras do instrumento, antes de chegar à Bybit."""
+
+
+def _decimal(value) -> Decimal | None:
+    return Decimal(str(value)) if value not in (None, "") else None
+
+
+def rule_from_info(info: dict) -> InstrumentRule:
+    """
+    Converte um item de get_instruments_info em InstrumentRule (sem gravar).
+
+    :param info: (dict) Item de result.list, com priceFilter e lotSizeFilter.
+    """
+    price_filter, lot_size = info["priceFilter"], info["lotSizeFilter"]
+    return InstrumentRule(
+        symbol=info["symbol"],
+        status=info.get("status", "Trading"),
+        tick_size=Decimal(price_filter["tickSize"]),
+        min_price=_decimal(price_filter.get("minPrice")),
+        max_price=_decimal(price_filter.get("maxPrice")),
+        qty_step=Decimal(lot_size["qtyStep"]),
+        min_order_qty=_decimal(lot_size.get("minOrderQty")) or Decimal(lot_size["qtyStep"]),
+        max_order_qty=_decimal(lot_size.get("maxOrderQty")),
+        max_mkt_order_qty=_decimal(lot_size.get("maxMktOrderQty")),
+        min_notional=_decimal(lot_size.get("minNotionalValue")),
+    )
+
+
+# ============================================================
+# Arredondamento com Decimal e validação local da ordem
+# ============================================================
+def to_step(value: Decimal, step: Decimal, rounding=ROUND_HALF_UP) -> Decimal:
+    """
+    Arredonda `value` para um múltiplo de `step` (ex: tickSize 0.5 ou qtyStep 0.001),
+    com as casas decimais do step (o banco devolve 0.0010000000; vale 0.001).
+    """
+    step = step.normalize()
+    return ((value / step).to_integral_value(rounding=rounding) * step).quantize(step)
+
+def round_qty(rule: InstrumentRule, qty: Decimal) -> Decimal:
+    """Quantidade para baixo no qtyStep: a ordem nunca passa do valor calculado."""
+    return to_step(qty, rule.qty_step, ROUND_DOWN)
+
+def round_price(rule: InstrumentRule, price: Decimal) -> Decimal:
+    """Preço (TP/SL) no múltiplo de tickSize mais próximo."""
+    return to_step(price, rule.tick_size)
+
+def validate_order(rule: InstrumentRule, qty: Decimal, price: Decimal, take_profit: Decimal | None = None,
+                   stop_loss: Decimal | None = None, market: bool = True) -> None:
+    """
+    Confere a ordem contra as regras do instrumento, como a Bybit faria.
+
+    :param price: (Decimal) Preço de referência (ticker) para o valor mínimo da ordem.
+    :param market: (bool) Ordem a mercado: vale o limite maxMktOrderQty.
+    :raises InvalidOrderError: com o motivo da recusa.
+    """
+    symbol = rule.symbol
+    if rule.status != "Trading":
+        raise InvalidOrderError(f"{symbol} não está em negociação ({rule.status})")
+    if qty < rule.min_order_qty:
+        raise InvalidOrderError(f"Quantidade {qty} abaixo do mínimo de {symbol} ({rule.min_order_qty})")
+    max_qty = (rule.max_mkt_order_qty if market else None) or rule.max_order_qty
+    if max_qty is not None and qty > max_qty:
+        raise InvalidOrderError(f"Quantidade {qty} acima do máximo de {symbol} ({max_qty})")
+    if rule.min_notional is not None and qty * price < rule.min_notional:
+        raise InvalidOrderError(
+            f"Valor da ordem {(qty * price).quantize(CENT)} abaixo do mínimo de {symbol} ({rule.min_notional} USDT)"
+        )
+    validate_prices(rule, take_profit, stop_loss)
+
+def validate_prices(rule: InstrumentRule, take_profit: Decimal | None, stop_loss: Decimal | None) -> None:
+    """Confere TP e SL contra a faixa de preço do instrumento (parte de validate_order)."""
+    for name, value in (("TP", take_profit), ("SL", stop_loss)):
+        if value is None:
+            continue
+        if value <= 0 or (rule.min_price is not None and value < rule.min_price) \
+                or (rule.max_price is not None and value > rule.max_price):
+            raise InvalidOrderError(f"{name} {value} fora da faixa de preço de {rule.symbol}")
+
+
+# ============================================================
+# Tabela de regras de todos os símbolos lineares
+# ============================================================
+class InstrumentTable():
+    """
+    Regras de todos os símbolos lineares em memória, para dimensionar ordens sem I/O.
+
+    A tabela vem do banco (InstrumentRule) uma vez por processo e é atualizada por
+    refresh(): uma busca paginada de get_instruments_info para todos os símbolos,
+    gravada em lote. Um símbolo que ainda não está na tabela (ex: listado desde o
+    último refresh) é buscado sozinho pelo MarketData e fica só em memória.
+    """
+    def __init__(self) -> None:
+        self._rules = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def get(self, symbol: str, market_data) -> InstrumentRule:
+        """
+        :param market_data: (MarketData) Usado só se o símbolo não estiver na tabela.
+        :return: (InstrumentRule) regras do símbolo.
+        """
+        rule = self._rules.get(symbol)
+        if rule is None:
+            rule = self._rules[symbol] = rule_from_info(market_data.get_instrument(symbol))
+        return rule
+
+    async def aget(self, symbol: str, market_data) -> InstrumentRule:
+        """Versão de get para o AsyncMarketData."""
+        rule = self._rules.get(symbol)
+        if rule is None:
+            rule = self._rules[symbol] = rule_from_info(await market_data.get_instrument(symbol))
+        return rule
+
+    def ensure_loaded(self) -> None:
+        """Carrega a tabela do banco na primeira chamada do processo (uma query)."""
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._rules = {**{rule.symbol: rule for rule in InstrumentRule.objects.all()}, **self._rules}
+                self._loaded = True
+
+    def refresh(self, market_data) -> int:
+        """
+        Busca as regras de todos os símbolos lineares, grava em lote (INSERT ... ON
+        CONFLICT UPDATE) e remove os símbolos que saíram da lista.
+
+        :param market_data: (MarketData) Fonte de get_instruments (paginado).
+        :return: (int) número de símbolos.
+        """
+        now = timezone.now()
+        rules = [rule_from_info(info) for info in market_data.get_instruments()]
+        for rule in rules:
+            rule.updated_at = now
+        InstrumentRule.objects.bulk_create(
+            rules, update_conflicts=True, unique_fields=["symbol"],
+            update_fields=[field.name for field in InstrumentRule._meta.concrete_fields
+                           if field.name not in ("id", "symbol")]
+        )
+        InstrumentRule.objects.filter(updated_at__lt=now).delete()
+        with self._lock:
+            self._rules = {rule.symbol: rule for rule in rules}
+            self._loaded = True
+        return len(rules)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._rules = {}
+            self._loaded = False
+
+
+instruments = InstrumentTable()
@@ -0,0 +1,241 @@
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .account_state import book
+from .executor import fan_out
+from .history import order_row, record
+from .models import Leverage, Order, SignalJob, SignalTask, TradingUser
+from .sessions import sessions
+from .trading_api import order_link_id
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# Execução de cada tipo de job em uma conta (roda no pool, sem acessar o banco)
+# ============================================================
+def _place_order(task):
+    params = task.job.params
+    if task.leverage is None:
+        raise Leverage.DoesNotExist("Leverage matching query does not exist.")
+    known = book.get_balance(task.account.pk, settings.TRADING_BALANCE_MAX_AGE)
+    return sessions.get(task.account).place_order_tp_sl(
+        params["percent"], params["symbol"], params["profit"], params["max_loss"], params["side"],
+        task.leverage, known[0] if known else None, order_link_id(task.job.signal_id, task.account.pk)
+    )
+
+def _close_order(task):
+    order = sessions.get(task.account).close_order(
+        task.job.params["symbol"], order_link_id(task.job.signal_id, task.account.pk)
+    )
+    order["PnL"] = order.pop("uPnL")
+    return order
+
+# Tipos de job: campos obrigatórios de params, função executada por conta e tipo da ordem no histórico
+JOB_KINDS = {
+    "place_order": (["percent", "symbol", "profit", "max_loss", "side"], _place_order, Order.OPEN),
+    "close_order": (["symbol"], _close_order, Order.CLOSE),
+}
+
+
+# ============================================================
+# Enfileira um sinal: um job e uma tarefa por conta ativa
+# ============================================================
+def enqueue_signal(kind: str, params: dict, signal_id: str) -> tuple:
+    """
+    Grava o sinal como SignalJob com uma SignalTask por conta ativa, em uma transação.
+
+    O signal_id é único: reenviar o mesmo sinal devolve o job existente em vez de
+    criar outro.
+
+    :param kind: (str) Tipo do job (chave de JOB_KINDS).
+    :param params: (dict) Parâmetros do sinal (ex: symbol, side, percent...).
+    :param signal_id: (str) Id do sinal; também é a base dos orderLinkId das ordens.
+    :return: (tuple) (SignalJob, True se foi criado agora).
+    """
+    with transaction.atomic():
+        job, created = SignalJob.objects.get_or_create(
+            signal_id=signal_id, defaults={"kind": kind, "params": params}
+        )
+        if not created:
+            return job, False
+
+        accounts = list(TradingUser.objects.filter(is_active=True).values_list("pk", "user_id"))
+        leverages = Leverage.objects.by_user(params["symbol"]) if kind == "place_order" else {}
+        SignalTask.objects.bulk_create([
+            SignalTask(job=job, account_id=pk, leverage=leverages.get(user_id)) for pk, user_id in accounts
+        ])
+        job.total_tasks = len(accounts)
+        if not accounts:
+            job.status, job.finished_at = SignalJob.COMPLETED, timezone.now()
+        job.save(update_fields=["total_tasks", "status", "finished_at"])
+    return job, True
+
+
+# ============================================================
+# Fila no banco: reserva, execução e conclusão das tarefas
+# ============================================================
+def claim_tasks(limit: int | None = None) -> list:
+    """
+    Reserva até `limit` tarefas pendentes para este worker por TRADING_JOB_LEASE segundos.
+
+    Tarefas "running" com a reserva vencida (worker reiniciado no meio da execução) voltam
+    para a fila; depois de TRADING_JOB_MAX_ATTEMPTS tentativas são marcadas como erro, vão
+    para o histórico e os seus jobs são concluídos se não restar tarefa em aberto.
+    Reexecutar uma tarefa é seguro: a ordem usa o mesmo orderLinkId e é reconciliada.
+
+    A reserva é um UPDATE condicional, então vários workers podem disputar a mesma fila
+    sem broker e sem SELECT ... FOR UPDATE.
+
+    :return: (list) SignalTasks reservadas, com job e conta (e User) carregados.
+    """
+    limit = limit or settings.TRADING_JOB_BATCH_SIZE
+    now = timezone.now()
+    stale = Q(status=SignalTask.RUNNING, lease_until__lt=now)
+    _abandon_tasks(stale, now)
+
+    claimable = Q(status=SignalTask.PENDING) | stale
+    token = uuid.uuid4().hex
+    ids = list(SignalTask.objects.filter(claimable).order_by("id").values_list("id", flat=True)[:limit])
+    if not ids:
+        return []
+    SignalTask.objects.filter(claimable, pk__in=ids).update(
+        status=SignalTask.RUNNING, claim=token, attempts=F("attempts") + 1, updated_at=now,
+        lease_until=now + timedelta(seconds=settings.TRADING_JOB_LEASE)
+    )
+    tasks = list(SignalTask.objects.filter(claim=token).select_related("job", "account__user"))
+    SignalJob.objects.filter(pk__in={task.job_id for task in tasks}, status=SignalJob.PENDING).update(
+        status=SignalJob.RUNNING
+    )
+    return tasks
+
+def _abandon_tasks(stale, now):
+    """
+    Marca como erro as tarefas vencidas sem tentativas restantes. O UPDATE grava um token
+    deste worker, então só quem marcou cada tarefa a envia ao histórico e conclui o seu job.
+    """
+    token = uuid.uuid4().hex
+    abandoned = SignalTask.objects.filter(stale, attempts__gte=settings.TRADING_JOB_MAX_ATTEMPTS).update(
+        status=SignalTask.ERROR, claim=token, lease_until=None, updated_at=now,
+        error=f"Tarefa abandonada após {settings.TRADING_JOB_MAX_ATTEMPTS} tentativas"
+    )
+    if not abandoned:
+        return
+    tasks = list(SignalTask.objects.filter(claim=token).select_related("job", "account__user"))
+    SignalTask.objects.filter(claim=token).update(claim="")
+    finish_jobs({task.job_id for task in tasks})
+    _record_history(tasks)
+
+def run_tasks(tasks: list) -> list:
+    """
+    Executa as tarefas reservadas em paralelo (lane "write") e grava os resultados
+    com um único bulk_update; depois conclui os jobs sem tarefas em aberto.
+
+    :return: (list) as mesmas tarefas, com status, result e error preenchidos.
+    """
+    for task, value, error in fan_out(tasks, lambda task: JOB_KINDS[task.job.kind][1](task)):
+        task.status = SignalTask.ERROR if error is not None else SignalTask.SUCCESS
+        task.result = value
+        task.error = "" if error is None else str(error)
+        task.claim, task.lease_until = "", None
+        task.updated_at = timezone.now()
+    SignalTask.objects.bulk_update(tasks, ["status", "result", "error", "claim", "lease_until", "updated_at"])
+    finish_jobs({task.job_id for task in tasks})
+    _record_history(tasks)
+    return tasks
+
+def _record_history(tasks):
+    """Envia ao histórico as tarefas executadas, um sinal por job."""
+    by_job = {}
+    for task in tasks:
+        by_job.setdefault(task.job_id, []).append(task)
+    for job_tasks in by_job.values():
+        job = job_tasks[0].job
+        symbol, side = job.params["symbol"], job.params.get("side", "")
+        record(job.kind, job.signal_id, job.params, symbol, [
+            order_row(task.account, JOB_KINDS[job.kind][2], symbol, side, task.result,
+                      task.error if task.status == SignalTask.ERROR else None)
+            for task in job_tasks
+        ])
+
+def finish_jobs(job_ids) -> int:
+    """Marca como concluídos os jobs de `job_ids` sem tarefas pendentes ou em execução."""
+    unfinished = SignalTask.objects.filter(status__in=[SignalTask.PENDING, SignalTask.RUNNING])
+    return SignalJob.objects.filter(pk__in=job_ids).exclude(status=SignalJob.COMPLETED).exclude(
+        pk__in=unfinished.values("job_id")
+    ).update(status=SignalJob.COMPLETED, finished_at=timezone.now())
+
+def work(limit: int | None = None) -> int:
+    """Reserva e executa um lote de tarefas. :return: (int) tarefas executadas."""
+    tasks = claim_tasks(limit)
+    if tasks:
+        run_tasks(tasks)
+    return len(tasks)
+
+
+# ============================================================
+# Progresso de um job
+# ============================================================
+def job_progress(job: SignalJob) -> dict:
+    """
+    :return: (dict) status do job e quantidade de tarefas por status.
+    """
+    counts = job.tasks.progress()
+    return {
+        "job_id": job.pk,
+        "signal_id": job.signal_id,
+        "kind": job.kind,
+        "status": job.status,
+        "total_tasks": job.total_tasks,
+        "done": counts[SignalTask.SUCCESS] + counts[SignalTask.ERROR],
+        "tasks": counts,
+    }
+
+
+# ============================================================
+# Worker: processa a fila até ser interrompido
+# ============================================================
+def run_worker(poll_interval: float | None = None, limit: int | None = None, once: bool = False,
+               stop: threading.Event | None = None) -> int:
+    """
+    Processa a fila em lotes; sem tarefas, espera `poll_interval` segundos.
+
+    :param once: (bool) Se True, volta assim que a fila estiver vazia.
+    :param stop: (threading.Event) Interrompe o loop quando setado.
+    :return: (int) total de tarefas executadas.
+    """
+    poll_interval = settings.TRADING_JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+    total = 0
+    while stop is None or not stop.is_set():
+        try:
+            done = work(limit)
+        except Exception as e:
+            logger.warning("Falha no worker de sinais: %s", e)
+            done = 0
+        finally:
+            connection.close_if_unusable_or_obsolete()
+        total += done
+        if not done:
+            if once:
+                break
+            time.sleep(poll_interval)
+    return total
+
+def start_job_worker() -> threading.Thread | None:
+    """
+    Inicia um worker da fila em uma thread do processo servidor, para rodar sem um
+    processo `run_signal_worker` separado. Não faz nada se TRADING_JOB_WORKER estiver desligado.
+    """
+    if not settings.TRADING_JOB_WORKER:
+        return None
+    thread = threading.Thread(target=run_worker, name="signal-worker", daemon=True)
+    thread.start()
+    return thread
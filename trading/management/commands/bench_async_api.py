@@ -0,0 +1,70 @@
+import asyncio
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from trading.async_trading_api import AsyncTradingApi
+from trading.executor import async_fan_out, fan_out
+from trading.market_data import reset_market_data
+from trading.mock_bybit import MockBybitServer
+from trading.trading_api import TradingApi
+
+
+class Command(BaseCommand):
+    help = "Compara o fan-out de place_order_tp_sl com TradingApi (threads) e AsyncTradingApi (asyncio) contra o mock local da Bybit."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--accounts", type=int, nargs="+", default=[10, 100, 500])
+        parser.add_argument("--latency", type=float, default=0.05, help="Latência do mock por requisição (s)")
+        parser.add_argument("--rounds", type=int, default=3)
+
+    def handle(self, *args, **options):
+        server = MockBybitServer(latency=options["latency"]).start()
+        try:
+            with override_settings(TRADING_BYBIT_HTTP_URL=server.url, TRADING_BROADCAST_DEADLINE=600,
+                                   TRADING_ACCOUNT_TIMEOUT=120, TRADING_RATE_LIMIT=False):
+                reset_market_data()
+                self.stdout.write(f"{'contas':>8} {'sync (s)':>10} {'async (s)':>10} {'ganho':>7}")
+                for count in options["accounts"]:
+                    sync_time = self._bench_sync(count, options["rounds"])
+                    async_time = asyncio.run(self._bench_async(count, options["rounds"]))
+                    self.stdout.write(
+                        f"{count:>8} {sync_time:>10.3f} {async_time:>10.3f} {sync_time / async_time:>6.1f}x"
+                    )
+                reset_market_data()
+        finally:
+            server.stop()
+
+    @staticmethod
+    def _order(api):
+        return api.place_order_tp_sl(1, "BTCUSDT", 2, 1, "Buy", 1, balance=1000)
+
+    def _bench_sync(self, count, rounds):
+        apis = [TradingApi(f"sync-{count}-{i}", "secret") for i in range(count)]
+        fan_out(apis, lambda api: api.ping())  # abre as conexões antes de medir
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            results = fan_out(apis, self._order)
+            timings.append(time.perf_counter() - start)
+            self._check(results)
+        return statistics.median(timings)
+
+    async def _bench_async(self, count, rounds):
+        apis = [AsyncTradingApi(f"async-{count}-{i}", "secret") for i in range(count)]
+        await async_fan_out(apis, lambda api: api.ping())
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            results = await async_fan_out(apis, self._order)
+            timings.append(time.perf_counter() - start)
+            self._check(results)
+        await asyncio.gather(*(api.aclose() for api in apis))
+        return statistics.median(timings)
+
+    def _check(self, results):
+        errors = [error for _, _, error in results if error is not None]
+        if errors:
+            self.stderr.write(f"{len(errors)} erros, ex: {errors[0]}")
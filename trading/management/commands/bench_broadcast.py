@@ -0,0 +1,162 @@
+import asyncio
+import json
+import math
+import statistics
+import time
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from trading.account_state import book
+from trading.market_data import reset_market_data
+from trading.mock_bybit import MockBybitServer
+from trading.models import Leverage, TradingUser
+from trading.rate_limit import reset_limiter
+from trading.sessions import sessions
+
+SYMBOL = "BTCUSDT"
+
+# Uma rodada abre e fecha a posição, então cada rodada começa do mesmo estado
+SCENARIO = [
+    ("set-leverage", "POST", {"leverage": 5, "symbol": SYMBOL}),
+    ("get-balance", "GET", None),
+    ("place-order", "POST", {"percent": 1, "symbol": SYMBOL, "profit": 2, "max_loss": 1, "side": "Buy"}),
+    ("get-positions", "GET", None),
+    ("update-tp-sl", "POST", {"symbol": SYMBOL, "tp": "52000", "sl": "49000"}),
+    ("close-order", "POST", {"symbol": SYMBOL}),
+]
+
+
+def percentile(values, q):
+    """Percentil `q` (0 a 100) pelo método nearest-rank."""
+    ordered = sorted(values)
+    if not ordered:
+        return math.nan
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+def create_accounts(count):
+    """Recria `count` contas de teste, cada uma com alavancagem em SYMBOL."""
+    User.objects.all().delete()
+    users = User.objects.bulk_create([User(username=f"bench-{i}") for i in range(count)])
+    TradingUser.objects.bulk_create([
+        TradingUser(user=user, api_key=f"bench-key-{user.pk}", api_secret="secret") for user in users
+    ])
+    Leverage.objects.bulk_create([Leverage(user=user, symbol=SYMBOL, leverage=5) for user in users])
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga das views de broadcast contra o mock local da Bybit: latência p50/p99 "
+        "por endpoint, tempo até a última execução e número de chamadas à exchange."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--accounts", type=int, nargs="+", default=[1, 10, 100, 1000])
+        parser.add_argument("--rounds", type=int, default=5, help="Rodadas medidas por quantidade de contas")
+        parser.add_argument("--warmup", type=int, default=1, help="Rodadas descartadas antes de medir")
+        parser.add_argument("--latency", type=float, default=0.05, help="Latência do mock por requisição (s)")
+        parser.add_argument("--jitter", type=float, default=0.02, help="Atraso extra aleatório do mock (s)")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Fração de chamadas que falham")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--async-views", action="store_true", help="Usa as views de /trading/async/")
+        parser.add_argument("--rate-limit", action="store_true",
+                            help="Respeita os limites da Bybit por IP/conta (trading/rate_limit.py)")
+        parser.add_argument("--endpoints", nargs="+", choices=[name for name, _, _ in SCENARIO],
+                            help="Endpoints reportados (a rodada completa sempre é executada)")
+
+    def handle(self, *args, **options):
+        server = MockBybitServer(
+            latency=options["latency"], jitter=options["jitter"], prices={SYMBOL: 50000},
+            error_rate=options["error_rate"], seed=options["seed"]
+        ).start()
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        self.loop = asyncio.new_event_loop()
+        try:
+            with override_settings(TRADING_BYBIT_HTTP_URL=server.url, TRADING_BROADCAST_DEADLINE=600,
+                                   TRADING_ACCOUNT_TIMEOUT=120, TRADING_WARM_SESSIONS=False,
+                                   TRADING_RATE_LIMIT=options["rate_limit"]):
+                reset_market_data()
+                reset_limiter()
+                self.stdout.write(
+                    f"{'contas':>7} {'endpoint':<14} {'p50 ms':>8} {'p99 ms':>8} {'últ. exec ms':>12} "
+                    f"{'exec p50/p99 ms':>16} {'chamadas/req':>12} {'erros':>6}  chamadas por rota"
+                )
+                for count in options["accounts"]:
+                    create_accounts(count)
+                    self._clear_sessions()
+                    for _ in range(options["warmup"]):
+                        self._round(server, options["async_views"])
+                    rounds = [self._round(server, options["async_views"]) for _ in range(options["rounds"])]
+                    self._report(count, rounds, options["endpoints"])
+        finally:
+            self._clear_sessions()
+            reset_market_data()
+            self.loop.close()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            server.stop()
+
+    def _clear_sessions(self):
+        sessions.clear()
+        book.clear()
+
+    def _request(self, async_views, method, path, body):
+        if async_views:
+            client = AsyncClient()
+            if method == "GET":
+                return self.loop.run_until_complete(client.get(path))
+            return self.loop.run_until_complete(
+                client.post(path, data=json.dumps(body), content_type="application/json")
+            )
+        client = Client()
+        if method == "GET":
+            return client.get(path)
+        return client.post(path, data=json.dumps(body), content_type="application/json")
+
+    def _round(self, server, async_views):
+        """Executa o cenário uma vez e retorna as medições de cada endpoint."""
+        measures = {}
+        prefix = "/trading/async/" if async_views else "/trading/"
+        for name, method, body in SCENARIO:
+            calls_before = Counter(server.calls)
+            fills_before = len(server.fills)
+            start = time.perf_counter()
+            response = self._request(async_views, method, f"{prefix}{name}/", body)
+            elapsed = time.perf_counter() - start
+            results = response.json().get("results", [])
+            measures[name] = {
+                "elapsed": elapsed,
+                "fills": [at - start for _, _, at in server.fills[fills_before:]],
+                "calls": Counter(server.calls) - calls_before,
+                "errors": sum(1 for r in results if r.get("status") == "error" or "error" in r),
+            }
+        return measures
+
+    def _report(self, count, rounds, endpoints):
+        for name, _, _ in SCENARIO:
+            if endpoints and name not in endpoints:
+                continue
+            measures = [r[name] for r in rounds]
+            elapsed = [m["elapsed"] * 1000 for m in measures]
+            fills = [fill * 1000 for m in measures for fill in m["fills"]]
+            last_fills = [max(m["fills"]) * 1000 for m in measures if m["fills"]]
+            calls = sum((m["calls"] for m in measures), Counter())
+            per_route = " ".join(
+                f"{path.removeprefix('/v5/')}={total / len(measures):.1f}" for path, total in sorted(calls.items())
+            )
+            fill_cells = (
+                f"{statistics.median(last_fills):>12.1f} "
+                f"{percentile(fills, 50):>7.1f}/{percentile(fills, 99):<8.1f}"
+                if fills else f"{'-':>12} {'-':>16}"
+            )
+            self.stdout.write(
+                f"{count:>7} {name:<14} {percentile(elapsed, 50):>8.1f} {percentile(elapsed, 99):>8.1f} "
+                f"{fill_cells} {sum(calls.values()) / len(measures):>12.1f} "
+                f"{sum(m['errors'] for m in measures):>6}  {per_route}"
+            )
@@ -0,0 +1,130 @@
+import asyncio
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from trading.async_trading_api import AsyncTradingApi
+from trading.executor import async_fan_out, fan_out
+from trading.market_data import reset_market_data
+from trading.mock_bybit import MockBybitServer
+from trading.trading_api import TradingApi
+
+from .bench_broadcast import SYMBOL, percentile
+
+ORDER_PATH = "/v5/order/create"
+
+
+class Command(BaseCommand):
+    help = (
+        "Dispersão entre a chegada da primeira e da última ordem de um sinal no mock local da Bybit: "
+        "envio direto (cada conta dimensiona, assina e envia) contra ordens assinadas antes do envio."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--accounts", type=int, nargs="+", default=[10, 32, 100])
+        parser.add_argument("--rounds", type=int, default=5)
+        parser.add_argument("--latency", type=float, default=0.02, help="Latência do mock por requisição (s)")
+        parser.add_argument("--async-api", action="store_true", help="Usa AsyncTradingApi em vez de TradingApi")
+
+    def handle(self, *args, **options):
+        server = MockBybitServer(latency=options["latency"], prices={SYMBOL: 50000}).start()
+        try:
+            with override_settings(TRADING_BYBIT_HTTP_URL=server.url, TRADING_BROADCAST_DEADLINE=600,
+                                   TRADING_ACCOUNT_TIMEOUT=120, TRADING_RATE_LIMIT=False):
+                reset_market_data()
+                self.stdout.write(
+                    f"pool: {settings.TRADING_FANOUT_MAX_WORKERS} threads "
+                    f"(async: {settings.TRADING_ASYNC_FANOUT_MAX_CONCURRENCY})"
+                )
+                self.stdout.write(
+                    f"{'contas':>7} {'modo':<10} {'1ª ordem ms':>12} {'dispersão p50 ms':>17} "
+                    f"{'dispersão p99 ms':>17} {'preparo ms':>11}"
+                )
+                for count in options["accounts"]:
+                    if options["async_api"]:
+                        results = asyncio.run(self._bench_async(server, count, options["rounds"]))
+                    else:
+                        results = self._bench_sync(server, count, options["rounds"])
+                    for mode, rounds in results.items():
+                        self._report(count, mode, rounds)
+                reset_market_data()
+        finally:
+            server.stop()
+
+    @staticmethod
+    def _prepare(api):
+        # Saldo conhecido: o preparo não chama a exchange (ticker e instrumento vêm do cache)
+        return api.prepare_order_tp_sl(1, SYMBOL, 2, 1, "Buy", 1, balance=10000)
+
+    @staticmethod
+    def _measure(server, start_index, start, prepared_at):
+        """(1ª chegada desde o início, dispersão entre a 1ª e a última, tempo de preparo) em ms."""
+        arrivals = [at for _, path, at in server.received[start_index:] if path == ORDER_PATH]
+        return (
+            (min(arrivals) - start) * 1000,
+            (max(arrivals) - min(arrivals)) * 1000,
+            ((prepared_at or start) - start) * 1000,
+        )
+
+    def _bench_sync(self, server, count, rounds):
+        apis = [TradingApi(f"dispatch-{count}-{i}", "secret") for i in range(count)]
+        fan_out(apis, lambda api: api.ping())  # abre as conexões antes de medir
+
+        def direct():
+            self._check(fan_out(apis, lambda api: api.send_order(self._prepare(api))))
+
+        def presigned():
+            prepared = {id(api): order for api, order, _ in fan_out(apis, self._prepare)}
+            prepared_at = time.perf_counter()
+            self._check(fan_out(apis, lambda api: api.send_order(prepared[id(api)])))
+            return prepared_at
+
+        results = {}
+        for mode, dispatch in (("direto", direct), ("assinado", presigned)):
+            results[mode] = []
+            for _ in range(rounds):
+                start_index, start = len(server.received), time.perf_counter()
+                results[mode].append(self._measure(server, start_index, start, dispatch()))
+        return results
+
+    async def _bench_async(self, server, count, rounds):
+        apis = [AsyncTradingApi(f"dispatch-async-{count}-{i}", "secret") for i in range(count)]
+        await async_fan_out(apis, lambda api: api.ping())
+
+        async def direct():
+            self._check(await async_fan_out(apis, lambda api: self._direct_async(api)))
+
+        async def presigned():
+            prepared = {id(api): order for api, order, _ in await async_fan_out(apis, self._prepare)}
+            prepared_at = time.perf_counter()
+            self._check(await async_fan_out(apis, lambda api: api.send_order(prepared[id(api)])))
+            return prepared_at
+
+        results = {}
+        for mode, dispatch in (("direto", direct), ("assinado", presigned)):
+            results[mode] = []
+            for _ in range(rounds):
+                start_index, start = len(server.received), time.perf_counter()
+                results[mode].append(self._measure(server, start_index, start, await dispatch()))
+        await asyncio.gather(*(api.aclose() for api in apis))
+        return results
+
+    async def _direct_async(self, api):
+        return await api.send_order(await self._prepare(api))
+
+    def _report(self, count, mode, rounds):
+        first = [r[0] for r in rounds]
+        spread = [r[1] for r in rounds]
+        prepare = [r[2] for r in rounds]
+        self.stdout.write(
+            f"{count:>7} {mode:<10} {statistics.median(first):>12.2f} {percentile(spread, 50):>17.2f} "
+            f"{percentile(spread, 99):>17.2f} {statistics.median(prepare):>11.2f}"
+        )
+
+    def _check(self, results):
+        errors = [error for _, _, error in results if error is not None]
+        if errors:
+            self.stderr.write(f"{len(errors)} erros, ex: {errors[0]}")
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import statistics
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from trading.account_state import book
+from trading.market_data import reset_market_data
+from trading.mock_bybit import MockBybitServer
+from trading.models import Leverage, TradingUser
+from trading.sessions import sessions
+
+from .bench_broadcast import SYMBOL, create_accounts, percentile
+
+MODES = ("por símbolo", "close-all")
+
+
+class Command(BaseCommand):
+    help = (
+        "Fechamento de todas as posições de todas as contas no mock local da Bybit: um close-order por "
+        "símbolo (como hoje) contra um único close-all com ordens reduce-only em lote."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--accounts", type=int, nargs="+", default=[10, 100])
+        parser.add_argument("--symbols", type=int, default=5, help="Posições abertas por conta")
+        parser.add_argument("--rounds", type=int, default=3)
+        parser.add_argument("--latency", type=float, default=0.05, help="Latência do mock por requisição (s)")
+        parser.add_argument("--async-views", action="store_true", help="Usa as views de /trading/async/")
+
+    def handle(self, *args, **options):
+        symbols = [SYMBOL] + [f"SIM{i}USDT" for i in range(1, options["symbols"])]
+        server = MockBybitServer(latency=options["latency"], prices={SYMBOL: 50000}).start()
+        # O benchmark mede o fan-out, não os limites por conta da Bybit
+        server.uid_limits = {path: 10 ** 6 for path in (
+            "/v5/order/create", "/v5/order/create-batch", "/v5/position/list", "/v5/account/wallet-balance"
+        )}
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        self.loop = asyncio.new_event_loop()
+        self.prefix = "/trading/async/" if options["async_views"] else "/trading/"
+        try:
+            with override_settings(TRADING_BYBIT_HTTP_URL=server.url, TRADING_BROADCAST_DEADLINE=600,
+                                   TRADING_FLATTEN_DEADLINE=600, TRADING_ACCOUNT_TIMEOUT=120,
+                                   TRADING_RATE_LIMIT=False, TRADING_WARM_SESSIONS=False,
+                                   TRADING_HISTORY=False):
+                reset_market_data()
+                self.stdout.write(
+                    f"{'contas':>7} {'modo':<12} {'total p50 ms':>13} {'total p99 ms':>13} "
+                    f"{'últ. exec ms':>12} {'chamadas':>9} {'erros':>6}"
+                )
+                for count in options["accounts"]:
+                    create_accounts(count)
+                    Leverage.objects.bulk_create([
+                        Leverage(user_id=account.user_id, symbol=symbol, leverage=5)
+                        for account in TradingUser.objects.all() for symbol in symbols[1:]
+                    ])
+                    sessions.clear()
+                    book.clear()
+                    for mode in MODES:
+                        rounds = [self._round(server, mode, symbols, options["async_views"])
+                                  for _ in range(options["rounds"])]
+                        self._report(count, mode, rounds)
+                reset_market_data()
+        finally:
+            sessions.clear()
+            book.clear()
+            self.loop.close()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            server.stop()
+
+    def _post(self, async_views, path, body):
+        if async_views:
+            return self.loop.run_until_complete(
+                AsyncClient().post(path, data=json.dumps(body), content_type="application/json")
+            ).json()
+        return Client().post(path, data=json.dumps(body), content_type="application/json").json()
+
+    def _round(self, server, mode, symbols, async_views):
+        """Abre uma posição por símbolo em todas as contas e mede o fechamento de todas."""
+        legs = [{"symbol": symbol, "side": "Buy", "percent": 1, "profit": 2, "max_loss": 1} for symbol in symbols]
+        self._post(async_views, f"{self.prefix}place-batch-order/", {"legs": legs})
+
+        calls_before = Counter(server.calls)
+        fills_before = len(server.fills)
+        start = time.perf_counter()
+        if mode == "close-all":
+            results = self._post(async_views, f"{self.prefix}close-all/", {})["results"]
+            errors = sum(len([p for p in r["positions"] if "error" in p]) if "positions" in r else 1 for r in results)
+        else:
+            results = [r for symbol in symbols
+                       for r in self._post(async_views, f"{self.prefix}close-order/", {"symbol": symbol})["results"]]
+            errors = sum(1 for r in results if r.get("status") == "error")
+        elapsed = time.perf_counter() - start
+        fills = [at - start for _, _, at in server.fills[fills_before:]]
+        open_positions = sum(len(account["positions"]) for account in server.accounts.values())
+        return {
+            "elapsed": elapsed,
+            "last_fill": max(fills) if fills else None,
+            "calls": sum((Counter(server.calls) - calls_before).values()),
+            "errors": errors + open_positions,
+        }
+
+    def _report(self, count, mode, rounds):
+        elapsed = [r["elapsed"] * 1000 for r in rounds]
+        last_fills = [r["last_fill"] * 1000 for r in rounds if r["last_fill"] is not None]
+        last_fill = f"{statistics.median(last_fills):>12.1f}" if last_fills else f"{'-':>12}"
+        self.stdout.write(
+            f"{count:>7} {mode:<12} {percentile(elapsed, 50):>13.1f} {percentile(elapsed, 99):>13.1f} "
+            f"{last_fill} {statistics.mean(r['calls'] for r in rounds):>9.1f} {sum(r['errors'] for r in rounds):>6}"
+        )
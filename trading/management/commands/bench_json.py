@@ -0,0 +1,126 @@
+import json
+import statistics
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from utils import fast_json
+
+from .bench_broadcast import SYMBOL
+
+
+def signal_body(legs):
+    """Corpo de um sinal como o cliente envia (place-order, ou place-batch-order com `legs` pernas)."""
+    leg = {"symbol": SYMBOL, "side": "Buy", "percent": 1, "profit": 2, "max_loss": 1}
+    if legs == 1:
+        return json.dumps({**leg, "signal_id": uuid.uuid4().hex}).encode()
+    return json.dumps({"signal_id": uuid.uuid4().hex, "legs": [leg] * legs}).encode()
+
+
+def order_results(accounts):
+    """Resposta do place-order para `accounts` contas, com os tipos que as views serializam."""
+    return {"status": "completed", "total_users": accounts, "successful_orders": accounts, "results": [{
+        "user": f"bench-{i}", "status": "success", "message": {
+            "order_id": str(uuid.uuid4()), "order_link_id": f"{uuid.uuid4().hex[:24]}-{i}", "attempts": 1,
+            "reconciled": False, "qty": Decimal("0.004"), "tp": Decimal("51000.0"), "sl": Decimal("49500.0"),
+            "order_amount": 200.0, "balance_age": 0.412,
+        }
+    } for i in range(accounts)]}
+
+
+def position_results(accounts, symbols=3):
+    """Resposta do get-positions para `accounts` contas com `symbols` posições cada."""
+    position = {
+        "leverage": "5", "side": "Buy", "avg_price": "50000", "liq_price": "40123.5", "tp": "51000",
+        "sl": "49500", "qty": "0.004", "value": "200", "rPnL": "-0.11", "uPnL": "1.25", "market_price": "50312.5",
+    }
+    return {"status": "completed", "total_users": accounts, "successful_orders": accounts, "results": [{
+        "user": f"bench-{i}", "status": "success",
+        "message": {f"SYM{s}USDT": dict(position) for s in range(symbols)},
+    } for i in range(accounts)]}
+
+
+def exchange_responses():
+    """Respostas da Bybit que cada conta decodifica: saldo, lista de posições e ordem criada."""
+    coin = {"coin": "USDT", "equity": "10000.5", "walletBalance": "10000.5", "usdValue": "10001.2",
+            "unrealisedPnl": "1.25", "cumRealisedPnl": "-12.4", "availableToWithdraw": "9800.1",
+            "totalPositionIM": "40", "totalPositionMM": "2", "locked": "0", "borrowAmount": "0"}
+    position = {"symbol": SYMBOL, "side": "Buy", "size": "0.004", "avgPrice": "50000", "markPrice": "50312.5",
+                "liqPrice": "40123.5", "leverage": "5", "takeProfit": "51000", "stopLoss": "49500",
+                "positionValue": "200", "curRealisedPnl": "-0.11", "unrealisedPnl": "1.25", "positionIdx": 0,
+                "tradeMode": 0, "autoAddMargin": 0, "positionStatus": "Normal", "createdTime": "1700000000000",
+                "updatedTime": "1700000000000"}
+    wrap = lambda result: json.dumps({"retCode": 0, "retMsg": "OK", "result": result, "retExtInfo": {},
+                                      "time": 1700000000000}).encode()
+    return {
+        "wallet-balance": wrap({"list": [{"accountType": "UNIFIED", "totalEquity": "10001.2", "coin": [coin]}]}),
+        "position/list": wrap({"category": "linear", "list": [position] * 3, "nextPageCursor": ""}),
+        "order/create": wrap({"orderId": str(uuid.uuid4()), "orderLinkId": uuid.uuid4().hex}),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark do JSON no caminho crítico com payloads de N contas: decodificação do sinal, "
+        "serialização das respostas (JsonResponse) e decodificação das respostas da Bybit, com o json da "
+        "biblioteca padrão contra o orjson (utils/fast_json.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--accounts", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=7, help="Medições por caso (vale a mediana)")
+
+    def handle(self, *args, **options):
+        accounts = options["accounts"]
+        responses = exchange_responses()
+        cases = [
+            ("sinal place-order", "loads", fast_json.loads, signal_body(1)),
+            ("sinal 20 pernas", "loads", fast_json.loads, signal_body(20)),
+            (f"place-order {accounts} contas", "JsonResponse",
+             fast_json.JsonResponse, order_results(accounts)),
+            (f"get-positions {accounts} contas", "JsonResponse",
+             fast_json.JsonResponse, position_results(accounts)),
+            (f"get-positions {accounts} contas", "ETag", lambda payload: fast_json.dumps(payload, sort_keys=True),
+             position_results(accounts)),
+        ] + [
+            (f"Bybit {path} x{accounts}", "loads",
+             lambda payload: [fast_json.loads(payload) for _ in range(accounts)], response)
+            for path, response in responses.items()
+        ]
+
+        previous = fast_json.backend
+        self.stdout.write(f"{'payload':<32} {'operação':<13} {'json ms':>9} {'orjson ms':>10} {'ganho':>6}")
+        try:
+            for name, operation, run, payload in cases:
+                timings = {}
+                for backend in ("json", "orjson"):
+                    if fast_json.use(backend) != backend:
+                        timings[backend] = None
+                        continue
+                    timings[backend] = self._measure(run, payload, options["repeat"])
+                self._report(name, operation, timings)
+        finally:
+            fast_json.use(previous)
+
+    @staticmethod
+    def _measure(run, payload, repeat):
+        run(payload)  # aquecimento
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run(payload)
+            samples.append(time.perf_counter() - start)
+        return statistics.median(samples) * 1000
+
+    def _report(self, name, operation, timings):
+        fast = timings["orjson"]
+        if fast is None:
+            self.stdout.write(f"{name:<32} {operation:<13} {timings['json']:>9.3f} {'-':>10} {'-':>6}"
+                              "  (orjson não instalado)")
+            return
+        self.stdout.write(
+            f"{name:<32} {operation:<13} {timings['json']:>9.3f} {fast:>10.3f} {timings['json'] / fast:>5.1f}x"
+        )
+
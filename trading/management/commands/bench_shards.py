@@ -0,0 +1,110 @@
+import json
+import multiprocessing
+import os
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from trading.account_state import book
+from trading.market_data import reset_market_data
+from trading.mock_bybit import serve_in_process
+from trading.models import TradingUser
+from trading.sessions import sessions
+from trading.shards import shards
+
+from .bench_broadcast import SYMBOL, create_accounts, percentile
+
+SIGNAL = {"percent": 1, "symbol": SYMBOL, "profit": 2, "max_loss": 1, "side": "Buy"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Vazão do place-order com as contas no processo do request (0 shards) contra as contas "
+        "divididas entre N processos (TRADING_SHARDS), no mock local da Bybit rodando em processos "
+        "próprios. Com CPU sobrando, as ordens por segundo devem crescer com o número de shards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--accounts", type=int, nargs="+", default=[100, 1000, 3000])
+        parser.add_argument("--shards", type=int, nargs="+", default=[0, 1, 2, 4])
+        parser.add_argument("--rounds", type=int, default=3)
+        parser.add_argument("--latency", type=float, default=0.02, help="Latência do mock por requisição (s)")
+        parser.add_argument("--mock-processes", type=int, default=os.cpu_count() or 1,
+                            help="Processos do mock, na mesma porta (SO_REUSEPORT)")
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context("spawn")
+        mocks = []
+        for _ in range(options["mock_processes"]):
+            parent, child = context.Pipe()
+            port = int(mocks[0][2].rsplit(":", 1)[1]) if mocks else 0
+            process = context.Process(target=serve_in_process, args=(child,), kwargs={
+                "latency": options["latency"], "prices": {SYMBOL: 50000}, "port": port, "reuse_port": True
+            }, daemon=True)
+            process.start()
+            mocks.append((process, parent, parent.recv()))
+        url = mocks[0][2]
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f"{os.cpu_count()} CPUs, mock em {len(mocks)} processo(s)")
+            self.stdout.write(
+                f"{'contas':>7} {'shards':>6} {'total p50 ms':>13} {'total p99 ms':>13} {'ordens/s':>9} {'erros':>6}"
+            )
+            for count in options["accounts"]:
+                create_accounts(count)
+                for shard_count in options["shards"]:
+                    with override_settings(TRADING_BYBIT_HTTP_URL=url, TRADING_SHARDS=shard_count,
+                                           TRADING_BROADCAST_DEADLINE=600, TRADING_ACCOUNT_TIMEOUT=120,
+                                           TRADING_RATE_LIMIT=False, TRADING_WARM_SESSIONS=False,
+                                           TRADING_BATCH_SIZING=False, TRADING_HISTORY=False):
+                        reset_market_data()
+                        self._warm(shard_count)
+                        rounds = [self._round() for _ in range(options["rounds"])]
+                        self._report(count, shard_count, rounds)
+                        shards.stop()
+                        sessions.clear()
+                        book.clear()
+        finally:
+            shards.stop()
+            sessions.clear()
+            book.clear()
+            reset_market_data()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            for process, parent, _ in mocks:
+                parent.send(None)
+                process.join(timeout=5)
+
+    @staticmethod
+    def _warm(shard_count):
+        """Sessões abertas antes de medir, como em um servidor já aquecido."""
+        users = list(TradingUser.objects.all())
+        if shard_count:
+            shards.warm(users)
+        else:
+            sessions.warm(users)
+
+    @staticmethod
+    def _round():
+        body = {**SIGNAL, "signal_id": uuid.uuid4().hex}
+        start = time.perf_counter()
+        data = Client().post("/trading/place-order/", data=json.dumps(body), content_type="application/json").json()
+        return {
+            "elapsed": time.perf_counter() - start,
+            "orders": data["successful_orders"],
+            "errors": data["total_users"] - data["successful_orders"],
+        }
+
+    def _report(self, count, shard_count, rounds):
+        elapsed = [r["elapsed"] * 1000 for r in rounds]
+        throughput = sum(r["orders"] for r in rounds) / sum(r["elapsed"] for r in rounds)
+        self.stdout.write(
+            f"{count:>7} {shard_count:>6} {percentile(elapsed, 50):>13.1f} {percentile(elapsed, 99):>13.1f} "
+            f"{throughput:>9.1f} {sum(r['errors'] for r in rounds):>6}"
+        )
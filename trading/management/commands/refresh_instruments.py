@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from trading.instruments import instruments
+from trading.market_data import get_market_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Busca as regras de todos os símbolos lineares da Bybit (tickSize, qtyStep, limites de quantidade "
+        "e valor mínimo) e grava a tabela InstrumentRule usada para dimensionar as ordens."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--demo", action="store_true", help="Usa o ambiente demo da Bybit")
+
+    def handle(self, *args, **options):
+        count = instruments.refresh(get_market_data(options["demo"]))
+        self.stdout.write(f"{count} instrumentos atualizados")
@@ -0,0 +1,72 @@
+import csv
+import json
+from datetime import datetime as dt, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trading.models import SignalExecution
+from trading.simulation import MatchingEngine, SimulatedTradingApi, replay
+
+
+def _epoch(value: str) -> float:
+    """Horário de um sinal ou preço: epoch em segundos ou ISO 8601 (sem fuso vale UTC)."""
+    try:
+        return float(value)
+    except ValueError:
+        at = dt.fromisoformat(value)
+        return (at if at.tzinfo else at.replace(tzinfo=timezone.utc)).timestamp()
+
+
+class Command(BaseCommand):
+    help = (
+        "Reproduz sinais (arquivo JSONL ou o histórico SignalExecution) em contas simuladas contra um "
+        "caminho de preços (CSV), sem enviar nada à Bybit, e mostra "
+        "ordens, erros, PnL e gatilhos de TP/SL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--signals", help='JSONL com {"at", "kind", "params"} por linha (padrão: histórico)')
+        parser.add_argument("--prices", required=True, help="CSV com colunas at,symbol,price")
+        parser.add_argument("--accounts", type=int, default=100)
+        parser.add_argument("--balance", type=float, default=10000.0, help="Saldo inicial de cada conta (USDT)")
+        parser.add_argument("--leverage", type=int, default=1)
+
+    def handle(self, *args, **options):
+        signals = self._signals(options["signals"])
+        prices = self._prices(options["prices"])
+        if not signals:
+            raise CommandError("Nenhum sinal para reproduzir")
+        # Sem preço antes do 1º sinal o engine não tem como executar: usa o 1º preço de cada símbolo
+        initial = {}
+        for _, symbol, price in prices:
+            initial.setdefault(symbol, price)
+
+        engine = MatchingEngine(prices=initial, balance=options["balance"], leverage=options["leverage"])
+        apis = [SimulatedTradingApi(engine, f"replay-{i}") for i in range(options["accounts"])]
+        report = replay(engine, apis, signals, prices, options["leverage"])
+        self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+
+    @staticmethod
+    def _signals(path):
+        """(at, signal_id, kind, params) em ordem de horário."""
+        if path is None:
+            return [
+                (signal.created_at.timestamp(), signal.signal_id, signal.kind, signal.params)
+                for signal in SignalExecution.objects.order_by("created_at")
+            ]
+        signals = []
+        with open(path, encoding="utf-8") as file:
+            for number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                signal = json.loads(line)
+                signals.append((_epoch(str(signal["at"])), signal.get("signal_id", f"replay-{number}"),
+                                signal["kind"], signal["params"]))
+        return sorted(signals, key=lambda signal: signal[0])
+
+    @staticmethod
+    def _prices(path):
+        """(at, symbol, price) em ordem de horário."""
+        with open(path, encoding="utf-8", newline="") as file:
+            prices = [(_epoch(row["at"]), row["symbol"], row["price"]) for row in csv.DictReader(file)]
+        return sorted(prices, key=lambda price: price[0])
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from trading.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Executa os sinais enfileirados (SignalJob/SignalTask) usando o banco como fila. "
+        "Vários workers podem rodar ao mesmo tempo; tarefas de um worker interrompido voltam "
+        "para a fila quando a reserva vence."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=None, help="Tarefas reservadas por lote")
+        parser.add_argument("--poll-interval", type=float, default=None, help="Espera com a fila vazia (s)")
+        parser.add_argument("--once", action="store_true", help="Sai quando a fila estiver vazia")
+
+    def handle(self, *args, **options):
+        try:
+            total = run_worker(options["poll_interval"], options["batch"], once=options["once"])
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(f"{total} tarefas executadas")
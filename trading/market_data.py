@@ -0,0 +1,110 @@
+import threading
+
+from django.conf import settings
+from pybit.unified_trading import HTTP
+
+from utils import fast_json
+from utils.cache import TTLCache
+from . import rate_limit, timing
+from .instruments import instruments
+
+
+# Itens por página de get_instruments_info (máximo da Bybit)
+INSTRUMENTS_PAGE_SIZE = 1000
+
+
+class MarketData():
+    """
+    Dados públicos de mercado (ticker e informações do instrumento) compartilhados
+    por todas as contas do processo.
+
+    Um sinal para N contas faz uma única chamada get_tickers e get_instruments_info
+    por símbolo: o ticker fica em cache por TRADING_TICKER_TTL (fração de segundo) e
+    as regras do instrumento por TRADING_INSTRUMENT_TTL.
+
+    :param demo: (bool) Se True, consulta o ambiente demo da Bybit.
+    """
+    def __init__(self, demo: bool = False) -> None:
+        self._session = HTTP(testnet=False, demo=demo, timeout=settings.TRADING_ACCOUNT_TIMEOUT)
+        if settings.TRADING_BYBIT_HTTP_URL:
+            self._session.endpoint = settings.TRADING_BYBIT_HTTP_URL
+        if settings.TRADING_RATE_LIMIT:
+            rate_limit.install(self._session)
+        timing.install(self._session)
+        fast_json.install(self._session)
+        self._tickers = TTLCache()
+        self._instruments = TTLCache()
+
+    # ============================================================
+    # Ticker do símbolo (lastPrice, markPrice, ...)
+    # ============================================================
+    def get_ticker(self, symbol: str) -> dict:
+        """
+        Retorna o ticker linear do símbolo.
+
+        :param symbol: (str) Nome do instrumento, ex: "BTCUSDT".
+        :return: (dict) item de result.list da resposta de get_tickers.
+        """
+        return self._tickers.get(
+            symbol,
+            settings.TRADING_TICKER_TTL,
+            lambda: self._session.get_tickers(category="linear", symbol=symbol)["result"]["list"][0]
+        )
+
+    # ============================================================
+    # Informações do instrumento (lotSizeFilter, priceFilter, ...)
+    # ============================================================
+    def get_instrument(self, symbol: str) -> dict:
+        """
+        Retorna as informações do instrumento linear.
+
+        :param symbol: (str) Nome do instrumento, ex: "BTCUSDT".
+        :return: (dict) item de result.list da resposta de get_instruments_info.
+        """
+        return self._instruments.get(
+            symbol,
+            settings.TRADING_INSTRUMENT_TTL,
+            lambda: self._session.get_instruments_info(category="linear", symbol=symbol)["result"]["list"][0]
+        )
+
+    def get_instruments(self) -> list:
+        """
+        Retorna as informações de todos os instrumentos lineares, seguindo o
+        nextPageCursor da Bybit (uma chamada a cada INSTRUMENTS_PAGE_SIZE símbolos).
+
+        :return: (list) itens de result.list de todas as páginas.
+        """
+        items, cursor = [], None
+        while True:
+            result = self._session.get_instruments_info(
+                category="linear", limit=INSTRUMENTS_PAGE_SIZE, cursor=cursor
+            )["result"]
+            items += result["list"]
+            cursor = result.get("nextPageCursor")
+            if not cursor:
+                return items
+
+
+_market_data = {}
+_market_data_lock = threading.Lock()
+
+
+def get_market_data(demo: bool = False) -> MarketData:
+    """
+    Retorna a instância de MarketData do processo para o ambiente (real ou demo).
+    """
+    if demo not in _market_data:
+        with _market_data_lock:
+            if demo not in _market_data:
+                _market_data[demo] = MarketData(demo)
+    return _market_data[demo]
+
+
+def reset_market_data() -> None:
+    """
+    Descarta as instâncias do processo e a tabela de regras dos instrumentos
+    (ex: depois de mudar TRADING_BYBIT_HTTP_URL).
+    """
+    with _market_data_lock:
+        _market_data.clear()
+    instruments.clear()
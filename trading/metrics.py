@@ -0,0 +1,113 @@
+import bisect
+import threading
+from collections import defaultdict
+
+# Limites (segundos) dos buckets dos histogramas de latência
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(labels, extra: str = "") -> str:
+    items = [f'{key}="{label}"' for key, label in labels]
+    if extra:
+        items.append(extra)
+    return "{" + ",".join(items) + "}" if items else ""
+
+
+# ============================================================
+# Contadores e histogramas do processo (rate limit, latência, ...)
+# ============================================================
+class Metrics():
+    """
+    Registro simples de contadores e histogramas do processo, com labels no estilo Prometheus.
+
+    Ex: metrics.increment("rate_limit_throttled_total", endpoint_class="order")
+    aparece no snapshot como 'rate_limit_throttled_total{endpoint_class="order"}'.
+    metrics.observe("trading_stage_seconds", 0.012, stage="ticker") soma a observação
+    no bucket certo do histograma; render() exporta tudo no formato texto do Prometheus.
+    """
+    def __init__(self) -> None:
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name, tuple(sorted(labels.items())))
+
+    def increment(self, name: str, value: float = 1.0, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def get(self, name: str, **labels) -> float:
+        return self._counters.get(self._key(name, labels), 0.0)
+
+    def snapshot(self) -> dict:
+        """
+        :return: (dict) {'nome{label="valor"}': total} de todos os contadores.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+        snapshot = {}
+        for (name, labels), value in sorted(counters.items()):
+            snapshot[name + _labels(labels)] = value
+        return snapshot
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Registra `value` (segundos) no histograma `name`, com os buckets de LATENCY_BUCKETS."""
+        key = self._key(name, labels)
+        index = bisect.bisect_left(LATENCY_BUCKETS, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def histograms(self) -> dict:
+        """
+        :return: (dict) {'nome{label="valor"}': {"count", "sum", "buckets": {le: acumulado}}}.
+        """
+        with self._lock:
+            histograms = {key: (list(counts), total, count) for key, (counts, total, count) in self._histograms.items()}
+        snapshot = {}
+        for (name, labels), (counts, total, count) in sorted(histograms.items()):
+            cumulative, buckets = 0, {}
+            for bound, bucket in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+                cumulative += bucket
+                buckets[str(bound)] = cumulative
+            snapshot[name + _labels(labels)] = {"count": count, "sum": total, "buckets": buckets}
+        return snapshot
+
+    def render(self) -> str:
+        """Contadores e histogramas no formato texto de exposição do Prometheus (0.0.4)."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(counts), total, count) for key, (counts, total, count) in self._histograms.items()}
+        lines, typed = [], set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), (counts, total, count) in sorted(histograms.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, bucket in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+                cumulative += bucket
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{_labels(labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+metrics = Metrics()
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:39
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0007_remove_tradinguser_api_key_demo_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SignalJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signal_id', models.CharField(max_length=64, unique=True)),
+                ('kind', models.CharField(max_length=32)),
+                ('params', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('running', 'Executando'), ('completed', 'Concluído')], default='pending', max_length=16)),
+                ('total_tasks', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Signal Job',
+                'verbose_name_plural': 'Signal Jobs',
+            },
+        ),
+        migrations.CreateModel(
+            name='SignalTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('leverage', models.IntegerField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('running', 'Executando'), ('success', 'Sucesso'), ('error', 'Erro')], default='pending', max_length=16)),
+                ('attempts', models.IntegerField(default=0)),
+                ('claim', models.CharField(blank=True, default='', max_length=32)),
+                ('lease_until', models.DateTimeField(blank=True, null=True)),
+                ('result', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signal_tasks', to='trading.tradinguser')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to='trading.signaljob')),
+            ],
+            options={
+                'verbose_name': 'Signal Task',
+                'verbose_name_plural': 'Signal Tasks',
+                'indexes': [models.Index(fields=['status', 'lease_until'], name='trading_sig_status_25ffd4_idx'), models.Index(fields=['claim'], name='trading_sig_claim_90d967_idx'), models.Index(fields=['job', 'status'], name='trading_sig_job_id_b2cc45_idx')],
+            },
+        ),
+    ]
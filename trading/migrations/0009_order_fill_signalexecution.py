@@ -0,0 +1,93 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:42
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0008_signaljob_signaltask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SignalExecution',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signal_id', models.CharField(db_index=True, max_length=64)),
+                ('kind', models.CharField(max_length=32)),
+                ('symbol', models.CharField(blank=True, default='', max_length=20)),
+                ('params', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('total_accounts', models.IntegerField(default=0)),
+                ('successful', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Signal Execution',
+                'verbose_name_plural': 'Signal Executions',
+                'indexes': [models.Index(fields=['created_at'], name='trading_sig_created_fca48c_idx'), models.Index(fields=['symbol', 'created_at'], name='trading_sig_symbol_d8cae6_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('open', 'Abertura'), ('close', 'Fechamento'), ('tp_sl', 'TP/SL')], max_length=8)),
+                ('symbol', models.CharField(max_length=20)),
+                ('side', models.CharField(blank=True, default='', max_length=4)),
+                ('qty', models.DecimalField(blank=True, decimal_places=10, max_digits=28, null=True)),
+                ('take_profit', models.DecimalField(blank=True, decimal_places=10, max_digits=28, null=True)),
+                ('stop_loss', models.DecimalField(blank=True, decimal_places=10, max_digits=28, null=True)),
+                ('order_amount', models.DecimalField(blank=True, decimal_places=10, max_digits=28, null=True)),
+                ('order_id', models.CharField(blank=True, default='', max_length=64)),
+                ('order_link_id', models.CharField(blank=True, default='', max_length=45)),
+                ('reconciled', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('success', 'Sucesso'), ('error', 'Erro')], max_length=8)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='trading.tradinguser')),
+                ('execution', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='trading.signalexecution')),
+            ],
+            options={
+                'verbose_name': 'Order',
+                'verbose_name_plural': 'Orders',
+            },
+        ),
+        migrations.CreateModel(
+            name='Fill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=20)),
+                ('side', models.CharField(max_length=4)),
+                ('qty', models.DecimalField(decimal_places=10, max_digits=28)),
+                ('price', models.DecimalField(blank=True, decimal_places=10, max_digits=28, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fills', to='trading.tradinguser')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fills', to='trading.order')),
+            ],
+            options={
+                'verbose_name': 'Fill',
+                'verbose_name_plural': 'Fills',
+                'indexes': [models.Index(fields=['created_at'], name='trading_fil_created_a90a34_idx'), models.Index(fields=['symbol', 'created_at'], name='trading_fil_symbol_570b6b_idx'), models.Index(fields=['account', 'created_at'], name='trading_fil_account_4c6794_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='trading_ord_created_ead2de_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['symbol', 'created_at'], name='trading_ord_symbol_ebdef9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['account', 'created_at'], name='trading_ord_account_83e20a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_link_id'], name='trading_ord_order_l_7ee908_idx'),
+        ),
+    ]
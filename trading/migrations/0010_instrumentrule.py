@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:56
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0009_order_fill_signalexecution'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstrumentRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=32, unique=True)),
+                ('status', models.CharField(default='Trading', max_length=16)),
+                ('tick_size', models.DecimalField(decimal_places=10, max_digits=28)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=10, max_digits=28, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=10, max_digits=28, null=True)),
+                ('qty_step', models.DecimalField(decimal_places=10, max_digits=28)),
+                ('min_order_qty', models.DecimalField(decimal_places=10, max_digits=28)),
+                ('max_order_qty', models.DecimalField(blank=True, decimal_places=10, max_digits=28, null=True)),
+                ('max_mkt_order_qty', models.DecimalField(blank=True, decimal_places=10, max_digits=28, null=True)),
+                ('min_notional', models.DecimalField(blank=True, decimal_places=10, max_digits=28, null=True)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Instrument Rule',
+                'verbose_name_plural': 'Instrument Rules',
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0010_instrumentrule'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='Fill',
+        ),
+    ]
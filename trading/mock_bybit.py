@@ -0,0 +1,557 @@
+"""
+Servidores locais que imitam a Bybit, para testes e benchmarks sem rede.
+"""
+import base64
+import hashlib
+import json
+import random
+import socket
+import struct
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+# ============================================================
+# Servidor WebSocket privado que reproduz mensagens gravadas
+# ============================================================
+class FakeStreamServer():
+    """
+    Servidor WebSocket mínimo (RFC 6455, sem extensões) que responde como o stream
+    privado da Bybit: aceita qualquer auth, confirma inscrições e, ao receber a
+    inscrição de um tópico, reproduz em ordem as mensagens gravadas desse tópico.
+
+    :param recorded: (list) Mensagens gravadas (dicts com "topic").
+    :param ack_delay: (float) Atraso da confirmação de inscrição, em segundos.
+    """
+    def __init__(self, recorded=None, ack_delay: float = 0.05) -> None:
+        self.recorded = list(recorded or [])
+        self.ack_delay = ack_delay
+        self.received = []
+        self._clients = []
+        self._lock = threading.Lock()
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(("127.0.0.1", 0))
+        self._socket.listen()
+        self._running = False
+
+    @property
+    def url(self) -> str:
+        return f"ws://127.0.0.1:{self._socket.getsockname()[1]}/v5/private"
+
+    def start(self) -> "FakeStreamServer":
+        self._running = True
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._running = False
+        self._socket.close()
+        self.disconnect_all()
+
+    def push(self, message: dict) -> None:
+        """Envia uma mensagem para todos os clientes conectados."""
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            self._send(client, json.dumps(message))
+
+    def disconnect_all(self) -> None:
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for client in clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+                client.close()
+            except OSError:
+                pass
+
+    def _accept(self):
+        while self._running:
+            try:
+                client, _ = self._socket.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client):
+        try:
+            self._handshake(client)
+            with self._lock:
+                self._clients.append(client)
+            while True:
+                opcode, payload = self._recv_frame(client)
+                if opcode == 0x8:
+                    self._send(client, payload, opcode=0x8)
+                    return
+                if opcode == 0x9:
+                    self._send(client, payload, opcode=0xA)
+                    continue
+                if opcode == 0x1:
+                    self._handle(client, json.loads(payload))
+        except (OSError, ConnectionError, ValueError):
+            pass
+        finally:
+            with self._lock:
+                if client in self._clients:
+                    self._clients.remove(client)
+            client.close()
+
+    def _handle(self, client, message):
+        self.received.append(message)
+        op = message.get("op")
+        if op == "auth":
+            self._send(client, json.dumps({"op": "auth", "success": True, "ret_msg": "", "conn_id": "fake"}))
+        elif op == "ping":
+            self._send(client, json.dumps({"op": "pong", "ret_msg": "pong", "success": True}))
+        elif op == "subscribe":
+            # O pybit só registra o req_id depois de enviar a inscrição; a resposta sai
+            # com um pequeno atraso, como aconteceria na rede
+            threading.Timer(self.ack_delay, self._subscribed, args=(client, message)).start()
+
+    def _subscribed(self, client, message):
+        self._send(client, json.dumps({
+            "op": "subscribe", "success": True, "ret_msg": "", "req_id": message.get("req_id")
+        }))
+        for recorded in self.recorded:
+            if recorded.get("topic") in message["args"]:
+                self._send(client, json.dumps(recorded))
+
+    @staticmethod
+    def _handshake(client):
+        request = b""
+        while b"\r\n\r\n" not in request:
+            chunk = client.recv(4096)
+            if not chunk:
+                raise ConnectionError("handshake interrompido")
+            request += chunk
+        headers = {}
+        for line in request.decode().split("\r\n")[1:]:
+            if ": " in line:
+                key, value = line.split(": ", 1)
+                headers[key.lower()] = value
+        accept = base64.b64encode(
+            hashlib.sha1((headers["sec-websocket-key"] + _WS_GUID).encode()).digest()
+        ).decode()
+        client.sendall((
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+        ).encode())
+
+    @staticmethod
+    def _recv_exact(client, size):
+        data = b""
+        while len(data) < size:
+            chunk = client.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("conexão fechada")
+            data += chunk
+        return data
+
+    def _recv_frame(self, client):
+        first, second = self._recv_exact(client, 2)
+        opcode = first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self._recv_exact(client, 2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self._recv_exact(client, 8))[0]
+        mask = self._recv_exact(client, 4) if second & 0x80 else b"\x00" * 4
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self._recv_exact(client, length)))
+        return opcode, payload.decode() if opcode == 0x1 else payload
+
+    def _send(self, client, payload, opcode=0x1):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        header = bytes([0x80 | opcode])
+        if len(payload) < 126:
+            header += bytes([len(payload)])
+        elif len(payload) < 1 << 16:
+            header += bytes([126]) + struct.pack("!H", len(payload))
+        else:
+            header += bytes([127]) + struct.pack("!Q", len(payload))
+        with self._lock:
+            try:
+                client.sendall(header + payload)
+            except OSError:
+                pass
+
+
+# Limite por conta (requisições/s) de cada endpoint privado, como a Bybit informa em X-Bapi-Limit
+UID_LIMITS = {
+    "/v5/order/create": 10,
+    "/v5/order/create-batch": 10,
+    "/v5/position/set-leverage": 10,
+    "/v5/position/trading-stop": 10,
+}
+DEFAULT_UID_LIMIT = 50
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, handler, reuse_port: bool = False) -> None:
+        self.reuse_port = reuse_port
+        super().__init__(address, handler)
+
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+# ============================================================
+# Servidor HTTP com os endpoints v5 usados pelo TradingApi
+# ============================================================
+class MockBybitServer():
+    """
+    Servidor HTTP local que imita os endpoints REST v5 da Bybit usados pelo TradingApi.
+
+    Cada API key é uma conta com saldo e posições próprios; ordens a mercado são
+    executadas no preço configurado do símbolo. A assinatura não é validada.
+
+    Cada chamada é contada por rota em `calls` e cada execução é registrada em
+    `fills` como (api_key, symbol, time.perf_counter()), para medir quando a última
+    conta de um broadcast foi executada. `received` guarda (api_key, rota,
+    time.perf_counter()) da chegada de cada requisição, antes da latência simulada.
+
+    :param latency: (float) Atraso de cada resposta, em segundos.
+    :param prices: (dict) Preço por símbolo; símbolos ausentes usam 100.
+    :param balance: (float) Saldo USDT inicial de cada conta.
+    :param jitter: (float) Atraso extra aleatório, uniforme entre 0 e `jitter` segundos.
+    :param error_rate: (float) Probabilidade (0 a 1) de uma chamada falhar com `error_code`.
+    :param error_code: (int) retCode das falhas aleatórias.
+    :param seed: (int) Semente do sorteio de jitter e falhas, para execuções reproduzíveis.
+    :param port: (int) Porta local; 0 escolhe uma livre.
+    :param reuse_port: (bool) SO_REUSEPORT: vários processos atendem a mesma porta (ver serve_in_process).
+    """
+    def __init__(self, latency: float = 0.0, prices: dict | None = None, balance: float = 10000.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, error_code: int = 10016,
+                 seed: int | None = None, port: int = 0, reuse_port: bool = False) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.prices = dict(prices or {})
+        self.instruments = {}  # símbolo -> campos de priceFilter/lotSizeFilter/status que mudam do padrão
+        self.initial_balance = balance
+        self.batch_limit = 20
+        self.uid_limits = dict(UID_LIMITS)
+        self._uid_windows = {}
+        self.accounts = {}
+        self.calls = Counter()
+        self.fills = []
+        self.received = []
+        self._injected = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _HTTPServer(("127.0.0.1", port), self._handler_class(), reuse_port)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> "MockBybitServer":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def account(self, api_key: str) -> dict:
+        with self._lock:
+            return self.accounts.setdefault(api_key, {
+                "balance": self.initial_balance, "positions": {}, "orders": [], "leverage": {}
+            })
+
+    def price(self, symbol: str) -> float:
+        return float(self.prices.get(symbol, 100))
+
+    def inject(self, path: str, code: int = 10016, message: str = "Internal System Error.",
+               times: int = 1, status: int = 200, after: bool = False) -> None:
+        """
+        Faz as próximas `times` chamadas a `path` falharem.
+
+        :param path: (str) Rota, ex: "/v5/order/create".
+        :param code: (int) retCode devolvido (ignorado se `status` != 200).
+        :param message: (str) retMsg devolvido.
+        :param status: (int) Status HTTP da resposta.
+        :param after: (bool) Se True, a chamada é executada e só a resposta falha
+            (ex: ordem criada, mas a resposta se perdeu).
+        """
+        with self._lock:
+            self._injected.setdefault(path, deque()).extend([(status, code, message, after)] * times)
+
+    def _delay(self) -> float:
+        with self._lock:
+            return self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def _uid_quota(self, api_key: str, path: str) -> tuple:
+        """
+        Conta a chamada na janela de 1s da conta.
+
+        :return: (tuple) (cabeçalhos X-Bapi-Limit-*, True se a conta passou do limite).
+        """
+        limit = self.uid_limits.get(path, DEFAULT_UID_LIMIT)
+        window = int(time.time())
+        with self._lock:
+            start, count = self._uid_windows.get((api_key, path), (window, 0))
+            count = count + 1 if start == window else 1
+            self._uid_windows[(api_key, path)] = (window, count)
+        return {
+            "X-Bapi-Limit": str(limit),
+            "X-Bapi-Limit-Status": str(max(limit - count, 0)),
+            "X-Bapi-Limit-Reset-Timestamp": str((window + 1) * 1000),
+        }, count > limit
+
+    def _error_for(self, path: str):
+        """(status, retCode, retMsg, executada) da falha desta chamada, ou None."""
+        with self._lock:
+            if self._injected.get(path):
+                return self._injected[path].popleft()
+            if self.error_rate and self._random.random() < self.error_rate:
+                return 200, self.error_code, "Internal System Error.", False
+        return None
+
+    # ============================================================
+    # Endpoints
+    # ============================================================
+    def handle(self, method: str, path: str, params: dict, api_key: str | None):
+        """
+        Processa uma requisição e retorna (retCode, retMsg, result, retExtInfo).
+        """
+        route = self.routes.get((method, path))
+        if route is None:
+            return 10001, f"rota não suportada: {method} {path}", {}, {}
+        response = route(self, params, api_key)
+        return response if len(response) == 4 else (*response, {})
+
+    def _server_time(self, params, api_key):
+        now = time.time()
+        return 0, "OK", {"timeSecond": str(int(now)), "timeNano": str(int(now * 1e9))}
+
+    def _wallet_balance(self, params, api_key):
+        balance = self.account(api_key)["balance"]
+        return 0, "OK", {"list": [{"accountType": "UNIFIED", "coin": [
+            {"coin": "USDT", "walletBalance": str(balance), "equity": str(balance)}
+        ]}]}
+
+    def _tickers(self, params, api_key):
+        symbol = params["symbol"]
+        price = str(self.price(symbol))
+        return 0, "OK", {"category": "linear", "list": [
+            {"symbol": symbol, "lastPrice": price, "markPrice": price}
+        ]}
+
+    def _instrument(self, symbol):
+        override = self.instruments.get(symbol, {})
+        return {
+            "symbol": symbol, "status": override.get("status", "Trading"), "contractType": "LinearPerpetual",
+            "priceFilter": {
+                "tickSize": "0.01", "minPrice": "0.01", "maxPrice": "1999999", **override.get("priceFilter", {})
+            },
+            "lotSizeFilter": {
+                "qtyStep": "0.001", "minOrderQty": "0.001", "maxOrderQty": "1000",
+                "maxMktOrderQty": "500", "minNotionalValue": "5", **override.get("lotSizeFilter", {})
+            },
+        }
+
+    def _instruments_info(self, params, api_key):
+        if params.get("symbol"):
+            symbols = [params["symbol"]]
+        else:
+            symbols = sorted(set(self.prices) | set(self.instruments)) or ["BTCUSDT"]
+        # Paginação por cursor, como a Bybit: o cursor é o índice do próximo item
+        start = int(params.get("cursor") or 0)
+        end = start + int(params.get("limit") or 500)
+        return 0, "OK", {"category": "linear", "list": [self._instrument(symbol) for symbol in symbols[start:end]],
+                         "nextPageCursor": str(end) if end < len(symbols) else ""}
+
+    def _fill(self, account, order):
+        symbol = order["symbol"]
+        qty = float(order["qty"])
+        signed = qty if order["side"] == "Buy" else -qty
+        position = account["positions"].get(symbol)
+        current = 0.0 if position is None else (float(position["size"]) * (1 if position["side"] == "Buy" else -1))
+        if order.get("reduceOnly") and (current == 0 or abs(signed) > abs(current) or current * signed > 0):
+            return 110017, "current position is zero, cannot fix reduce-only order qty"
+        new = current + signed
+        if abs(new) < 1e-12:
+            account["positions"].pop(symbol, None)
+            return 0, "OK"
+        price = self.price(symbol)
+        account["positions"][symbol] = {
+            "symbol": symbol, "side": "Buy" if new > 0 else "Sell", "size": str(round(abs(new), 8)),
+            "avgPrice": str(price), "markPrice": str(price), "liqPrice": "",
+            "leverage": str(account["leverage"].get(symbol, 1)),
+            "takeProfit": order.get("takeProfit", ""), "stopLoss": order.get("stopLoss", ""),
+            "positionValue": str(round(abs(new) * price, 8)),
+            "curRealisedPnl": "0", "unrealisedPnl": "0",
+        }
+        return 0, "OK"
+
+    @staticmethod
+    def _duplicate(account, order):
+        link_id = order.get("orderLinkId")
+        return bool(link_id) and any(existing.get("orderLinkId") == link_id for existing in account["orders"])
+
+    def _create_order(self, params, api_key):
+        account = self.account(api_key)
+        with self._lock:
+            if self._duplicate(account, params):
+                return 110072, "OrderLinkedID is duplicate", {}
+            code, message = self._fill(account, params)
+            if code:
+                return code, message, {}
+            order_id = str(uuid.uuid4())
+            account["orders"].append({**params, "orderId": order_id, "orderStatus": "Filled"})
+            self.fills.append((api_key, params["symbol"], time.perf_counter()))
+        return 0, "OK", {"orderId": order_id, "orderLinkId": params.get("orderLinkId", "")}
+
+    def _create_batch(self, params, api_key):
+        orders = params.get("request") or []
+        if len(orders) > self.batch_limit:
+            return 10001, f"too many orders, limit {self.batch_limit}", {}
+        account = self.account(api_key)
+        created, statuses = [], []
+        for order in orders:
+            with self._lock:
+                if self._duplicate(account, order):
+                    code, message = 110072, "OrderLinkedID is duplicate"
+                else:
+                    code, message = self._fill(account, order)
+                order_id = "" if code else str(uuid.uuid4())
+                if not code:
+                    account["orders"].append({**order, "orderId": order_id, "orderStatus": "Filled"})
+                    self.fills.append((api_key, order["symbol"], time.perf_counter()))
+            created.append({"category": "linear", "symbol": order["symbol"], "orderId": order_id,
+                            "orderLinkId": order.get("orderLinkId", ""), "createAt": str(int(time.time() * 1000))})
+            statuses.append({"code": code, "msg": message})
+        return 0, "OK", {"list": created}, {"list": statuses}
+
+    def _realtime_orders(self, params, api_key):
+        # Como na Bybit, a consulta por orderLinkId também encontra ordens já executadas
+        orders = self.account(api_key)["orders"]
+        if params.get("orderLinkId"):
+            orders = [order for order in orders if order.get("orderLinkId") == params["orderLinkId"]]
+        return 0, "OK", {"category": "linear", "list": list(orders), "nextPageCursor": ""}
+
+    def _position_list(self, params, api_key):
+        positions = list(self.account(api_key)["positions"].values())
+        if params.get("symbol"):
+            positions = [position for position in positions if position["symbol"] == params["symbol"]]
+        return 0, "OK", {"category": "linear", "list": positions, "nextPageCursor": ""}
+
+    def _set_leverage(self, params, api_key):
+        account = self.account(api_key)
+        if account["leverage"].get(params["symbol"]) == params["buyLeverage"]:
+            return 110043, "leverage not modified", {}
+        account["leverage"][params["symbol"]] = params["buyLeverage"]
+        return 0, "OK", {}
+
+    def _trading_stop(self, params, api_key):
+        position = self.account(api_key)["positions"].get(params["symbol"])
+        if position is None:
+            return 10001, "can not set tp/sl/ts for zero position", {}
+        if params.get("takeProfit") is not None:
+            position["takeProfit"] = str(params["takeProfit"])
+        if params.get("stopLoss") is not None:
+            position["stopLoss"] = str(params["stopLoss"])
+        return 0, "OK", {}
+
+    routes = {
+        ("GET", "/v5/market/time"): _server_time,
+        ("GET", "/v5/account/wallet-balance"): _wallet_balance,
+        ("GET", "/v5/market/tickers"): _tickers,
+        ("GET", "/v5/market/instruments-info"): _instruments_info,
+        ("POST", "/v5/order/create"): _create_order,
+        ("POST", "/v5/order/create-batch"): _create_batch,
+        ("GET", "/v5/order/realtime"): _realtime_orders,
+        ("GET", "/v5/position/list"): _position_list,
+        ("POST", "/v5/position/set-leverage"): _set_leverage,
+        ("POST", "/v5/position/trading-stop"): _trading_stop,
+    }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # cabeçalho e corpo vão em writes separados
+
+            def log_message(self, format, *args):
+                pass
+
+            def _respond(self, method):
+                url = urlsplit(self.path)
+                arrived = time.perf_counter()
+                if method == "GET":
+                    params = dict(parse_qsl(url.query))
+                else:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    params = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.calls[url.path] += 1
+                    server.received.append((self.headers.get("X-BAPI-API-KEY"), url.path, arrived))
+                delay = server._delay()
+                if delay:
+                    time.sleep(delay)
+                api_key = self.headers.get("X-BAPI-API-KEY")
+                quota, exceeded = server._uid_quota(api_key, url.path) if api_key else ({}, False)
+                error = (200, 10006, "Too many visits!", False) if exceeded else server._error_for(url.path)
+                if error is not None:
+                    status, code, message, executed = error
+                    if executed:
+                        server.handle(method, url.path, params, api_key)
+                    result, ext_info = {}, {}
+                else:
+                    status = 200
+                    code, message, result, ext_info = server.handle(method, url.path, params, api_key)
+                body = json.dumps({
+                    "retCode": code, "retMsg": message, "result": result, "retExtInfo": ext_info,
+                    "time": int(time.time() * 1000)
+                }).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for header, value in quota.items():
+                    self.send_header(header, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+        return Handler
+
+
+def serve_in_process(connection, **options) -> None:
+    """
+    Roda um MockBybitServer neste processo (alvo de multiprocessing.Process): envia a URL
+    pelo `connection` e para quando recebe qualquer mensagem. Com reuse_port, vários
+    processos na mesma porta dividem as conexões, e o mock deixa de disputar o GIL com
+    quem está sendo medido. Cada processo tem o seu estado: só serve para cenários em
+    que as contas não dependem de ordens anteriores (ex: só aberturas).
+
+    :param options: argumentos do MockBybitServer.
+    """
+    server = MockBybitServer(**options).start()
+    connection.send(server.url)
+    try:
+        connection.recv()
+    except EOFError:
+        pass
+    server.stop()
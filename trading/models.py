@@ -1,8 +1,15 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 # Create your models here.
 
+class TradingUserQuerySet(models.QuerySet):
+    def for_broadcast(self):
+        """Contas com o User já carregado (evita uma query por conta ao ler o username)."""
+        return self.select_related("user")
+
 class TradingUser(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -12,6 +19,8 @@ class TradingUser(models.Model):
     demo = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
 
+    objects = TradingUserQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Trading User"
         verbose_name_plural = "Trading Users"
@@ -19,15 +28,190 @@ class TradingUser(models.Model):
     def __str__(self):
         return f"{self.user}"
 
+class LeverageQuerySet(models.QuerySet):
+    def by_user(self, symbol: str) -> dict:
+        """Mapa user_id -> alavancagem do símbolo, carregado em uma única query."""
+        return dict(self.filter(symbol=symbol).values_list("user_id", "leverage"))
+
+    def by_user_and_symbol(self, symbols) -> dict:
+        """Mapa user_id -> {symbol: alavancagem} dos símbolos, carregado em uma única query."""
+        leverages = {}
+        for user_id, symbol, leverage in self.filter(symbol__in=symbols).values_list("user_id", "symbol", "leverage"):
+            leverages.setdefault(user_id, {})[symbol] = leverage
+        return leverages
+
 class Leverage(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="leverages")
     symbol = models.CharField(max_length=20)
     leverage = models.IntegerField(default=1)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = LeverageQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Leverage"
         verbose_name_plural = "Leverages"
 
     def __str__(self):
         return f"{self.user} | {self.symbol} - {self.leverage}"
+
+class SignalJob(models.Model):
+    """Sinal enfileirado para execução em segundo plano (ver trading/jobs.py)."""
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    STATUS_CHOICES = [(PENDING, "Pendente"), (RUNNING, "Executando"), (COMPLETED, "Concluído")]
+
+    signal_id = models.CharField(max_length=64, unique=True)
+    kind = models.CharField(max_length=32)
+    params = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    total_tasks = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Signal Job"
+        verbose_name_plural = "Signal Jobs"
+
+    def __str__(self):
+        return f"{self.kind} {self.signal_id} ({self.status})"
+
+class SignalTaskQuerySet(models.QuerySet):
+    def progress(self) -> dict:
+        """Quantidade de tarefas por status, em uma única query."""
+        counts = dict.fromkeys([status for status, _ in SignalTask.STATUS_CHOICES], 0)
+        counts.update(self.values_list("status").annotate(total=models.Count("id")).order_by())
+        return counts
+
+class SignalTask(models.Model):
+    """Execução de um SignalJob em uma conta."""
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCESS = "success"
+    ERROR = "error"
+    STATUS_CHOICES = [(PENDING, "Pendente"), (RUNNING, "Executando"), (SUCCESS, "Sucesso"), (ERROR, "Erro")]
+    FINISHED = [SUCCESS, ERROR]
+
+    job = models.ForeignKey(SignalJob, on_delete=models.CASCADE, related_name="tasks")
+    account = models.ForeignKey(TradingUser, on_delete=models.CASCADE, related_name="signal_tasks")
+    # Alavancagem lida ao enfileirar: o worker não consulta o banco por conta
+    leverage = models.IntegerField(null=True, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    claim = models.CharField(max_length=32, blank=True, default="")
+    lease_until = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = SignalTaskQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Signal Task"
+        verbose_name_plural = "Signal Tasks"
+        indexes = [
+            models.Index(fields=["status", "lease_until"]),
+            models.Index(fields=["claim"]),
+            models.Index(fields=["job", "status"]),
+        ]
+
+    def __str__(self):
+        return f"{self.job.signal_id} | {self.account} ({self.status})"
+
+class HistoryQuerySet(models.QuerySet):
+    def window(self, start, end=None):
+        """Registros criados em [start, end) (sem `end`, até agora)."""
+        queryset = self.filter(created_at__gte=start)
+        return queryset if end is None else queryset.filter(created_at__lt=end)
+
+class SignalExecution(models.Model):
+    """Um sinal executado (fan-out) em todas as contas; ver trading/history.py."""
+    signal_id = models.CharField(max_length=64, db_index=True)
+    kind = models.CharField(max_length=32)
+    symbol = models.CharField(max_length=20, blank=True, default="")
+    params = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    total_accounts = models.IntegerField(default=0)
+    successful = models.IntegerField(default=0)
+    # Momento do sinal, não da gravação (o histórico é gravado depois da resposta)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = HistoryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Signal Execution"
+        verbose_name_plural = "Signal Executions"
+        indexes = [
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["symbol", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.symbol} {self.signal_id}"
+
+class Order(models.Model):
+    """Ordem (ou mudança de TP/SL) enviada a uma conta por um sinal."""
+    OPEN = "open"
+    CLOSE = "close"
+    TP_SL = "tp_sl"
+    KIND_CHOICES = [(OPEN, "Abertura"), (CLOSE, "Fechamento"), (TP_SL, "TP/SL")]
+    SUCCESS = "success"
+    ERROR = "error"
+    STATUS_CHOICES = [(SUCCESS, "Sucesso"), (ERROR, "Erro")]
+
+    execution = models.ForeignKey(SignalExecution, on_delete=models.CASCADE, related_name="orders",
+                                  null=True, blank=True)
+    account = models.ForeignKey(TradingUser, on_delete=models.CASCADE, related_name="orders")
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    symbol = models.CharField(max_length=20)
+    side = models.CharField(max_length=4, blank=True, default="")
+    qty = models.DecimalField(max_digits=28, decimal_places=10, null=True, blank=True)
+    take_profit = models.DecimalField(max_digits=28, decimal_places=10, null=True, blank=True)
+    stop_loss = models.DecimalField(max_digits=28, decimal_places=10, null=True, blank=True)
+    order_amount = models.DecimalField(max_digits=28, decimal_places=10, null=True, blank=True)
+    order_id = models.CharField(max_length=64, blank=True, default="")
+    order_link_id = models.CharField(max_length=45, blank=True, default="")
+    reconciled = models.BooleanField(default=False)
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = HistoryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Order"
+        verbose_name_plural = "Orders"
+        indexes = [
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["symbol", "created_at"]),
+            models.Index(fields=["account", "created_at"]),
+            models.Index(fields=["order_link_id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.account} | {self.kind} {self.side} {self.qty} {self.symbol} ({self.status})"
+
+class InstrumentRule(models.Model):
+    """
+    Regras de negociação de um símbolo linear da Bybit (priceFilter e lotSizeFilter),
+    guardadas localmente e atualizadas em lote (ver trading/instruments.py).
+    """
+    symbol = models.CharField(max_length=32, unique=True)
+    status = models.CharField(max_length=16, default="Trading")
+    tick_size = models.DecimalField(max_digits=28, decimal_places=10)
+    min_price = models.DecimalField(max_digits=28, decimal_places=10, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=28, decimal_places=10, null=True, blank=True)
+    qty_step = models.DecimalField(max_digits=28, decimal_places=10)
+    min_order_qty = models.DecimalField(max_digits=28, decimal_places=10)
+    max_order_qty = models.DecimalField(max_digits=28, decimal_places=10, null=True, blank=True)
+    # Limite das ordens a mercado, menor que max_order_qty
+    max_mkt_order_qty = models.DecimalField(max_digits=28, decimal_places=10, null=True, blank=True)
+    min_notional = models.DecimalField(max_digits=28, decimal_places=10, null=True, blank=True)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Instrument Rule"
+        verbose_name_plural = "Instrument Rules"
+
+    def __str__(self):
+        return f"{self.symbol} (tick {self.tick_size}, step {self.qty_step})"
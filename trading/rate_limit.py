@@ -0,0 +1,258 @@
+import asyncio
+import threading
+import time
+
+import requests
+from django.conf import settings
+
+from .metrics import metrics
+
+# Classe de cada endpoint v5 usado pelo TradingApi. O limite por UID da Bybit é por
+# endpoint; endpoints da mesma classe têm o mesmo limite padrão (requisições/s)
+ENDPOINT_CLASSES = {
+    "/v5/order/create": "order",
+    "/v5/order/create-batch": "order",
+    "/v5/order/amend": "order",
+    "/v5/order/cancel": "order",
+    "/v5/order/cancel-all": "order",
+    "/v5/position/set-leverage": "position_write",
+    "/v5/position/trading-stop": "position_write",
+    "/v5/position/switch-mode": "position_write",
+    "/v5/order/realtime": "order_read",
+    "/v5/execution/list": "order_read",
+    "/v5/position/list": "position_read",
+    "/v5/account/wallet-balance": "account_read",
+}
+CLASS_LIMITS = {
+    "order": 10,
+    "position_write": 10,
+    "order_read": 50,
+    "position_read": 50,
+    "account_read": 50,
+}
+# Entrada e saída de posição: nunca esperam atrás de leituras
+WRITE_CLASSES = {"order", "position_write"}
+
+
+def endpoint_class(path: str) -> str:
+    if path in ENDPOINT_CLASSES:
+        return ENDPOINT_CLASSES[path]
+    return "public" if path.startswith("/v5/market/") else "other"
+
+
+class RateLimitExceeded(RuntimeError):
+    """A requisição teria que esperar mais que TRADING_RATE_LIMIT_MAX_WAIT pela sua vez."""
+
+
+class TokenBucket():
+    """
+    Balde de tokens sem lock próprio (o RateLimiter serializa o acesso).
+    Os tokens podem ficar negativos: uma escrita reserva a vez e espera a dívida.
+    """
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, floor: float = 0.0) -> float:
+        """Segundos até haver um token acima de `floor`."""
+        return max(0.0, (floor + 1 - self.tokens) / self.rate)
+
+    def sync(self, now: float, limit: int, remaining: int, reset_in: float) -> None:
+        """Ajusta o balde à cota informada pela Bybit nos cabeçalhos X-Bapi-Limit-*."""
+        self.refill(now)
+        if limit > 0:
+            self.rate = self.capacity = float(limit)
+        self.tokens = min(self.tokens, float(remaining))
+        if remaining <= 0:
+            self.tokens = min(self.tokens, -reset_in * self.rate)
+
+
+# ============================================================
+# Agenda as requisições à Bybit dentro dos limites por IP e por UID
+# ============================================================
+class RateLimiter():
+    """
+    Controla o ritmo das requisições do processo à Bybit.
+
+    - Um balde por IP, para todas as contas: no máximo TRADING_IP_RATE_LIMIT requisições
+      em qualquer janela de TRADING_IP_RATE_WINDOW segundos.
+    - Um balde por conta (api_key) e classe de endpoint, com o limite por UID da Bybit,
+      corrigido a cada resposta pelos cabeçalhos X-Bapi-Limit-*.
+
+    Escritas (ordens, TP/SL, alavancagem) reservam a vez e só esperam o necessário.
+    Leituras só usam o balde do IP enquanto ele tiver mais que TRADING_RATE_LIMIT_READ_RESERVE
+    da capacidade, então uma rajada de leituras nunca atrasa uma ordem.
+
+    Tempo bloqueado e eventos de throttling vão para trading.metrics.
+    """
+    def __init__(self, ip_limit: int | None = None, ip_window: float | None = None,
+                 read_reserve: float | None = None, max_wait: float | None = None) -> None:
+        ip_limit = settings.TRADING_IP_RATE_LIMIT if ip_limit is None else ip_limit
+        ip_window = settings.TRADING_IP_RATE_WINDOW if ip_window is None else ip_window
+        read_reserve = settings.TRADING_RATE_LIMIT_READ_RESERVE if read_reserve is None else read_reserve
+        # Metade da cota em rajada e metade ao longo da janela: nunca passa de ip_limit por janela
+        self.ip = TokenBucket(ip_limit / (2 * ip_window), ip_limit / 2)
+        self.read_floor = read_reserve * self.ip.capacity
+        self.max_wait = settings.TRADING_RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+        self._uid = {}
+        self._lock = threading.Lock()
+
+    def _uid_bucket(self, api_key: str, cls: str) -> TokenBucket:
+        bucket = self._uid.get((api_key, cls))
+        if bucket is None:
+            bucket = self._uid[(api_key, cls)] = TokenBucket(CLASS_LIMITS[cls])
+        return bucket
+
+    def _try(self, api_key: str | None, cls: str, budget: float) -> tuple:
+        """
+        Tenta pegar a vez da requisição.
+
+        :return: (tuple) (conseguiu, segundos de espera). Uma escrita que consegue já
+            reservou os tokens e deve esperar o tempo retornado; uma leitura que não
+            consegue deve tentar de novo depois da espera.
+        """
+        write = cls in WRITE_CLASSES
+        with self._lock:
+            now = time.monotonic()
+            buckets = [(self.ip, 0.0 if write else self.read_floor)]
+            if api_key and cls in CLASS_LIMITS:
+                buckets.append((self._uid_bucket(api_key, cls), 0.0))
+            for bucket, _ in buckets:
+                bucket.refill(now)
+            wait = max(bucket.wait_time(floor) for bucket, floor in buckets)
+            if (write and wait <= budget) or wait == 0:
+                for bucket, _ in buckets:
+                    bucket.tokens -= 1
+                return True, wait
+            return False, wait
+
+    def _waits(self, api_key: str | None, path: str):
+        """Gera as esperas (segundos) até a requisição poder ser enviada."""
+        cls = endpoint_class(path)
+        start = time.monotonic()
+        deadline = start + self.max_wait
+        while True:
+            granted, wait = self._try(api_key, cls, deadline - time.monotonic())
+            if granted:
+                if wait > 0:
+                    yield wait
+                break
+            if time.monotonic() + wait > deadline:
+                metrics.increment("rate_limit_rejected_total", endpoint_class=cls)
+                raise RateLimitExceeded(
+                    f"Limite de requisições da Bybit ({cls}): espera maior que {self.max_wait}s"
+                )
+            yield wait
+        blocked = time.monotonic() - start
+        if blocked > 0.001:
+            metrics.increment("rate_limit_throttled_total", endpoint_class=cls)
+            metrics.increment("rate_limit_blocked_seconds_total", blocked, endpoint_class=cls)
+
+    def acquire(self, api_key: str | None, path: str) -> None:
+        """Bloqueia a thread até a requisição caber nos limites."""
+        for wait in self._waits(api_key, path):
+            time.sleep(wait)
+
+    async def acquire_async(self, api_key: str | None, path: str) -> None:
+        """Versão asyncio de acquire."""
+        for wait in self._waits(api_key, path):
+            await asyncio.sleep(wait)
+
+    def observe(self, api_key: str | None, path: str, headers) -> None:
+        """
+        Atualiza a cota da conta com os cabeçalhos de uma resposta da Bybit:
+        X-Bapi-Limit (limite/s), X-Bapi-Limit-Status (restante) e
+        X-Bapi-Limit-Reset-Timestamp (ms).
+        """
+        cls = endpoint_class(path)
+        limit, remaining = headers.get("X-Bapi-Limit"), headers.get("X-Bapi-Limit-Status")
+        if not api_key or cls not in CLASS_LIMITS or limit is None or remaining is None:
+            return
+        reset_at = headers.get("X-Bapi-Limit-Reset-Timestamp")
+        reset_in = max(int(reset_at) / 1000 - time.time(), 0.0) if reset_at else 1.0
+        with self._lock:
+            self._uid_bucket(api_key, cls).sync(time.monotonic(), int(limit), int(remaining), reset_in)
+        if int(remaining) <= 0:
+            metrics.increment("rate_limit_exhausted_total", endpoint_class=cls)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    """Retorna o RateLimiter do processo, criando-o na primeira chamada."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter()
+    return _limiter
+
+
+def reset_limiter() -> None:
+    """Descarta o RateLimiter do processo (ex: depois de mudar as configurações)."""
+    global _limiter
+    with _limiter_lock:
+        _limiter = None
+
+
+# ============================================================
+# Integração com os clientes HTTP (pybit/requests e httpx)
+# ============================================================
+class RateLimitedSession(requests.Session):
+    """requests.Session que passa cada envio pelo RateLimiter (inclusive os retries do pybit)."""
+    def __init__(self, limiter: RateLimiter) -> None:
+        super().__init__()
+        self.limiter = limiter
+
+    def send(self, request, **kwargs):
+        self.acquire(request)
+        return self.send_acquired(request, **kwargs)
+
+    def acquire(self, request) -> None:
+        """Espera a vez de `request` no RateLimiter, sem enviá-la (ver send_acquired)."""
+        self.limiter.acquire(request.headers.get("X-BAPI-API-KEY"), requests.utils.urlparse(request.url).path)
+
+    def send_acquired(self, request, **kwargs):
+        """Envia `request` cuja vez já foi tomada com acquire."""
+        response = super().send(request, **kwargs)
+        self.limiter.observe(request.headers.get("X-BAPI-API-KEY"), requests.utils.urlparse(request.url).path,
+                             response.headers)
+        return response
+
+
+def install(http) -> None:
+    """Troca o requests.Session de uma sessão HTTP do pybit por um RateLimitedSession."""
+    client = RateLimitedSession(get_limiter())
+    client.headers.update(http.client.headers)
+    http.client = client
+
+
+# Extensão do httpx.Request cuja vez no RateLimiter já foi tomada antes do envio
+ACQUIRED = "rate_limit_acquired"
+
+
+def httpx_event_hooks() -> dict:
+    """
+    event_hooks para um httpx.AsyncClient passar pelo RateLimiter do processo. Requisições
+    com a extensão ACQUIRED já esperaram a vez (ver AsyncTradingApi._send_prepared).
+    """
+    limiter = get_limiter()
+
+    async def before(request):
+        if request.extensions.get(ACQUIRED):
+            return
+        await limiter.acquire_async(request.headers.get("X-BAPI-API-KEY"), request.url.path)
+
+    async def after(response):
+        request = response.request
+        limiter.observe(request.headers.get("X-BAPI-API-KEY"), request.url.path, response.headers)
+
+    return {"request": [before], "response": [after]}
@@ -0,0 +1,119 @@
+import hashlib
+import time
+from typing import Any, NamedTuple
+
+from django.conf import settings
+
+from utils.cache import AsyncTTLCache, TTLCache
+from utils.fast_json import dumps
+
+
+class Snapshot(NamedTuple):
+    """Leitura de uma conta (saldo ou posições), com o hash do valor e o momento da busca."""
+    value: Any
+    digest: str
+    at: float
+
+    def age(self) -> float:
+        return time.monotonic() - self.at
+
+
+def snapshot(value) -> Snapshot:
+    """Serializa o valor uma vez, na busca: os polls seguintes comparam só o hash."""
+    return Snapshot(value, hashlib.sha1(dumps(value, sort_keys=True)).hexdigest(), time.monotonic())
+
+
+def max_age(request) -> float:
+    """
+    Idade máxima aceita para as leituras do request: ?max_age=<segundos> ou
+    TRADING_READ_CACHE_TTL, limitada a TRADING_READ_CACHE_MAX_AGE. 0 sempre consulta a Bybit.
+
+    :raises ValueError: max_age inválido.
+    """
+    raw = request.GET.get("max_age")
+    if raw is None:
+        return settings.TRADING_READ_CACHE_TTL
+    value = float(raw)
+    if not value >= 0:
+        raise ValueError(f"max_age inválido: {raw}")
+    return min(value, settings.TRADING_READ_CACHE_MAX_AGE)
+
+
+def etag(outcomes) -> str:
+    """
+    ETag fraco das leituras de todas as contas: muda se o valor (ou erro) de qualquer
+    conta mudar, sem serializar a resposta. Fraco porque cached_age muda a cada poll.
+
+    :param outcomes: (list) tuplas (account, Snapshot, error) do fan-out.
+    """
+    parts = hashlib.sha1()
+    for account, value, error in outcomes:
+        parts.update(f"{account.pk}:{value.digest if error is None else f'error:{error}'};".encode())
+    return f'W/"{parts.hexdigest()}"'
+
+
+def not_modified(request, tag: str) -> bool:
+    """True se o If-None-Match do cliente traz o ETag atual (ou "*")."""
+    header = request.headers.get("If-None-Match", "")
+    return any(candidate.strip() in (tag, tag.removeprefix("W/"), "*") for candidate in header.split(","))
+
+
+# ============================================================
+# Cache curto por conta, com coalescência de leituras iguais
+# ============================================================
+class ReadCache():
+    """
+    Último saldo e últimas posições de cada conta, por até TRADING_READ_CACHE_MAX_AGE
+    segundos. Polls concorrentes da mesma conta com o valor vencido esperam uma única
+    busca (single-flight, ver utils.cache.TTLCache). As views de ordens invalidam as
+    contas que operaram.
+    """
+    def __init__(self) -> None:
+        self._cache = TTLCache()
+
+    def get(self, kind: str, account, ttl: float, fetch) -> Snapshot:
+        """
+        :param kind: (str) "balance" ou "positions".
+        :param fetch: (callable) Leitura na Bybit, sem argumentos.
+        """
+        if ttl <= 0:
+            return snapshot(fetch())
+        return self._cache.get((kind, account.pk), ttl, lambda: snapshot(fetch()))
+
+    def all_fresh(self, kind: str, accounts, ttl: float) -> bool:
+        """True se todas as contas podem ser respondidas do cache (sem fan-out nem chamadas)."""
+        return ttl > 0 and all(self._cache.fresh((kind, account.pk), ttl) for account in accounts)
+
+    def invalidate(self, accounts=None) -> None:
+        """Descarta as leituras das contas (ou de todas, com None)."""
+        if accounts is None:
+            self._cache.invalidate()
+            return
+        for account in accounts:
+            for kind in ("balance", "positions"):
+                self._cache.invalidate((kind, account.pk))
+
+
+class AsyncReadCache(ReadCache):
+    """Versão asyncio do ReadCache, para as views de trading/async_views.py."""
+    def __init__(self) -> None:
+        self._cache = AsyncTTLCache()
+
+    async def get(self, kind: str, account, ttl: float, fetch) -> Snapshot:
+        """:param fetch: (callable) Função sem argumentos que retorna a corrotina da leitura."""
+        if ttl <= 0:
+            return snapshot(await fetch())
+
+        async def load():
+            return snapshot(await fetch())
+        return await self._cache.get((kind, account.pk), ttl, load)
+
+
+read_cache = ReadCache()
+async_read_cache = AsyncReadCache()
+
+
+def invalidate(accounts) -> None:
+    """Descarta as leituras das contas nos dois caches (views síncronas e assíncronas)."""
+    read_cache.invalidate(accounts)
+    async_read_cache.invalidate(accounts)
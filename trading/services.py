@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .account_state import book
+from .executor import fan_out
+from .instruments import instruments
+from .jobs import start_job_worker
+from .market_data import get_market_data
+from .models import TradingUser
+from .sessions import sessions, warm_sessions_in_background
+from .shards import warm_shards_in_background
+from .streams import streams
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# Atualiza os saldos de várias contas em paralelo
+# ============================================================
+def refresh_balances(users) -> list:
+    """
+    Consulta o saldo USDT das contas em paralelo e atualiza o AccountBook.
+
+    :param users: (iterable) TradingUsers a atualizar.
+    :return: (list) tuplas (user, saldo, error) do fan-out.
+    """
+    results = fan_out(users, lambda user: sessions.get(user).get_usdt_balance(), lane="read")
+    for user, balance, error in results:
+        if error is None:
+            book.set_balance(user.pk, balance)
+        else:
+            logger.warning("Falha ao atualizar saldo de %s: %s", user.pk, error)
+    return results
+
+
+def _every(interval: float, name: str, job) -> threading.Thread:
+    """Roda `job(active_users)` em uma thread daemon a cada `interval` segundos."""
+    def run():
+        while True:
+            try:
+                job(list(TradingUser.objects.filter(is_active=True)))
+            except Exception as e:
+                logger.warning("Falha em %s: %s", name, e)
+            finally:
+                connection.close()
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
+
+
+# ============================================================
+# Atualização periódica dos saldos em segundo plano
+# ============================================================
+def start_balance_refresher() -> threading.Thread | None:
+    """
+    Inicia uma thread que atualiza o saldo das contas ativas a cada
+    TRADING_BALANCE_REFRESH_INTERVAL segundos. Não faz nada se o intervalo for 0.
+    """
+    if not settings.TRADING_BALANCE_REFRESH_INTERVAL:
+        return None
+    return _every(settings.TRADING_BALANCE_REFRESH_INTERVAL, "balance-refresher", refresh_balances)
+
+
+# ============================================================
+# Atualização periódica da tabela de regras dos instrumentos
+# ============================================================
+def start_instrument_refresher() -> threading.Thread | None:
+    """
+    Inicia uma thread que busca as regras de todos os símbolos lineares (tickSize,
+    qtyStep, limites) e grava a tabela InstrumentRule a cada
+    TRADING_INSTRUMENT_REFRESH_INTERVAL segundos. Não faz nada se o intervalo for 0.
+    """
+    if not settings.TRADING_INSTRUMENT_REFRESH_INTERVAL:
+        return None
+    return _every(
+        settings.TRADING_INSTRUMENT_REFRESH_INTERVAL, "instrument-refresher",
+        lambda users: instruments.refresh(get_market_data())
+    )
+
+
+# ============================================================
+# Streams privados (posições e carteira) das contas ativas
+# ============================================================
+def start_account_streams() -> threading.Thread | None:
+    """
+    Inicia os streams privados de todas as contas ativas e os mantém em dia com o banco
+    a cada TRADING_STREAM_SYNC_INTERVAL segundos. Não faz nada se TRADING_ACCOUNT_STREAMS
+    estiver desligado.
+    """
+    if not settings.TRADING_ACCOUNT_STREAMS:
+        return None
+    return _every(settings.TRADING_STREAM_SYNC_INTERVAL, "account-streams", streams.sync)
+
+
+def start_background_services() -> None:
+    """
+    Inicia as tarefas de segundo plano do processo servidor (wsgi/asgi):
+    aquecimento das sessões (nos processos dos shards, com TRADING_SHARDS), atualização
+    periódica dos saldos e das regras dos instrumentos, streams privados e o worker da
+    fila de sinais.
+    """
+    if settings.TRADING_SHARDS:
+        warm_shards_in_background()
+    else:
+        warm_sessions_in_background()
+    start_balance_refresher()
+    start_instrument_refresher()
+    start_account_streams()
+    start_job_worker()
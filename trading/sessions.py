@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import threading
+import weakref
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .account_state import book
+from .async_trading_api import AsyncTradingApi
+from .executor import fan_out
+from .models import TradingUser
+from .trading_api import TradingApi
+
+logger = logging.getLogger(__name__)
+
+
+class SessionRegistry():
+    """
+    Mantém um TradingApi por TradingUser durante toda a vida do processo.
+
+    Cada TradingApi guarda a sessão HTTP do pybit (requests.Session com keep-alive),
+    então reusar a instância evita um novo handshake TLS com a Bybit a cada request.
+    A sessão é recriada quando api_key, api_secret ou demo mudam.
+    """
+    def __init__(self) -> None:
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _credentials(user) -> tuple:
+        return (user.api_key, user.api_secret, user.demo)
+
+    def get(self, user) -> TradingApi:
+        """
+        Retorna o TradingApi da conta, criando-o se não existir ou se as credenciais mudaram.
+
+        :param user: (TradingUser) Conta de trading.
+        :return: (TradingApi) sessão autenticada da conta.
+        """
+        credentials = self._credentials(user)
+        entry = self._sessions.get(user.pk)
+        if entry is not None and entry[0] == credentials:
+            return entry[1]
+
+        with self._lock:
+            entry = self._sessions.get(user.pk)
+            if entry is None or entry[0] != credentials:
+                entry = (credentials, TradingApi(
+                    user.api_key, user.api_secret, user.demo,
+                    timeout=settings.TRADING_ACCOUNT_TIMEOUT, state=book.account(user.pk)
+                ))
+                self._sessions[user.pk] = entry
+            return entry[1]
+
+    def drop(self, pk) -> None:
+        """Descarta a sessão da conta (ex: conta removida)."""
+        with self._lock:
+            self._sessions.pop(pk, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+
+    def warm(self, users) -> list:
+        """
+        Cria as sessões das contas e abre a conexão de cada uma com a Bybit.
+
+        :param users: (iterable) TradingUsers a aquecer.
+        :return: (list) tuplas (user, value, error) do fan-out.
+        """
+        results = fan_out(users, lambda user: self.get(user).ping(), lane="read")
+        for user, _, error in results:
+            if error is not None:
+                logger.warning("Falha ao aquecer sessão de %s: %s", user.pk, error)
+        return results
+
+
+sessions = SessionRegistry()
+
+
+class AsyncSessionRegistry():
+    """
+    Equivalente do SessionRegistry para AsyncTradingApi. Clientes httpx ficam presos
+    ao event loop que os criou, então há um registro separado por loop.
+    """
+    def __init__(self) -> None:
+        self._loops = weakref.WeakKeyDictionary()
+
+    def get(self, user) -> AsyncTradingApi:
+        """
+        Retorna o AsyncTradingApi da conta no event loop atual.
+
+        :param user: (TradingUser) Conta de trading.
+        :return: (AsyncTradingApi) sessão autenticada da conta.
+        """
+        registry = self._loops.setdefault(asyncio.get_running_loop(), {})
+        credentials = SessionRegistry._credentials(user)
+        entry = registry.get(user.pk)
+        if entry is None or entry[0] != credentials:
+            entry = (credentials, AsyncTradingApi(
+                user.api_key, user.api_secret, user.demo, timeout=settings.TRADING_ACCOUNT_TIMEOUT,
+                state=book.account(user.pk)
+            ))
+            registry[user.pk] = entry
+        return entry[1]
+
+
+async_sessions = AsyncSessionRegistry()
+
+
+@receiver(post_save, sender=TradingUser)
+def _trading_user_saved(sender, instance, **kwargs):
+    entry = sessions._sessions.get(instance.pk)
+    if entry is not None and entry[0] != SessionRegistry._credentials(instance):
+        sessions.drop(instance.pk)
+        book.drop(instance.pk)
+
+
+@receiver(post_delete, sender=TradingUser)
+def _trading_user_deleted(sender, instance, **kwargs):
+    sessions.drop(instance.pk)
+    book.drop(instance.pk)
+
+
+# ============================================================
+# Aquecimento das sessões na inicialização do processo
+# ============================================================
+def warm_sessions_in_background() -> threading.Thread | None:
+    """
+    Aquece, em uma thread separada, as sessões de todas as contas ativas para que o
+    primeiro sinal depois de um deploy não pague os handshakes.
+    Não faz nada se TRADING_WARM_SESSIONS estiver desligado.
+    """
+    if not settings.TRADING_WARM_SESSIONS:
+        return None
+
+    def warm():
+        try:
+            sessions.warm(list(TradingUser.objects.filter(is_active=True)))
+        except Exception as e:
+            logger.warning("Falha ao aquecer sessões: %s", e)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=warm, name="warm-sessions", daemon=True)
+    thread.start()
+    return thread
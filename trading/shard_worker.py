@@ -0,0 +1,41 @@
+import threading
+
+
+def serve(connection, overrides: dict) -> None:
+    """
+    Loop de um processo do ShardPool (ver trading/shards.py). Roda antes de o Django
+    estar configurado no processo novo, por isso os imports do app ficam aqui dentro.
+
+    Cada mensagem é um sinal para contas do shard, executado em uma thread própria
+    (sinais concorrentes não esperam um pelo outro); as sessões do SessionRegistry do
+    processo ficam abertas entre os sinais. None encerra o processo.
+
+    :param connection: (multiprocessing.connection.Connection) Pipe com o processo do request.
+    :param overrides: (dict) Configurações TRADING_* do processo que iniciou o pool.
+    """
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from .shards import _portable, run_signal
+
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    send_lock = threading.Lock()
+
+    def handle(message):
+        try:
+            reply = run_signal(message)
+        except Exception as e:
+            reply = (message[0], _portable(e))
+        with send_lock:
+            connection.send(reply)
+
+    while True:
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        threading.Thread(target=handle, args=(message,), daemon=True).start()
@@ -0,0 +1,421 @@
+import itertools
+import logging
+import multiprocessing
+import pickle
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError, as_completed
+from typing import Any, NamedTuple
+
+from django.conf import settings
+from django.db import connection
+
+from .account_state import book
+from .executor import AccountTimeoutError, check_deadline, fan_out
+from .instruments import instruments
+from .market_data import get_market_data
+from .models import Leverage, TradingUser
+from .sessions import sessions
+from .sizing import size_orders
+from .shard_worker import serve
+from .trading_api import order_link_id
+
+logger = logging.getLogger(__name__)
+
+
+class ShardAccount(NamedTuple):
+    """
+    O que um processo do shard precisa de uma conta: credenciais para a sessão, a
+    alavancagem do sinal (int do símbolo ou {symbol: alavancagem} no sinal em lote) e o
+    (saldo, idade) recente do AccountBook do processo do request, se houver.
+    """
+    pk: int
+    api_key: str
+    api_secret: str
+    demo: bool
+    leverage: Any = None
+    balance: tuple | None = None
+
+
+class ShardTask(NamedTuple):
+    """
+    Sinal em forma serializável, para rodar nos processos do ShardPool: o tipo (chave de
+    SHARD_KINDS), os parâmetros, o signal_id e as alavancagens por user_id.
+    """
+    kind: str
+    params: dict
+    signal_id: str
+    leverages: dict = {}
+
+
+class ShardError(RuntimeError):
+    """Erro de uma conta em um processo do shard; a causa original vem junto quando é serializável."""
+
+
+# ============================================================
+# Execução de cada tipo de sinal em uma conta (roda no processo do shard, sem acessar o banco)
+# ============================================================
+def _known_balance(account):
+    """(saldo, idade) enviado pelo processo do request, senão o do AccountBook do shard, senão (None, 0.0)."""
+    known = account.balance or book.get_balance(account.pk, settings.TRADING_BALANCE_MAX_AGE)
+    return known if known else (None, 0.0)
+
+def _presize(accounts, params):
+    """
+    Dimensiona de uma vez (sizing.size_orders) as contas com saldo conhecido, como o
+    views._presize no processo do request.
+
+    :return: (dict) {pk: resultado de size_orders}.
+    """
+    if not settings.TRADING_BATCH_SIZING:
+        return {}
+    presized = {}
+    for demo in {account.demo for account in accounts}:
+        known = []
+        for account in accounts:
+            balance = _known_balance(account)[0]
+            if account.demo == demo and account.leverage is not None and balance is not None:
+                known.append((account.pk, balance, account.leverage))
+        if not known:
+            continue
+        try:
+            market_data = get_market_data(demo)
+            price = float(market_data.get_ticker(params["symbol"])["lastPrice"])
+            rule = instruments.get(params["symbol"], market_data)
+        except Exception:
+            continue  # essas contas dimensionam sozinhas e reportam o erro
+        sized = size_orders([balance for _, balance, _ in known], [leverage for _, _, leverage in known], rule,
+                            price, params["percent"], params["profit"], params["max_loss"], params["side"])
+        presized.update(zip([pk for pk, _, _ in known], sized))
+    return presized
+
+def _prepare_order(account, params, signal_id, presized):
+    if account.leverage is None:
+        raise Leverage.DoesNotExist("Leverage matching query does not exist.")
+    balance, balance_age = _known_balance(account)
+    return balance_age, sessions.get(account).prepare_order_tp_sl(
+        params["percent"], params["symbol"], params["profit"], params["max_loss"], params["side"],
+        account.leverage, balance, order_link_id(signal_id, account.pk), sized=presized.get(account.pk)
+    )
+
+def _send_order(account, prepared):
+    balance_age, order = prepared
+    order = sessions.get(account).send_order(order)
+    order["balance_age"] = round(balance_age, 3)
+    return order
+
+def _place_batch_order(account, params, signal_id):
+    link_ids = [order_link_id(signal_id, account.pk, leg) for leg in range(len(params["legs"]))]
+    return sessions.get(account).place_batch_order_tp_sl(
+        params["legs"], account.leverage or {}, _known_balance(account)[0], link_ids
+    )
+
+def _close_order(account, params, signal_id):
+    order = sessions.get(account).close_order(params["symbol"], order_link_id(signal_id, account.pk))
+    order["PnL"] = order.pop("uPnL")
+    return order
+
+def _close_all(account, params, signal_id):
+    return sessions.get(account).close_all(lambda symbol: order_link_id(signal_id, account.pk, symbol))
+
+def _ping(account, params, signal_id):
+    return sessions.get(account).ping()
+
+def _place_order(accounts, params, signal_id, end, deadline):
+    """
+    Task do fan-out do place_order, como views._dispatch: com TRADING_PRESIGNED_ORDERS a
+    ordem de todas as contas do shard é dimensionada e assinada antes do primeiro envio,
+    e preparação e envio dividem o mesmo prazo.
+    """
+    presized = _presize(accounts, params)
+    prepare = lambda account: _prepare_order(account, params, signal_id, presized)
+    if not settings.TRADING_PRESIGNED_ORDERS:
+        return lambda account: _send_order(account, prepare(account))
+
+    prepared = {
+        account.pk: (value, error)
+        for account, value, error in fan_out(accounts, prepare, deadline=max(end - time.monotonic(), 0.0))
+    }
+
+    def task(account):
+        value, error = prepared[account.pk]
+        if error is not None:
+            raise error
+        check_deadline(end, deadline)
+        return _send_order(account, value)
+    return task
+
+def _per_account(execute):
+    """Task do fan-out que só roda `execute(conta, params, signal_id)` em cada conta."""
+    return lambda accounts, params, signal_id, end, deadline: lambda account: execute(account, params, signal_id)
+
+# Tipos de sinal: função que monta a task do fan-out a partir de (contas, params, signal_id,
+# fim do prazo em time.monotonic(), prazo em segundos) e símbolos cujo preço e regras são aquecidos antes
+SHARD_KINDS = {
+    "place_order": (_place_order, lambda params: [params["symbol"]]),
+    "place_batch_order": (
+        _per_account(_place_batch_order), lambda params: [leg["symbol"] for leg in params["legs"]]
+    ),
+    "close_order": (_per_account(_close_order), lambda params: []),
+    "close_all": (_per_account(_close_all), lambda params: []),
+    "warm": (_per_account(_ping), lambda params: []),
+}
+
+
+# ============================================================
+# Execução de um sinal no processo do shard (ver trading/shard_worker.py)
+# ============================================================
+def _portable(error):
+    """(mensagem, causa original) de um erro; a causa só vai se atravessar o pipe (pickle)."""
+    cause = error
+    while cause.__cause__ is not None:
+        cause = cause.__cause__
+    try:
+        pickle.loads(pickle.dumps(cause))
+    except Exception:
+        cause = None
+    return str(error), cause
+
+def run_signal(message) -> tuple:
+    """
+    Executa um sinal nas contas do shard, no pool de threads do processo.
+
+    :param message: (tuple) (request_id, ShardTask, [ShardAccount], deadline).
+    :return: (tuple) (request_id, [(pk, value, error)]), com error no formato de _portable.
+    """
+    request_id, task, accounts, deadline = message
+    end = time.monotonic() + deadline
+    make_task, symbols = SHARD_KINDS[task.kind]
+    for demo in {account.demo for account in accounts}:
+        for symbol in symbols(task.params):
+            try:
+                get_market_data(demo).get_ticker(symbol)
+                instruments.get(symbol, get_market_data(demo))
+            except Exception:
+                pass  # cada conta vai reportar o erro ao tentar de novo
+    lane = "read" if task.kind == "warm" else "write"
+    execute = make_task(accounts, task.params, task.signal_id, end, deadline)
+    results = fan_out(accounts, execute, deadline=max(end - time.monotonic(), 0.0), lane=lane)
+    return request_id, [
+        (account.pk, value, None if error is None else _portable(error)) for account, value, error in results
+    ]
+
+# ============================================================
+# Pool de processos, cada um dono de uma fatia das contas
+# ============================================================
+class Shard():
+    """Um processo do pool, com o pipe e os sinais que ainda esperam resposta."""
+    def __init__(self, index: int, overrides: dict) -> None:
+        self.index = index
+        context = multiprocessing.get_context("spawn")
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=serve, args=(child, overrides), name=f"trading-shard-{index}",
+                                       daemon=True)
+        self.process.start()
+        child.close()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, name=f"shard-reader-{index}", daemon=True)
+        self._reader.start()
+
+    @property
+    def alive(self) -> bool:
+        return self.process.is_alive() and self._reader.is_alive()
+
+    def submit(self, request_id: int, task: ShardTask, accounts: list, deadline: float) -> Future:
+        future = Future()
+        with self._lock:
+            self._pending[request_id] = future
+            self.connection.send((request_id, task, accounts, deadline))
+        return future
+
+    def _read(self):
+        while True:
+            try:
+                request_id, results = self.connection.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self._pending.pop(request_id, None)
+            if future is not None:
+                future.set_result(results)
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(ShardError(f"Processo do shard {self.index} terminou"))
+
+    def stop(self) -> None:
+        try:
+            with self._lock:
+                self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.connection.close()
+
+
+class ShardPool():
+    """
+    TRADING_SHARDS processos de longa duração, iniciados no primeiro sinal. A conta com
+    pk p pertence sempre ao shard p % TRADING_SHARDS, então cada processo mantém abertas
+    só as sessões da sua fatia, e cada processo tem o seu próprio GIL, pools de threads e
+    sockets: o fan-out de milhares de contas deixa de caber em um único processo.
+
+    O processo do request espalha o sinal pelos shards (ShardTask + ShardAccount, sem
+    closures) e junta os resultados; histórico e banco continuam no processo do request.
+    Os limites por conta da Bybit valem por shard sem mudança (cada conta vive em um só
+    processo); o limite por IP é dividido entre os shards.
+    """
+    def __init__(self) -> None:
+        self._shards = []
+        self._started_with = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+
+    @staticmethod
+    def enabled() -> bool:
+        return settings.TRADING_SHARDS > 0
+
+    def __len__(self) -> int:
+        return len(self._shards)
+
+    @staticmethod
+    def _overrides(count: int) -> dict:
+        """Configurações TRADING_* do processo atual (inclusive override_settings) para os shards."""
+        overrides = {name: getattr(settings, name) for name in dir(settings) if name.startswith("TRADING_")}
+        overrides["TRADING_IP_RATE_LIMIT"] = max(settings.TRADING_IP_RATE_LIMIT // count, 1)
+        overrides["TRADING_WARM_SESSIONS"] = False
+        return overrides
+
+    def start(self) -> "ShardPool":
+        """
+        Inicia os processos com as configurações atuais, ou recria os que morreram com as
+        configurações do início do pool. Mudanças em TRADING_SHARDS ou em outra configuração
+        TRADING_* só valem depois de stop(); cada sinal só confere se os processos estão vivos.
+        """
+        if self._shards and all(shard.alive for shard in self._shards):
+            return self
+        with self._lock:
+            if not self._shards:
+                count = settings.TRADING_SHARDS
+                self._started_with = self._overrides(count)
+                self._shards = [Shard(index, self._started_with) for index in range(count)]
+            for index, shard in enumerate(self._shards):
+                if not shard.alive:
+                    logger.warning("Shard %s reiniciado", index)
+                    self._shards[index] = Shard(index, self._started_with)
+        return self
+
+    def _stop(self):
+        for shard in self._shards:
+            shard.stop()
+        self._shards, self._started_with = [], None
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stop()
+
+    def shard_of(self, pk: int) -> int:
+        return pk % len(self._shards)
+
+    def iter_fan_out(self, users, task: ShardTask, deadline: float | None = None):
+        """
+        Executa `task` para cada conta no processo do seu shard e entrega os resultados
+        de cada shard assim que ele responde. Shards que não respondem até `deadline`
+        (padrão TRADING_BROADCAST_DEADLINE) têm as contas reportadas com AccountTimeoutError.
+
+        :param users: (iterable) TradingUsers.
+        :return: (generator) tuplas (user, value, error), como executor.iter_fan_out.
+        """
+        deadline = settings.TRADING_BROADCAST_DEADLINE if deadline is None else deadline
+        self.start()
+        by_shard = {}
+        for user in users:
+            by_shard.setdefault(self.shard_of(user.pk), []).append(user)
+
+        futures = {}
+        for index, shard_users in by_shard.items():
+            accounts = [
+                ShardAccount(user.pk, user.api_key, user.api_secret, user.demo, task.leverages.get(user.user_id),
+                             book.get_balance(user.pk, settings.TRADING_BALANCE_MAX_AGE))
+                for user in shard_users
+            ]
+            try:
+                futures[self._shards[index].submit(next(self._ids), task, accounts, deadline)] = shard_users
+            except OSError as e:
+                failed = Future()
+                failed.set_exception(ShardError(f"Processo do shard {index} indisponível: {e}"))
+                futures[failed] = shard_users
+
+        pending = set(futures)
+        try:
+            # Margem para o shard serializar a resposta depois do próprio prazo
+            for future in as_completed(futures, timeout=deadline + 1):
+                pending.discard(future)
+                yield from self._outcomes(futures[future], future)
+        except FutureTimeoutError:
+            for future in pending:
+                for user in futures[future]:
+                    yield user, None, AccountTimeoutError(f"Prazo total excedido ({deadline}s)")
+
+    @staticmethod
+    def _outcomes(users, future):
+        try:
+            results = future.result()
+        except Exception as e:
+            for user in users:
+                yield user, None, e
+            return
+        if isinstance(results, tuple):  # o shard falhou antes do fan-out
+            results = [(user.pk, None, results) for user in users]
+        by_pk = {user.pk: user for user in users}
+        for pk, value, error in results:
+            if error is None:
+                yield by_pk[pk], value, None
+                continue
+            message, cause = error
+            shard_error = ShardError(message)
+            shard_error.__cause__ = cause
+            yield by_pk[pk], None, shard_error
+
+    def fan_out(self, users, task: ShardTask, deadline: float | None = None) -> list:
+        """Igual a iter_fan_out, mas devolve os resultados na ordem das contas recebidas."""
+        users = list(users)
+        position = {id(user): index for index, user in enumerate(users)}
+        results = list(self.iter_fan_out(users, task, deadline))
+        results.sort(key=lambda item: position[id(item[0])])
+        return results
+
+    def warm(self, users) -> list:
+        """Abre as sessões de cada conta no processo do seu shard (ver SessionRegistry.warm)."""
+        results = self.fan_out(users, ShardTask("warm", {}, ""))
+        for user, _, error in results:
+            if error is not None:
+                logger.warning("Falha ao aquecer sessão de %s: %s", user.pk, error)
+        return results
+
+
+shards = ShardPool()
+
+
+def warm_shards_in_background() -> threading.Thread | None:
+    """
+    Inicia os shards e aquece, cada um no seu processo, as sessões das contas ativas.
+    Não faz nada se TRADING_WARM_SESSIONS estiver desligado.
+    """
+    if not settings.TRADING_WARM_SESSIONS:
+        return None
+
+    def warm():
+        try:
+            shards.warm(list(TradingUser.objects.filter(is_active=True)))
+        except Exception as e:
+            logger.warning("Falha ao aquecer shards: %s", e)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=warm, name="warm-shards", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,58 @@
+import hashlib
+import hmac
+import json
+import time
+
+RECV_WINDOW = 5000
+
+
+# ============================================================
+# Assinatura das requisições privadas da API v5 da Bybit
+# ============================================================
+def encode_query(params: dict) -> str:
+    """
+    Monta a query string de um GET como o pybit faz (chaves ordenadas, sem None).
+
+    :param params: (dict) Parâmetros da requisição.
+    :return: (str) query string usada na URL e na assinatura.
+    """
+    return "&".join(f"{key}={value}" for key, value in sorted(params.items()) if value is not None)
+
+
+def encode_body(params: dict) -> str:
+    """
+    Monta o corpo JSON de um POST, removendo parâmetros None.
+
+    :param params: (dict) Parâmetros da requisição.
+    :return: (str) corpo JSON usado na requisição e na assinatura.
+    """
+    return json.dumps({key: value for key, value in params.items() if value is not None})
+
+
+def auth_headers(api_key: str, api_secret: str, payload: str,
+                 timestamp: int | None = None, recv_window: int = RECV_WINDOW) -> dict:
+    """
+    Gera os cabeçalhos de autenticação HMAC-SHA256 da Bybit.
+
+    :param api_key: (str) API key da conta.
+    :param api_secret: (str) API secret da conta.
+    :param payload: (str) Query string (GET) ou corpo JSON (POST).
+    :param timestamp: (int) Timestamp em milissegundos; se None, usa o horário atual.
+    :param recv_window: (int) Janela de validade da requisição, em milissegundos.
+    :return: (dict) cabeçalhos X-BAPI-*.
+    """
+    if timestamp is None:
+        timestamp = int(time.time() * 1000)
+    signature = hmac.new(
+        api_secret.encode("utf-8"),
+        f"{timestamp}{api_key}{recv_window}{payload}".encode("utf-8"),
+        hashlib.sha256,
+    ).hexdigest()
+    return {
+        "Content-Type": "application/json",
+        "X-BAPI-API-KEY": api_key,
+        "X-BAPI-SIGN": signature,
+        "X-BAPI-SIGN-TYPE": "2",
+        "X-BAPI-TIMESTAMP": str(timestamp),
+        "X-BAPI-RECV-WINDOW": str(recv_window),
+    }
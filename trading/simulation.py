@@ -0,0 +1,547 @@
+"""
+Backend simulado do TradingApi: uma bolsa linear em memória (MatchingEngine) que executa
+as ordens das contas contra um caminho de preços, acompanha posições e PnL e dispara
+TP/SL. Usado pelo dry-run das views (?dry_run=1) e pelo comando replay_signals.
+"""
+import heapq
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime as dt, timezone
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from pybit.exceptions import InvalidRequestError
+
+from .account_state import book
+from .instruments import instruments, rule_from_info
+from .market_data import get_market_data
+from .timing import stage
+from .trading_api import TradingApi, order_link_id
+
+# Regras usadas para símbolos sem InstrumentRule quando não há mercado real (replay)
+DEFAULT_INSTRUMENT = {
+    "status": "Trading",
+    "priceFilter": {"tickSize": "0.01", "minPrice": "0.01", "maxPrice": "1999999"},
+    "lotSizeFilter": {"qtyStep": "0.001", "minOrderQty": "0.001", "maxOrderQty": "1000000",
+                      "maxMktOrderQty": "1000000", "minNotionalValue": "5"},
+}
+TAKER_FEE = Decimal("0.00055")
+ZERO = Decimal(0)
+
+
+class SimulationError(Exception):
+    """Recusa da bolsa simulada, com o mesmo retCode que a Bybit usaria."""
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def _text(value: Decimal | None) -> str:
+    return "" if value is None else f"{value.normalize():f}"
+
+
+# ============================================================
+# Bolsa simulada: execução, posições, PnL e gatilhos de TP/SL
+# ============================================================
+class MatchingEngine():
+    """
+    Bolsa linear (USDT) em memória. Ordens a mercado são executadas inteiras no preço
+    atual do símbolo; o preço muda por set_price (caminho de preços de um replay) ou,
+    sem preço definido, vem do mercado real (dry-run).
+
+    Posições são one-way (uma por símbolo), com preço médio, PnL realizado e não
+    realizado, TP/SL e margem inicial (valor / alavancagem). A cada preço novo as
+    posições do símbolo com TP ou SL atingido são fechadas no preço do gatilho.
+
+    :param prices: (dict) Preço inicial por símbolo.
+    :param balance: (float) Saldo inicial das contas que não informam outro.
+    :param fee_rate: (Decimal) Taxa taker sobre o valor executado.
+    :param market_data: (MarketData) Preço e regras reais de símbolos sem preço definido.
+    :param rules: (dict) InstrumentRule por símbolo, no lugar das regras reais/padrão.
+    :param leverage: (int) Alavancagem das contas em símbolos sem set_leverage.
+    """
+    def __init__(self, prices: dict | None = None, balance: float = 10000.0, fee_rate: Decimal = TAKER_FEE,
+                 market_data=None, rules: dict | None = None, leverage: int = 1) -> None:
+        self.prices = {symbol: Decimal(str(price)) for symbol, price in (prices or {}).items()}
+        self.initial_balance = Decimal(str(balance))
+        self.fee_rate = fee_rate
+        self.market_data = market_data
+        self.rules = dict(rules or {})
+        self.leverage = leverage
+        self.accounts = {}
+        self.triggers = []
+        self._by_symbol = defaultdict(set)  # símbolo -> contas com posição aberta
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------
+    # Mercado
+    # ------------------------------------------------------------
+    def price(self, symbol: str) -> Decimal:
+        price = self.prices.get(symbol)
+        if price is not None:
+            return price
+        if self.market_data is None:
+            raise SimulationError(10001, f"params error: symbol invalid ({symbol} sem preço)")
+        return Decimal(str(self.market_data.get_ticker(symbol)["lastPrice"]))
+
+    def rule(self, symbol: str):
+        """InstrumentRule do símbolo: self.rules, regras reais (com mercado) ou DEFAULT_INSTRUMENT."""
+        rule = self.rules.get(symbol)
+        if rule is None:
+            if self.market_data is not None:
+                return instruments.get(symbol, self.market_data)
+            rule = self.rules[symbol] = rule_from_info({"symbol": symbol, **DEFAULT_INSTRUMENT})
+        return rule
+
+    def set_price(self, symbol: str, price) -> list:
+        """
+        Move o preço do símbolo e executa os TP/SL atingidos.
+
+        :return: (list) gatilhos executados: dicts com account, symbol, kind ("tp"/"sl"),
+            price, qty e pnl.
+        """
+        price = Decimal(str(price))
+        with self._lock:
+            self.prices[symbol] = price
+            fired = []
+            for key in list(self._by_symbol[symbol]):
+                position = self.accounts[key]["positions"][symbol]
+                long = position["size"] > 0
+                tp, sl = position["tp"], position["sl"]
+                if tp is not None and (price >= tp if long else price <= tp):
+                    kind, at = "tp", tp
+                elif sl is not None and (price <= sl if long else price >= sl):
+                    kind, at = "sl", sl
+                else:
+                    continue
+                qty = abs(position["size"])
+                pnl = self._trade(key, symbol, -position["size"], at)
+                fired.append({"account": key, "symbol": symbol, "kind": kind, "price": at, "qty": qty, "pnl": pnl})
+            self.triggers += fired
+        return fired
+
+    # ------------------------------------------------------------
+    # Contas
+    # ------------------------------------------------------------
+    def account(self, key: str, balance=None) -> dict:
+        """Conta `key`, criada com `balance` (ou o saldo inicial) na primeira chamada."""
+        account = self.accounts.get(key)
+        if account is None:
+            with self._lock:
+                account = self.accounts.setdefault(key, {
+                    "balance": self.initial_balance if balance is None else Decimal(str(balance)),
+                    "positions": {}, "orders": {}, "leverage": {}, "realised": ZERO, "fees": ZERO,
+                })
+        return account
+
+    def available(self, key: str) -> Decimal:
+        """Saldo + PnL não realizado - margem inicial das posições abertas."""
+        account = self.account(key)
+        free = account["balance"]
+        for symbol, position in account["positions"].items():
+            price = self.price(symbol)
+            free += (price - position["entry"]) * position["size"]
+            free -= abs(position["size"]) * position["entry"] / self._leverage(account, symbol)
+        return free
+
+    def _leverage(self, account: dict, symbol: str) -> Decimal:
+        return Decimal(str(account["leverage"].get(symbol, self.leverage)))
+
+    # ------------------------------------------------------------
+    # Ordens
+    # ------------------------------------------------------------
+    def submit(self, key: str, order: dict) -> dict:
+        """
+        Executa uma ordem a mercado no formato do place_order da Bybit.
+
+        :return: (dict) orderId e orderLinkId.
+        :raises SimulationError: orderLinkId duplicado, reduce-only inválido, margem insuficiente...
+        """
+        account = self.account(key)
+        symbol, side = order["symbol"], order["side"]
+        link_id = order.get("orderLinkId") or uuid.uuid4().hex
+        qty = Decimal(str(order["qty"]))
+        if qty <= 0:
+            raise SimulationError(10001, "params error: qty must be greater than 0")
+        signed = qty if side == "Buy" else -qty
+        with self._lock:
+            if link_id in account["orders"]:
+                raise SimulationError(110072, "OrderLinkedID is duplicate")
+            price = self.price(symbol)
+            current = account["positions"].get(symbol, {"size": ZERO})["size"]
+            if order.get("reduceOnly"):
+                if current == 0 or current * signed > 0 or qty > abs(current):
+                    raise SimulationError(110017, "current position is zero, cannot fix reduce-only order qty")
+            else:
+                opening = qty if current * signed >= 0 else max(qty - abs(current), ZERO)
+                if opening * price / self._leverage(account, symbol) + qty * price * self.fee_rate \
+                        > self.available(key):
+                    raise SimulationError(110007, "ab not enough for new order")
+            self._trade(key, symbol, signed, price)
+            position = account["positions"].get(symbol)
+            if position is not None and not order.get("reduceOnly"):
+                for field, name in (("tp", "takeProfit"), ("sl", "stopLoss")):
+                    if order.get(name):
+                        position[field] = Decimal(str(order[name]))
+            order_id = f"sim-{uuid.uuid4().hex}"
+            account["orders"][link_id] = {
+                **order, "orderId": order_id, "orderLinkId": link_id, "orderStatus": "Filled",
+                "avgPrice": _text(price), "cumExecQty": _text(qty),
+            }
+        return {"orderId": order_id, "orderLinkId": link_id}
+
+    def _trade(self, key: str, symbol: str, signed: Decimal, price: Decimal) -> Decimal:
+        """Aplica a execução de `signed` contratos na posição; devolve o PnL realizado (sem taxa)."""
+        account = self.accounts[key]
+        fee = abs(signed) * price * self.fee_rate
+        account["balance"] -= fee
+        account["fees"] += fee
+        position = account["positions"].get(symbol)
+        if position is None:
+            position = account["positions"][symbol] = {"size": ZERO, "entry": price, "tp": None, "sl": None,
+                                                       "realised": ZERO}
+        current = position["size"]
+        pnl = ZERO
+        if current * signed < 0:
+            closed = min(abs(current), abs(signed))
+            pnl = (price - position["entry"]) * closed * (1 if current > 0 else -1)
+            position["realised"] += pnl
+            account["realised"] += pnl
+            account["balance"] += pnl
+        new = current + signed
+        if current == 0 or current * signed > 0:
+            position["entry"] = (abs(current) * position["entry"] + abs(signed) * price) / abs(new)
+        elif new * current < 0:
+            position["entry"] = price  # virou de lado: o restante abre no preço atual
+            position["tp"] = position["sl"] = None
+        position["size"] = new
+        if new == 0:
+            del account["positions"][symbol]
+            self._by_symbol[symbol].discard(key)
+        else:
+            self._by_symbol[symbol].add(key)
+        return pnl
+
+    def set_trading_stop(self, key: str, symbol: str, tp=None, sl=None) -> None:
+        with self._lock:
+            position = self.account(key)["positions"].get(symbol)
+            if position is None:
+                raise SimulationError(10001, "can not set tp/sl/ts for zero position")
+            if tp is not None:
+                position["tp"] = Decimal(str(tp)) if str(tp) not in ("", "0") else None
+            if sl is not None:
+                position["sl"] = Decimal(str(sl)) if str(sl) not in ("", "0") else None
+
+    def set_leverage(self, key: str, symbol: str, leverage) -> None:
+        account = self.account(key)
+        if str(account["leverage"].get(symbol)) == str(leverage):
+            raise SimulationError(110043, "leverage not modified")
+        account["leverage"][symbol] = int(Decimal(str(leverage)))
+
+    # ------------------------------------------------------------
+    # Consultas no formato da Bybit
+    # ------------------------------------------------------------
+    def positions(self, key: str) -> list:
+        """Posições abertas como itens de result.list de get_positions."""
+        account = self.account(key)
+        positions = []
+        with self._lock:
+            for symbol, position in account["positions"].items():
+                price, size = self.price(symbol), position["size"]
+                positions.append({
+                    "symbol": symbol, "side": "Buy" if size > 0 else "Sell", "size": _text(abs(size)),
+                    "avgPrice": _text(position["entry"]), "markPrice": _text(price), "liqPrice": "",
+                    "leverage": str(account["leverage"].get(symbol, self.leverage)),
+                    "takeProfit": _text(position["tp"]), "stopLoss": _text(position["sl"]),
+                    "positionValue": _text(abs(size) * position["entry"]),
+                    "curRealisedPnl": _text(position["realised"]),
+                    "unrealisedPnl": _text((price - position["entry"]) * size),
+                })
+        return positions
+
+    def summary(self) -> dict:
+        """Totais de todas as contas: saldo, PnL realizado e não realizado, taxas, posições e gatilhos."""
+        with self._lock:
+            unrealised = sum(
+                ((self.price(symbol) - position["entry"]) * position["size"]
+                 for account in self.accounts.values() for symbol, position in account["positions"].items()),
+                ZERO
+            )
+            return {
+                "accounts": len(self.accounts),
+                "balance": float(sum((a["balance"] for a in self.accounts.values()), ZERO)),
+                "realised_pnl": float(sum((a["realised"] for a in self.accounts.values()), ZERO)),
+                "unrealised_pnl": float(unrealised),
+                "fees": float(sum((a["fees"] for a in self.accounts.values()), ZERO)),
+                "open_positions": sum(len(a["positions"]) for a in self.accounts.values()),
+                "tp_triggers": len([t for t in self.triggers if t["kind"] == "tp"]),
+                "sl_triggers": len([t for t in self.triggers if t["kind"] == "sl"]),
+            }
+
+
+# ============================================================
+# Sessão com a interface do pybit HTTP sobre a bolsa simulada
+# ============================================================
+class SimulatedSession():
+    """
+    Implementa os métodos do pybit HTTP usados pelo TradingApi sobre o MatchingEngine,
+    com respostas no formato da Bybit e recusas como InvalidRequestError: retries,
+    orderLinkId duplicado e "leverage not modified" seguem o mesmo caminho do real.
+    """
+    recv_window = 5000
+
+    def __init__(self, engine: MatchingEngine, key: str) -> None:
+        self.engine = engine
+        self.key = key
+
+    def _call(self, name, run, **params):
+        try:
+            result = run()
+        except SimulationError as e:
+            raise InvalidRequestError(
+                request=f"{name}: {params}", message=e.message, status_code=e.code,
+                time=dt.now(timezone.utc).strftime("%H:%M:%S"), resp_headers={}
+            ) from None
+        result, ext = result if isinstance(result, tuple) else (result, {})
+        return {"retCode": 0, "retMsg": "OK", "result": result, "retExtInfo": ext, "time": int(time.time() * 1000)}
+
+    def get_server_time(self, **params):
+        return self._call("get_server_time", lambda: {"timeSecond": str(int(time.time()))})
+
+    def get_wallet_balance(self, **params):
+        def run():
+            balance = _text(self.engine.account(self.key)["balance"])
+            return {"list": [{"accountType": "UNIFIED", "coin": [{"coin": "USDT", "walletBalance": balance}]}]}
+        return self._call("get_wallet_balance", run, **params)
+
+    def get_tickers(self, symbol, **params):
+        return self._call("get_tickers", lambda: {"category": "linear", "list": [
+            {"symbol": symbol, "lastPrice": _text(self.engine.price(symbol))}
+        ]}, symbol=symbol)
+
+    def place_order(self, **order):
+        return self._call("place_order", lambda: self.engine.submit(self.key, order), **order)
+
+    def place_batch_order(self, request, **params):
+        def run():
+            created, statuses = [], []
+            for order in request:
+                try:
+                    created.append({"symbol": order["symbol"], **self.engine.submit(self.key, order)})
+                    statuses.append({"code": 0, "msg": "OK"})
+                except SimulationError as e:
+                    created.append({"symbol": order["symbol"], "orderId": "", "orderLinkId": order.get("orderLinkId", "")})
+                    statuses.append({"code": e.code, "msg": e.message})
+            return {"list": created}, {"list": statuses}
+        return self._call("place_batch_order", run, **params)
+
+    def get_open_orders(self, orderLinkId=None, **params):
+        def run():
+            orders = self.engine.account(self.key)["orders"]
+            found = [orders[orderLinkId]] if orderLinkId in orders else []
+            return {"category": "linear", "list": found if orderLinkId else list(orders.values())}
+        return self._call("get_open_orders", run, orderLinkId=orderLinkId)
+
+    def get_positions(self, **params):
+        return self._call("get_positions", lambda: {"category": "linear", "list": self.engine.positions(self.key)})
+
+    def set_leverage(self, symbol, buyLeverage, **params):
+        return self._call("set_leverage", lambda: self.engine.set_leverage(self.key, symbol, buyLeverage) or {},
+                          symbol=symbol, buyLeverage=buyLeverage)
+
+    def switch_position_mode(self, mode, **params):
+        def run():
+            if int(mode) != 0:
+                raise SimulationError(10001, "simulação só tem modo one-way (mode=0)")
+            return {}
+        return self._call("switch_position_mode", run, mode=mode)
+
+    def set_trading_stop(self, symbol, takeProfit=None, stopLoss=None, **params):
+        return self._call(
+            "set_trading_stop", lambda: self.engine.set_trading_stop(self.key, symbol, takeProfit, stopLoss) or {},
+            symbol=symbol, takeProfit=takeProfit, stopLoss=stopLoss
+        )
+
+
+class _SimulatedMarketData():
+    """Ticker do MatchingEngine para o _get_symbol_price do TradingApi."""
+    def __init__(self, engine: MatchingEngine) -> None:
+        self._engine = engine
+
+    def get_ticker(self, symbol: str) -> dict:
+        return {"symbol": symbol, "lastPrice": _text(self._engine.price(symbol))}
+
+
+class SimulatedTradingApi(TradingApi):
+    """
+    TradingApi cujas chamadas vão para um MatchingEngine em vez da Bybit. Dimensionamento,
+    retries, orderLinkId e formato das respostas são os do TradingApi.
+
+    :param key: (str) Conta no MatchingEngine.
+    :param balance: (float) Saldo inicial da conta, se ela ainda não existir no engine.
+    """
+    def __init__(self, engine: MatchingEngine, key: str, balance: float | None = None) -> None:
+        self._engine = engine
+        self._session = SimulatedSession(engine, key)
+        self._market_data = _SimulatedMarketData(engine)
+        self._state = None
+        engine.account(key, balance)
+
+    def _get_symbol_info(self, symbol: str):
+        try:
+            with stage("instrument"):
+                return self._engine.rule(symbol)
+        except Exception as e:
+            raise RuntimeError(f"Erro ao obter informações do símbolo {symbol}: {e}") from e
+
+    def _sign_order(self, order: dict):
+        return None  # nada a assinar: send_order executa direto no engine
+
+
+class AsyncSimulatedTradingApi():
+    """
+    Interface do AsyncTradingApi sobre um SimulatedTradingApi, para o dry-run das views
+    assíncronas. Preço e regras fora do cache são buscados pelo MarketData síncrono
+    (pybit), então cada método roda em uma thread (sync_to_async), fora do event loop;
+    o engine tem o próprio lock.
+    """
+    def __init__(self, api: SimulatedTradingApi) -> None:
+        self._api = api
+
+    def __getattr__(self, name):
+        return sync_to_async(getattr(self._api, name), thread_sensitive=False)
+
+
+# ============================================================
+# Contas simuladas do dry-run das views
+# ============================================================
+class SimulatedSessions():
+    """
+    Um SimulatedTradingApi por TradingUser sobre um único MatchingEngine com preços e
+    regras reais. O saldo inicial de cada conta é o saldo real conhecido no AccountBook
+    (ou o saldo padrão do engine); as posições abertas em dry-run ficam no engine até reset().
+    """
+    def __init__(self, engine_factory) -> None:
+        self._engine_factory = engine_factory
+        self._engine = None
+        self._apis = {}
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self) -> MatchingEngine:
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = self._engine_factory()
+        return self._engine
+
+    def get(self, user) -> SimulatedTradingApi:
+        api = self._apis.get(user.pk)
+        if api is None:
+            known = book.get_balance(user.pk)
+            engine = self.engine
+            with self._lock:
+                api = self._apis.get(user.pk)
+                if api is None:
+                    api = self._apis[user.pk] = SimulatedTradingApi(
+                        engine, f"user-{user.pk}", known[0] if known else None
+                    )
+        return api
+
+    def reset(self) -> None:
+        """Descarta contas, posições e preços simulados."""
+        with self._lock:
+            self._engine = None
+            self._apis.clear()
+
+
+class AsyncSimulatedSessions():
+    """As contas de um SimulatedSessions com a interface do AsyncSessionRegistry."""
+    def __init__(self, sessions: SimulatedSessions) -> None:
+        self._sessions = sessions
+
+    def get(self, user) -> AsyncSimulatedTradingApi:
+        return AsyncSimulatedTradingApi(self._sessions.get(user))
+
+
+dry_run_sessions = SimulatedSessions(lambda: MatchingEngine(market_data=get_market_data()))
+async_dry_run_sessions = AsyncSimulatedSessions(dry_run_sessions)
+
+
+# ============================================================
+# Replay de sinais históricos contra um caminho de preços
+# ============================================================
+def _run_signal(api, kind: str, params: dict, signal_id: str, account: int, leverage: int):
+    """Executa um sinal em uma conta como as views fazem (mesmos métodos do TradingApi)."""
+    if kind == "place_order":
+        return api.place_order_tp_sl(
+            params["percent"], params["symbol"], params["profit"], params["max_loss"], params["side"],
+            leverage, order_link_id=order_link_id(signal_id, account)
+        )
+    if kind == "place_batch_order":
+        legs = params["legs"]
+        results = api.place_batch_order_tp_sl(
+            legs, {leg["symbol"]: leverage for leg in legs},
+            link_ids=[order_link_id(signal_id, account, leg) for leg in range(len(legs))]
+        )
+        errors = [leg["error"] for leg in results if "error" in leg]
+        if errors:
+            raise RuntimeError(errors[0])
+        return results
+    if kind == "close_order":
+        return api.close_order(params["symbol"], order_link_id(signal_id, account))
+    if kind == "update_tp_sl":
+        return api.change_tp_sl(params["symbol"], params.get("tp"), params.get("sl"))
+    raise ValueError(f"Tipo de sinal não suportado no replay: {kind}")
+
+def replay(engine: MatchingEngine, apis: list, signals, prices, leverage: int = 1) -> dict:
+    """
+    Reproduz sinais em todas as contas simuladas, intercalados por horário com o caminho
+    de preços: cada preço move o mercado (e dispara TP/SL) antes dos sinais seguintes.
+
+    :param apis: (list) SimulatedTradingApi de cada conta, todos sobre `engine`.
+    :param signals: (iterable) tuplas (at, signal_id, kind, params), em ordem de `at` (epoch).
+    :param prices: (iterable) tuplas (at, symbol, price), em ordem de `at`.
+    :param leverage: (int) Alavancagem usada no dimensionamento das ordens.
+    :return: (dict) sinais, ordens, erros (mensagens mais comuns), tempo e o resumo do engine.
+    """
+    events = heapq.merge(
+        ((at, 0, symbol, price) for at, symbol, price in prices),
+        ((at, 1, signal_id, (kind, params)) for at, signal_id, kind, params in signals),
+        key=lambda event: event[:2]
+    )
+    counts = Counter()
+    errors = Counter()
+    start = time.perf_counter()
+    for _, is_signal, name, value in events:
+        if not is_signal:
+            engine.set_price(name, value)
+            counts["prices"] += 1
+            continue
+        counts["signals"] += 1
+        kind, params = value
+        for account, api in enumerate(apis):
+            try:
+                _run_signal(api, kind, params, name, account, leverage)
+                counts["orders"] += 1
+            except Exception as e:
+                counts["errors"] += 1
+                cause = e
+                while cause.__cause__ is not None:
+                    cause = cause.__cause__
+                errors[str(cause)] += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "signals": counts["signals"],
+        "prices": counts["prices"],
+        "orders": counts["orders"],
+        "errors": counts["errors"],
+        "top_errors": errors.most_common(5),
+        "elapsed_s": round(elapsed, 3),
+        "signals_per_s": round(counts["signals"] / elapsed, 1) if elapsed else None,
+        "orders_per_s": round((counts["orders"] + counts["errors"]) / elapsed, 1) if elapsed else None,
+        **engine.summary(),
+    }
@@ -0,0 +1,126 @@
+from decimal import ROUND_CEILING, ROUND_FLOOR, Decimal
+
+import numpy as np
+
+from .instruments import InvalidOrderError, InstrumentRule, validate_prices
+from .trading_api import _dec, calc_tp_sl, tp_sl_prices
+
+# Distância relativa de um inteiro (ou de .5 no arredondamento dos centavos) abaixo da qual
+# o float64 não garante o mesmo resultado do Decimal: essas contas são refeitas em Decimal
+EDGE_TOLERANCE = 1e-9
+# Acima de 2**52 o float64 não representa todos os inteiros
+EXACT_FLOAT_LIMIT = 2.0 ** 52
+
+
+# ============================================================
+# Limites de quantidade em unidades de qtyStep (exatos, em Decimal)
+# ============================================================
+def _qty(units, step: Decimal) -> Decimal:
+    return (Decimal(units) * step).quantize(step)
+
+def _units_from(limit: Decimal, unit: Decimal, rounding) -> int:
+    """limit / unit arredondado para inteiro (ROUND_CEILING ou ROUND_FLOOR)."""
+    return int((limit / unit).to_integral_value(rounding=rounding))
+
+def _integer_and_exponent(step: Decimal) -> tuple:
+    """0.005 -> (5, -3): a quantidade k * step vira (k * 5) * 10**-3 sem divisão."""
+    _, digits, exponent = step.as_tuple()
+    return int("".join(map(str, digits))), exponent
+
+def _first_valid(below, unit: Decimal, limit: Decimal) -> float:
+    """Menor k com `below(k)` falso (ex: quantidade mínima), partindo de limit / unit."""
+    k = _units_from(limit, unit, ROUND_CEILING)
+    while k > 0 and not below(k - 1):
+        k -= 1
+    while below(k):
+        k += 1
+    return float(k)
+
+def _last_valid(above, unit: Decimal, limit: Decimal) -> float:
+    """Maior k com `above(k)` falso (ex: quantidade máxima), partindo de limit / unit."""
+    k = _units_from(limit, unit, ROUND_FLOOR)
+    while above(k):
+        k -= 1
+    while not above(k + 1):
+        k += 1
+    return float(k)
+
+
+# ============================================================
+# Dimensionamento de todas as contas de um sinal de uma vez
+# ============================================================
+def size_orders(balances, leverages, rule: InstrumentRule, price: float, percent: float,
+                profit: float, max_loss: float, side: str) -> list:
+    """
+    Versão vetorizada de calc_tp_sl para várias contas do mesmo sinal: quantidade e
+    valor da ordem de todas as contas são calculados em uma passada NumPy (float64) e
+    TP/SL, que não dependem da conta, uma vez só.
+
+    O resultado é idêntico ao de calc_tp_sl conta a conta. O float64 só decide o
+    inteiro de qtyStep (e de centavos) quando está longe da borda; contas a menos de
+    EDGE_TOLERANCE de um múltiplo do step, e as que não passam nas regras do
+    instrumento, são refeitas em Decimal por calc_tp_sl (mensagem de erro inclusive).
+
+    :param balances: (sequence) Saldo USDT de cada conta.
+    :param leverages: (sequence) Alavancagem de cada conta, na mesma ordem.
+    :param rule: (InstrumentRule) Regras do símbolo.
+    :param price: (float) Preço atual do símbolo.
+    :return: (list) por conta, a tupla (qty, tp, sl, order_amount) de calc_tp_sl ou o
+        InvalidOrderError da conta.
+    """
+    def scalar(index):
+        try:
+            return calc_tp_sl(balances[index], price, rule, percent, profit, max_loss, side, leverages[index])
+        except InvalidOrderError as e:
+            return e
+
+    count = len(balances)
+    if not count:
+        return []
+    price_dec = _dec(price)
+    step = rule.qty_step.normalize()
+    tp, sl = tp_sl_prices(rule, price_dec, profit, max_loss, side)
+    try:
+        validate_prices(rule, tp, sl)
+        tradable = rule.status == "Trading"
+    except InvalidOrderError:
+        tradable = False
+    if not tradable:
+        # A recusa vale para todas as contas; calc_tp_sl monta a mensagem de cada uma
+        return [scalar(index) for index in range(count)]
+
+    # Quantidade em unidades de qtyStep: trunc(saldo * alavancagem * percent / 100 / preço / step)
+    margin = np.asarray(balances, dtype=np.float64) * np.asarray(leverages, dtype=np.float64)
+    units_float = margin * (float(_dec(percent)) / 100) / (float(price_dec) * float(step))
+    units = np.trunc(units_float)
+    edge = np.abs(units_float - np.rint(units_float)) <= EDGE_TOLERANCE * np.maximum(np.abs(units_float), 1)
+
+    # Valor da ordem em centavos, arredondado como Decimal.quantize (ROUND_HALF_EVEN)
+    cents_float = units * (float(step) * float(price_dec) * 100)
+    cents = np.rint(cents_float)
+    half = np.abs(np.abs(cents_float - np.trunc(cents_float)) - 0.5)
+    edge |= half <= EDGE_TOLERANCE * np.maximum(np.abs(cents_float), 1)
+    edge |= ~np.isfinite(cents_float) | (np.abs(units_float) >= EXACT_FLOAT_LIMIT) \
+        | (np.abs(cents_float) >= EXACT_FLOAT_LIMIT)
+
+    # Regras do instrumento comparadas em unidades inteiras de qtyStep
+    invalid = units < _first_valid(lambda k: _qty(k, step) < rule.min_order_qty, step, rule.min_order_qty)
+    max_qty = rule.max_mkt_order_qty or rule.max_order_qty
+    if max_qty is not None:
+        invalid |= units > _last_valid(lambda k: _qty(k, step) > max_qty, step, max_qty)
+    if rule.min_notional is not None:
+        invalid |= units < _first_valid(
+            lambda k: _qty(k, step) * price_dec < rule.min_notional, step * price_dec, rule.min_notional
+        )
+
+    tp, sl = f"{tp:f}", f"{sl:f}"
+    digits, exponent = _integer_and_exponent(step)
+    results = []
+    for index, (k, c, redo) in enumerate(zip(units.tolist(), cents.tolist(), (edge | invalid).tolist())):
+        if redo:
+            results.append(scalar(index))
+        else:
+            qty = Decimal(int(k) * digits).scaleb(exponent)
+            results.append((f"{qty:f}", tp, sl, f"{Decimal(int(c)).scaleb(-2):f}"))
+    return results
+
@@ -0,0 +1,184 @@
+import logging
+import threading
+
+from django.conf import settings
+from pybit.unified_trading import WebSocket
+
+from .account_state import book
+from .sessions import sessions
+from .trading_api import format_position
+
+logger = logging.getLogger(__name__)
+
+
+class _PrivateWebSocket(WebSocket):
+    """
+    WebSocket privado do pybit com URL configurável (TRADING_BYBIT_WS_URL) e aviso
+    de reconexão, para que o estado local seja ressincronizado depois de uma queda.
+    """
+    def __init__(self, url=None, on_open=None, **kwargs):
+        self._url = url
+        self._on_open_callback = on_open
+        super().__init__(channel_type="private", **kwargs)
+
+    def _connect(self, url):
+        return super()._connect(self._url or url)
+
+    def _on_open(self):
+        super()._on_open()
+        if self._on_open_callback is not None:
+            self._on_open_callback()
+
+
+class AccountStream():
+    """
+    Mantém saldo e posições de uma conta no AccountBook a partir dos tópicos privados
+    "position" e "wallet" da Bybit.
+
+    Ao conectar (e a cada reconexão) o estado é sincronizado com um snapshot REST;
+    mensagens que chegam durante a sincronização são guardadas e aplicadas depois.
+
+    :param user: (TradingUser) Conta a acompanhar.
+    """
+    def __init__(self, user) -> None:
+        self.user = user
+        self.credentials = (user.api_key, user.api_secret, user.demo)
+        self.state = book.account(user.pk)
+        self._ws = None
+        self._lock = threading.Lock()
+        self._pending = None
+        self._connections = 0
+
+    def is_connected(self) -> bool:
+        return self._ws is not None and self._ws.is_connected()
+
+    def start(self) -> None:
+        self._pending = []
+        self._ws = _PrivateWebSocket(
+            url=settings.TRADING_BYBIT_WS_URL,
+            on_open=self._on_open,
+            testnet=False,
+            demo=self.user.demo,
+            api_key=self.user.api_key,
+            api_secret=self.user.api_secret,
+        )
+        self._ws.position_stream(self._on_position)
+        self._ws.wallet_stream(self._on_wallet)
+        self.state.stream = self
+        self.seed()
+
+    def stop(self) -> None:
+        self.state.seeded = False
+        if self.state.stream is self:
+            self.state.stream = None
+        if self._ws is not None:
+            self._ws.exit()
+
+    def _on_open(self):
+        self._connections += 1
+        if self._connections > 1:
+            # Reconexão: o que mudou durante a queda só aparece num snapshot novo
+            with self._lock:
+                self.state.seeded = False
+                self._pending = []
+            threading.Thread(target=self.seed, name=f"stream-seed-{self.user.pk}", daemon=True).start()
+
+    # ============================================================
+    # Sincroniza o estado local com um snapshot REST
+    # ============================================================
+    def seed(self) -> None:
+        """
+        Carrega saldo e posições pela API e aplica as mensagens recebidas enquanto isso.
+        """
+        api = sessions.get(self.user)
+        try:
+            balance = api._fetch_usdt_balance()
+            positions = api._fetch_positions()
+        except Exception as e:
+            logger.warning("Falha ao sincronizar stream de %s: %s", self.user.pk, e)
+            return
+        with self._lock:
+            self.state.set_balance(balance)
+            self.state.set_positions(positions)
+            for handler, message in self._pending or []:
+                handler(message)
+            self._pending = None
+            self.state.seeded = True
+
+    def _buffered(self, handler, message) -> bool:
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((handler, message))
+                return True
+        return False
+
+    def _on_position(self, message):
+        if self._buffered(self._apply_position, message):
+            return
+        self._apply_position(message)
+
+    def _on_wallet(self, message):
+        if self._buffered(self._apply_wallet, message):
+            return
+        self._apply_wallet(message)
+
+    def _apply_position(self, message):
+        changed = {}
+        closed = []
+        for item in message["data"]:
+            if item.get("category", "linear") != "linear":
+                continue
+            if item["side"] and float(item["size"] or 0):
+                changed[item["symbol"]] = format_position(item)
+            else:
+                closed.append(item["symbol"])
+        self.state.update_positions(changed, closed)
+
+    def _apply_wallet(self, message):
+        for account in message["data"]:
+            if account.get("accountType", "UNIFIED") != "UNIFIED":
+                continue
+            for coin in account["coin"]:
+                if coin["coin"] == "USDT":
+                    self.state.set_balance(coin["walletBalance"])
+
+
+class StreamManager():
+    """
+    Mantém um AccountStream por conta ativa, iniciando streams de contas novas e
+    reiniciando os de contas cujas credenciais mudaram.
+    """
+    def __init__(self) -> None:
+        self._streams = {}
+
+    def sync(self, users) -> None:
+        """
+        Ajusta os streams para o conjunto de contas recebido.
+
+        :param users: (iterable) TradingUsers que devem ter stream.
+        """
+        wanted = {user.pk: user for user in users}
+        for pk in list(self._streams):
+            stream = self._streams[pk]
+            user = wanted.get(pk)
+            if user is None or stream.credentials != (user.api_key, user.api_secret, user.demo):
+                stream.stop()
+                del self._streams[pk]
+        for pk, user in wanted.items():
+            if pk not in self._streams:
+                stream = AccountStream(user)
+                try:
+                    stream.start()
+                except Exception as e:
+                    logger.warning("Falha ao iniciar stream de %s: %s", pk, e)
+                    stream.stop()
+                    continue
+                self._streams[pk] = stream
+
+    def stop_all(self) -> None:
+        for stream in self._streams.values():
+            stream.stop()
+        self._streams.clear()
+
+
+streams = StreamManager()
@@ -1,3 +1,1621 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+import time
+import uuid
+from datetime import datetime as dt, timezone as dt_timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import numpy as np
+from hypothesis import given, settings as hypothesis_settings, strategies as st
+
+from utils import fast_json
+from utils.cache import TTLCache
+from .models import InstrumentRule, Leverage, Order, SignalExecution, SignalJob, SignalTask, TradingUser
+from .account_state import AccountBook, AccountState, book
+from .async_trading_api import AsyncTradingApi
+from .exposure import ExposureAggregator
+from .executor import AccountTimeoutError, async_iter_fan_out, fan_out, get_lane, iter_fan_out, reads_saturated
+from .history import history
+from .instruments import InvalidOrderError, instruments
+from .jobs import JOB_KINDS, claim_tasks, run_worker
+from .market_data import get_market_data, reset_market_data
+from .metrics import metrics
+from .mock_bybit import FakeStreamServer, MockBybitServer
+from .shards import ShardAccount, ShardTask, run_signal, shards
+from .read_cache import ReadCache, async_read_cache, read_cache
+from .rate_limit import RateLimitExceeded, RateLimiter, reset_limiter
+from .sessions import SessionRegistry, sessions
+from .simulation import TAKER_FEE, MatchingEngine, SimulatedTradingApi, SimulationError, dry_run_sessions, replay
+from .sizing import size_orders
+from .streams import AccountStream
+from .trading_api import TradingApi, calc_tp_sl, order_link_id
+
+
+@override_settings(TRADING_ACCOUNT_TIMEOUT=5, TRADING_BROADCAST_DEADLINE=5)
+class FanOutTests(SimpleTestCase):
+    def test_results_keep_account_order(self):
+        accounts = [0.05, 0.01, 0.03]
+        results = fan_out(accounts, lambda delay: time.sleep(delay) or delay * 2)
+        self.assertEqual([value for _, value, _ in results], [0.1, 0.02, 0.06])
+
+    def test_iter_yields_in_completion_order(self):
+        accounts = [0.1, 0.01]
+        results = list(iter_fan_out(accounts, lambda delay: time.sleep(delay) or delay))
+        self.assertEqual([account for account, _, _ in results], [0.01, 0.1])
+
+    def test_errors_are_returned_per_account(self):
+        def task(account):
+            if account == "bad":
+                raise RuntimeError("falhou")
+            return account
+
+        results = fan_out(["ok", "bad"], task)
+        self.assertIsNone(results[0][2])
+        self.assertEqual(str(results[1][2]), "falhou")
+
+    def test_wall_clock_tracks_slowest_account(self):
+        start = time.monotonic()
+        fan_out([0.2] * 10, time.sleep)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_account_timeout(self):
+        results = fan_out([0.01, 1], time.sleep, account_timeout=0.1)
+        self.assertIsNone(results[0][2])
+        self.assertIsInstance(results[1][2], AccountTimeoutError)
+
+    def test_deadline(self):
+        results = fan_out([1, 1], time.sleep, account_timeout=5, deadline=0.1)
+        self.assertTrue(all(isinstance(error, AccountTimeoutError) for _, _, error in results))
+
+    def test_closing_the_iterator_cancels_accounts_not_started(self):
+        executed = []
+        lane_size = get_lane("write").max_workers
+        results = iter_fan_out(range(lane_size * 3), lambda account: time.sleep(0.05) or executed.append(account))
+
+        next(results)
+        results.close()
+        time.sleep(0.3)
+
+        self.assertLessEqual(len(executed), lane_size * 2)
+
+    @override_settings(TRADING_ASYNC_FANOUT_MAX_CONCURRENCY=2)
+    async def test_closing_the_async_iterator_cancels_accounts_not_finished(self):
+        executed = []
+
+        async def task(account):
+            await asyncio.sleep(0.05)
+            executed.append(account)
+
+        results = async_iter_fan_out(range(10), task)
+        await results.__anext__()
+        await results.aclose()
+        await asyncio.sleep(0.3)
+
+        self.assertLessEqual(len(executed), 2)
+
+
+class TTLCacheTests(SimpleTestCase):
+    def test_concurrent_misses_share_one_fetch(self):
+        cache = TTLCache()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.05)
+            return "ticker"
+
+        results = fan_out(range(20), lambda _: cache.get("BTCUSDT", 1, fetch))
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(value == "ticker" for _, value, _ in results))
+
+    def test_expired_entry_is_refetched(self):
+        cache = TTLCache()
+        self.assertEqual(cache.get("k", 0.01, lambda: 1), 1)
+        time.sleep(0.02)
+        self.assertEqual(cache.get("k", 0.01, lambda: 2), 2)
+
+
+class SessionRegistryTests(SimpleTestCase):
+    def test_session_is_reused_until_credentials_change(self):
+        registry = SessionRegistry()
+        user = SimpleNamespace(pk=1, api_key="key", api_secret="secret", demo=False)
+
+        first = registry.get(user)
+        self.assertIs(registry.get(user), first)
+
+        user.api_secret = "rotated"
+        rebuilt = registry.get(user)
+        self.assertIsNot(rebuilt, first)
+        self.assertIs(registry.get(user), rebuilt)
+
+        user.demo = True
+        self.assertIsNot(registry.get(user), rebuilt)
+
+    def test_drop(self):
+        registry = SessionRegistry()
+        user = SimpleNamespace(pk=1, api_key="key", api_secret="secret", demo=False)
+        first = registry.get(user)
+        registry.drop(user.pk)
+        self.assertIsNot(registry.get(user), first)
+
+
+class RateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_reads_leave_ip_reserve_for_orders(self):
+        # 10 tokens no IP, 5 reservados para escritas
+        limiter = RateLimiter(ip_limit=20, ip_window=1, read_reserve=0.5, max_wait=0.05)
+        for _ in range(5):
+            limiter.acquire("key", "/v5/position/list")
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire("key", "/v5/position/list")
+
+        start = time.monotonic()
+        limiter.acquire("key", "/v5/order/create")
+        self.assertLess(time.monotonic() - start, 0.01)
+        self.assertEqual(metrics.get("rate_limit_rejected_total", endpoint_class="position_read"), 1)
+
+    def test_exhausted_quota_from_headers_blocks_account_until_reset(self):
+        limiter = RateLimiter(ip_limit=600, ip_window=5, read_reserve=0.2, max_wait=1)
+        reset_at = int((time.time() + 0.2) * 1000)
+        limiter.observe("key", "/v5/order/create", {
+            "X-Bapi-Limit": "10", "X-Bapi-Limit-Status": "0", "X-Bapi-Limit-Reset-Timestamp": str(reset_at)
+        })
+
+        start = time.monotonic()
+        limiter.acquire("key", "/v5/order/create")
+        self.assertGreater(time.monotonic() - start, 0.15)
+        limiter.acquire("other-key", "/v5/order/create")  # outras contas não esperam
+        self.assertEqual(metrics.get("rate_limit_exhausted_total", endpoint_class="order"), 1)
+        self.assertEqual(metrics.get("rate_limit_throttled_total", endpoint_class="order"), 1)
+
+
+class FakeTradingApi():
+    def place_order_tp_sl(self, percent, symbol, profit, max_loss, side, leverage=1, balance=None,
+                          order_link_id=None):
+        return {"qty": "1", "tp": "1", "sl": "1", "order_amount": "1", "leverage": leverage}
+
+    def prepare_order_tp_sl(self, *args, sized=None, **kwargs):
+        return self.place_order_tp_sl(*args, **kwargs)
+
+    def send_order(self, prepared):
+        return prepared
+
+    def get_usdt_balance(self):
+        return 100.0
+
+    def get_positions(self):
+        return {}
+
+    def set_leverage(self, leverage, symbol):
+        return {}
+
+
+class BroadcastQueryCountTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch("trading.views.sessions")
+        self.sessions = patcher.start()
+        self.sessions.get.return_value = FakeTradingApi()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("trading.views.get_market_data")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_accounts(self, count):
+        start = TradingUser.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create(username=f"trader{i}")
+            TradingUser.objects.create(user=user, api_key="k", api_secret="s")
+            Leverage.objects.create(user=user, symbol="BTCUSDT", leverage=5)
+
+    def count_queries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            if method == "post":
+                response = self.client.post(url, json.dumps(data), content_type="application/json")
+            else:
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+    def assert_constant_queries(self, method, url, data=None):
+        self.create_accounts(2)
+        self.count_queries(method, url, data)
+        few, _ = self.count_queries(method, url, data)
+        self.create_accounts(20)
+        self.count_queries(method, url, data)
+        many, body = self.count_queries(method, url, data)
+        self.assertEqual(few, many)
+        self.assertEqual(body["total_users"], 22)
+        return body
+
+    def test_place_order(self):
+        body = self.assert_constant_queries("post", "/trading/place-order/", {
+            "percent": 1, "symbol": "BTCUSDT", "profit": 1, "max_loss": 1, "side": "Buy"
+        })
+        self.assertEqual(body["successful_orders"], 22)
+        self.assertEqual(body["results"][0]["message"]["leverage"], 5)
+
+    def test_place_order_reports_balance_age(self):
+        self.create_accounts(1)
+        book.set_balance(TradingUser.objects.get().pk, 100)
+        self.addCleanup(book.clear)
+        _, body = self.count_queries("post", "/trading/place-order/", {
+            "percent": 1, "symbol": "BTCUSDT", "profit": 1, "max_loss": 1, "side": "Buy"
+        })
+        self.assertLess(body["results"][0]["message"]["balance_age"], 5)
+
+    def test_place_order_without_leverage(self):
+        Leverage.objects.all().delete()
+        self.create_accounts(1)
+        Leverage.objects.all().delete()
+        _, body = self.count_queries("post", "/trading/place-order/", {
+            "percent": 1, "symbol": "BTCUSDT", "profit": 1, "max_loss": 1, "side": "Buy"
+        })
+        self.assertEqual(body["results"][0]["status"], "error")
+
+    def test_get_balance(self):
+        self.assert_constant_queries("get", "/trading/get-balance/")
+
+    def test_get_positions(self):
+        self.assert_constant_queries("get", "/trading/get-positions/")
+
+    def test_set_leverage(self):
+        body = self.assert_constant_queries("post", "/trading/set-leverage/", {"leverage": 10, "symbol": "ETHUSDT"})
+        self.assertEqual(body["successful_orders"], 22)
+        self.assertEqual(Leverage.objects.filter(symbol="ETHUSDT", leverage=10).count(), 22)
+
+
+class SlowBalanceApi(FakeTradingApi):
+    def __init__(self, delay):
+        self.delay = delay
+
+    def get_usdt_balance(self):
+        time.sleep(self.delay)
+        if self.delay < 0.01:
+            raise RuntimeError("Erro ao obter saldo: timeout")
+        return 100.0
+
+
+class StreamingBroadcastTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch("trading.views.sessions")
+        self.sessions = patcher.start()
+        self.addCleanup(patcher.stop)
+        # trader0 demora, trader1 termina logo e trader2 falha logo
+        delays = {"trader0": 0.3, "trader1": 0.05, "trader2": 0.0}
+        self.sessions.get.side_effect = lambda user: SlowBalanceApi(delays[user.user.username])
+        for i in range(3):
+            user = User.objects.create(username=f"trader{i}")
+            TradingUser.objects.create(user=user, api_key="k", api_secret="s")
+
+    def read_stream(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson_emits_results_in_completion_order_then_summary(self):
+        response = self.client.get("/trading/get-balance/?stream=ndjson")
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        records = [json.loads(line) for line in self.read_stream(response).splitlines()]
+        self.assertEqual([r.get("username") for r in records], ["trader2", "trader1", "trader0", None])
+        self.assertIn("error", records[0])
+        self.assertEqual(records[-1], {"status": "completed", "total_users": 3, "successful_orders": 2})
+
+    def test_sse_via_accept_header(self):
+        response = self.client.get("/trading/get-balance/", headers={"Accept": "text/event-stream"})
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = self.read_stream(response).strip().split("\n\n")
+        self.assertEqual([event.split("\n")[0] for event in events], ["event: result"] * 3 + ["event: completed"])
+        self.assertEqual(json.loads(events[-1].split("data: ", 1)[1])["successful_orders"], 2)
+
+    def test_stream_runs_on_complete_after_last_account(self):
+        self.sessions.get.side_effect = None
+        self.sessions.get.return_value = FakeTradingApi()
+        response = self.client.post("/trading/set-leverage/?stream=ndjson",
+                                    json.dumps({"leverage": 7, "symbol": "ETHUSDT"}), content_type="application/json")
+        self.assertEqual(Leverage.objects.filter(symbol="ETHUSDT").count(), 0)  # ainda não consumido
+
+        records = [json.loads(line) for line in self.read_stream(response).splitlines()]
+        self.assertEqual(records[-1]["successful_orders"], 3)
+        self.assertEqual(Leverage.objects.filter(symbol="ETHUSDT", leverage=7).count(), 3)
+
+    def test_without_stream_keeps_single_json_in_account_order(self):
+        body = self.client.get("/trading/get-balance/").json()
+        self.assertEqual([r["username"] for r in body["results"]], ["trader0", "trader1", "trader2"])
+        self.assertEqual(body["successful_orders"], 2)
+
+
+class PriorityLaneTests(TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.drain)
+
+    def drain(self):
+        self.release.set()
+        deadline = time.monotonic() + 5
+        while (get_lane("read").pending or get_lane("write").pending) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def block(self, lane, count):
+        started = threading.Semaphore(0)
+
+        def wait(_):
+            started.release()
+            self.release.wait(5)
+
+        for _ in range(count):
+            get_lane(lane).submit(wait, None)
+        for _ in range(min(count, get_lane(lane).max_workers)):
+            started.acquire(timeout=5)
+
+    def test_orders_do_not_queue_behind_reads(self):
+        self.block("read", get_lane("read").max_workers * 4)
+
+        start = time.monotonic()
+        results = fan_out(range(10), lambda i: i * 2)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual([value for _, value, _ in results], list(range(0, 20, 2)))
+
+    @override_settings(TRADING_READ_LANE_MAX_PENDING=4)
+    def test_reads_saturated_when_read_lane_is_full(self):
+        self.assertFalse(reads_saturated())
+        self.block("read", 4)
+        self.assertTrue(reads_saturated())
+
+    def test_balance_served_from_cache_while_orders_are_in_flight(self):
+        cached, uncached = [
+            TradingUser.objects.create(user=User.objects.create(username=name), api_key="k", api_secret="s")
+            for name in ("cached", "uncached")
+        ]
+        book.set_balance(cached.pk, 321.0)
+        self.addCleanup(book.clear)
+        self.block("write", 1)
+
+        with mock.patch("trading.views.sessions") as sessions_mock:
+            body = self.client.get("/trading/get-balance/").json()
+        sessions_mock.get.assert_not_called()
+
+        by_user = {r["username"]: r for r in body["results"]}
+        self.assertEqual(by_user["cached"]["saldo"], 321.0)
+        self.assertIn("cached_age", by_user["cached"])
+        self.assertIn("ocupado", by_user["uncached"]["error"])
+        self.assertEqual(body["successful_orders"], 1)
+
+
+class PresizedOrderTests(SimpleTestCase):
+    def make_api(self):
+        api = TradingApi("key", "secret")
+        api._session = mock.Mock()
+        api._session.place_order.return_value = {"result": {"orderId": "1"}}
+        api._market_data = mock.Mock()
+        api._market_data.get_ticker.return_value = {"lastPrice": "100"}
+        api._market_data.get_instrument.return_value = {
+            "symbol": "BTCUSDT", "priceFilter": {"tickSize": "0.1"},
+            "lotSizeFilter": {"qtyStep": "0.01", "minOrderQty": "0.01"},
+        }
+        instruments.clear()
+        self.addCleanup(instruments.clear)
+        return api
+
+    def test_known_balance_makes_place_order_the_only_exchange_call(self):
+        api = self.make_api()
+        order = api.place_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy", leverage=2, balance=1000)
+
+        self.assertEqual(order["qty"], "2.00")
+        self.assertEqual([call[0] for call in api._session.method_calls], ["place_order"])
+
+    def test_unknown_balance_reads_wallet(self):
+        api = self.make_api()
+        api._session.get_wallet_balance.return_value = {
+            "result": {"list": [{"coin": [{"coin": "USDT", "walletBalance": "500"}]}]}
+        }
+        api.place_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy")
+        self.assertEqual([call[0] for call in api._session.method_calls], ["get_wallet_balance", "place_order"])
+
+    def test_account_book_max_age(self):
+        account_book = AccountBook()
+        self.assertIsNone(account_book.get_balance(1))
+        account_book.set_balance(1, 250)
+        balance, age = account_book.get_balance(1, max_age=5)
+        self.assertEqual(balance, 250)
+        self.assertLess(age, 5)
+        time.sleep(0.02)
+        self.assertIsNone(account_book.get_balance(1, max_age=0.01))
+
+
+def recorded_position(symbol, side, size):
+    return {
+        "symbol": symbol, "side": side, "size": size, "category": "linear", "leverage": "5",
+        "entryPrice": "100", "liqPrice": "80", "takeProfit": "110", "stopLoss": "95",
+        "positionValue": "500", "curRealisedPnl": "0", "unrealisedPnl": "1.5", "markPrice": "101",
+    }
+
+
+RECORDED_PRIVATE_STREAM = [
+    {"topic": "wallet", "id": "1", "creationTime": 1, "data": [
+        {"accountType": "UNIFIED", "coin": [{"coin": "USDT", "walletBalance": "1234.5"}]}
+    ]},
+    {"topic": "position", "id": "2", "creationTime": 2, "data": [recorded_position("BTCUSDT", "Buy", "5")]},
+    {"topic": "position", "id": "3", "creationTime": 3, "data": [recorded_position("ETHUSDT", "Sell", "2")]},
+    {"topic": "position", "id": "4", "creationTime": 4, "data": [recorded_position("ETHUSDT", "", "0")]},
+]
+
+
+def exposure_position(side, qty, value, upnl):
+    return {"side": side, "qty": qty, "value": value, "uPnL": upnl}
+
+exposure_positions = st.dictionaries(
+    st.sampled_from(["BTCUSDT", "ETHUSDT", "SOLUSDT"]),
+    st.builds(exposure_position, st.sampled_from(["Buy", "Sell"]),
+              *[st.decimals(min_value="-1000", max_value="1000", places=3).map(str) for _ in range(3)]),
+    max_size=3,
+)
+
+
+class ExposureTests(SimpleTestCase):
+    @staticmethod
+    def from_scratch(accounts):
+        exposure = ExposureAggregator()
+        for positions in accounts.values():
+            exposure.apply({}, positions, accounts=1)
+        return exposure.snapshot()
+
+    @hypothesis_settings(max_examples=200, deadline=None)
+    @given(st.lists(st.tuples(st.integers(0, 4), st.sampled_from(["set", "update", "drop"]), exposure_positions,
+                              st.lists(st.sampled_from(["BTCUSDT", "ETHUSDT", "SOLUSDT"]), max_size=2)),
+                    max_size=30))
+    def test_incremental_totals_match_recomputation(self, operations):
+        accounts_book = AccountBook()
+        for pk, operation, positions, closed in operations:
+            if operation == "set":
+                accounts_book.account(pk).set_positions(positions)
+            elif operation == "update":
+                accounts_book.account(pk).update_positions(positions, closed)
+            else:
+                accounts_book.drop(pk)
+        known = {pk: state.positions for pk, state in accounts_book._accounts.items() if state.positions_at is not None}
+        self.assertEqual(accounts_book.exposure.snapshot(), self.from_scratch(known))
+
+    def test_symbol_totals(self):
+        accounts_book = AccountBook()
+        accounts_book.account(1).set_positions({"BTCUSDT": exposure_position("Buy", "0.5", "25000", "10")})
+        accounts_book.account(2).set_positions({"BTCUSDT": exposure_position("Sell", "0.2", "10000", "-4.5")})
+        accounts_book.account(3).set_positions({})
+
+        self.assertEqual(accounts_book.exposure.snapshot(), {"accounts": 3, "symbols": {"BTCUSDT": {
+            "accounts": 2, "long_qty": "0.5", "short_qty": "0.2", "net_qty": "0.3", "notional": "35000",
+            "net_notional": "15000", "uPnL": "5.5",
+        }}})
+        accounts_book.account(1).update_positions({}, ["BTCUSDT"])
+        accounts_book.drop(2)
+        self.assertEqual(accounts_book.exposure.snapshot(), {"accounts": 2, "symbols": {}})
+
+
+class AccountStreamTests(SimpleTestCase):
+    def setUp(self):
+        self.server = FakeStreamServer(RECORDED_PRIVATE_STREAM).start()
+        self.addCleanup(self.server.stop)
+        settings_patch = override_settings(TRADING_BYBIT_WS_URL=self.server.url)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+
+        self.rest = mock.Mock()
+        self.rest._fetch_usdt_balance.return_value = 10.0
+        self.rest._fetch_positions.return_value = {}
+        patcher = mock.patch("trading.streams.sessions")
+        patcher.start().get.return_value = self.rest
+        self.addCleanup(patcher.stop)
+
+        self.user = SimpleNamespace(pk=99, api_key="key", api_secret="secret", demo=False)
+        self.addCleanup(book.drop, self.user.pk)
+        self.stream = AccountStream(self.user)
+        self.addCleanup(self.stream.stop)
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail("estado do stream não convergiu")
+            time.sleep(0.01)
+
+    def test_book_replays_recorded_messages(self):
+        self.stream.start()
+        state = self.stream.state
+        self.wait_for(lambda: state.streaming and state.get_balance()[0] == 1234.5 and state.positions_at
+                      and "ETHUSDT" not in state.get_positions() and "BTCUSDT" in state.get_positions())
+        self.assertEqual(state.get_positions()["BTCUSDT"]["qty"], "5")
+        self.assertEqual(state.get_positions()["BTCUSDT"]["avg_price"], "100")
+
+    def test_trading_api_reads_from_streamed_book(self):
+        self.stream.start()
+        state = self.stream.state
+        self.wait_for(lambda: state.streaming and "BTCUSDT" in state.get_positions()
+                      and state.get_balance()[0] == 1234.5)
+
+        api = TradingApi("key", "secret", state=state)
+        api._session = mock.Mock()
+        api._session.place_order.return_value = {"result": {"orderId": "1"}}
+        self.assertEqual(api.get_usdt_balance(), 1234.5)
+        self.assertIn("BTCUSDT", api.get_positions())
+
+        api.close_order("BTCUSDT")
+        self.assertEqual([call[0] for call in api._session.method_calls], ["place_order"])
+        self.assertEqual(api._session.place_order.call_args.kwargs["qty"], "5")
+
+    def test_pushed_updates_after_seed(self):
+        self.stream.start()
+        state = self.stream.state
+        self.wait_for(lambda: state.streaming and "BTCUSDT" in state.get_positions())
+        self.server.push({"topic": "position", "data": [recorded_position("BTCUSDT", "", "0")]})
+        self.wait_for(lambda: "BTCUSDT" not in state.get_positions())
+
+    def test_book_not_used_without_stream(self):
+        state = AccountState()
+        state.set_positions({"BTCUSDT": {"qty": "1"}})
+        api = TradingApi("key", "secret", state=state)
+        api._session = mock.Mock()
+        api._session.get_positions.return_value = {"result": {"list": []}}
+        self.assertEqual(api.get_positions(), "Não há posições abertas.")
+
+
+class MockExchangeMixin():
+    """Aponta TradingApi e AsyncTradingApi para um servidor mock local da Bybit."""
+    def setUp(self):
+        super().setUp()
+        self.server = MockBybitServer(prices={"BTCUSDT": 50000}).start()
+        self.addCleanup(self.server.stop)
+        settings_patch = override_settings(TRADING_BYBIT_HTTP_URL=self.server.url)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        reset_market_data()
+        self.addCleanup(reset_market_data)
+        self.addCleanup(read_cache.invalidate)
+        self.addCleanup(async_read_cache.invalidate)
+
+
+class AsyncTradingApiTests(MockExchangeMixin, SimpleTestCase):
+    async def test_order_lifecycle_matches_sync_api(self):
+        api = AsyncTradingApi("async-key", "secret")
+        try:
+            self.assertEqual(await api.get_usdt_balance(), 10000.0)
+            order = await api.place_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy", leverage=5)
+            sync_order = TradingApi("sync-key", "secret").place_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy", leverage=5)
+            sized = ["qty", "tp", "sl", "order_amount"]
+            self.assertEqual({key: order[key] for key in sized}, {key: sync_order[key] for key in sized})
+            self.assertEqual((order["attempts"], order["reconciled"]), (1, False))
+
+            positions = await api.get_positions()
+            self.assertEqual(Decimal(positions["BTCUSDT"]["qty"]), Decimal(order["qty"]))
+            await api.change_tp_sl("BTCUSDT", "52000", None)
+            self.assertEqual((await api.get_positions())["BTCUSDT"]["tp"], "52000")
+
+            closed = await api.close_order("BTCUSDT")
+            self.assertEqual(closed["side"], "Buy")
+            self.assertEqual(await api.get_positions(), "Não há posições abertas.")
+        finally:
+            await api.aclose()
+
+    @override_settings(TRADING_ORDER_RETRY_BACKOFF=0.01)
+    async def test_lost_response_is_reconciled_not_resent(self):
+        self.server.inject("/v5/order/create", code=10016, after=True)
+        api = AsyncTradingApi("async-key", "secret")
+        try:
+            order = await api.place_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy", order_link_id="signal-1")
+        finally:
+            await api.aclose()
+
+        self.assertTrue(order["reconciled"])
+        self.assertTrue(order["order_id"])
+        self.assertEqual(len(self.server.fills), 1)
+        self.assertEqual(self.server.calls["/v5/order/create"], 1)
+
+    async def test_positions_follow_the_account_state_like_the_sync_api(self):
+        state = AccountState()
+        api = AsyncTradingApi("async-state-key", "secret", state=state)
+        try:
+            await api.place_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy", leverage=5)
+            await api.get_positions()
+            self.assertEqual(list(state.get_positions()), ["BTCUSDT"])
+
+            # Com o stream privado ativo, as posições vêm do estado local, sem consultar a Bybit
+            state.seeded, state.stream = True, SimpleNamespace(is_connected=lambda: True)
+            state.set_positions({})
+            reads = self.server.calls["/v5/position/list"]
+            with self.assertRaisesMessage(RuntimeError, "Não há posição para BTCUSDT"):
+                await api.close_order("BTCUSDT")
+            self.assertEqual(await api.close_all(), [])
+        finally:
+            await api.aclose()
+
+        self.assertEqual(self.server.calls["/v5/position/list"], reads)
+
+    async def test_exchange_errors_are_wrapped(self):
+        api = AsyncTradingApi("async-key", "secret")
+        try:
+            with self.assertRaisesMessage(RuntimeError, "Erro ao fechar ordem"):
+                await api.close_order("ETHUSDT")
+            # "leverage not modified" não é erro, igual ao TradingApi
+            await api.set_leverage("3", "BTCUSDT")
+            self.assertIsNone(await api.set_leverage("3", "BTCUSDT"))
+        finally:
+            await api.aclose()
+
+
+class PresignedOrderTests(MockExchangeMixin, SimpleTestCase):
+    def test_prepared_order_is_sent_without_signing_again(self):
+        api = TradingApi("signed-key", "secret")
+        prepared = api.prepare_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy", balance=1000, order_link_id="signed-1")
+        self.assertIn("X-BAPI-SIGN", prepared.request.headers)
+
+        with mock.patch.object(api._session, "place_order", side_effect=AssertionError("assinou de novo")):
+            order = api.send_order(prepared)
+
+        self.assertEqual((order["order_link_id"], order["attempts"]), ("signed-1", 1))
+        self.assertEqual(order["qty"], prepared.sized["qty"])
+        self.assertEqual(len(self.server.fills), 1)
+
+    def test_stale_or_failed_prepared_order_is_signed_again(self):
+        api = TradingApi("signed-key", "secret")
+        stale = api.prepare_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy", balance=1000)
+        stale.signed_at -= 60
+        with mock.patch.object(api._session, "place_order", wraps=api._session.place_order) as place_order:
+            api.send_order(stale)
+        place_order.assert_called_once()
+
+        self.server.inject("/v5/order/create", code=10016)
+        with override_settings(TRADING_ORDER_RETRY_BACKOFF=0.01):
+            order = api.send_order(api.prepare_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy", balance=1000))
+        self.assertEqual(order["attempts"], 2)
+        self.assertEqual(len(self.server.fills), 2)
+
+    def test_prepared_order_delayed_by_the_rate_limiter_is_signed_again(self):
+        api = TradingApi("signed-key", "secret")
+        prepared = api.prepare_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy", balance=1000, order_link_id="delayed-1")
+        limiter = api._session.client.limiter
+
+        def wait(api_key, path):
+            prepared.signed_at -= 60  # a espera na fila passou da metade do recv_window
+
+        with mock.patch.object(limiter, "acquire", side_effect=wait) as acquire, \
+                mock.patch.object(api, "_sign_order", wraps=api._sign_order) as sign:
+            order = api.send_order(prepared)
+
+        acquire.assert_called_once_with("signed-key", "/v5/order/create")
+        sign.assert_called_once_with(prepared.order)
+        self.assertEqual((order["order_link_id"], order["attempts"]), ("delayed-1", 1))
+        self.assertEqual(len(self.server.fills), 1)
+
+    def test_expired_signature_is_signed_again_and_retried(self):
+        api = TradingApi("signed-key", "secret")
+        self.server.inject("/v5/order/create", code=10002)
+        with override_settings(TRADING_ORDER_RETRY_BACKOFF=0.01):
+            order = api.send_order(api.prepare_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy", balance=1000))
+        self.assertEqual(order["attempts"], 2)
+        self.assertEqual(len(self.server.fills), 1)
+
+    async def test_async_prepared_order_delayed_by_the_rate_limiter_is_signed_again(self):
+        api = AsyncTradingApi("async-signed-key", "secret")
+        try:
+            prepared = await api.prepare_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy", balance=1000)
+
+            async def wait(api_key, path):
+                prepared.signed_at -= 60
+
+            with mock.patch.object(api._limiter, "acquire_async", side_effect=wait) as acquire, \
+                    mock.patch.object(api, "_sign_order", wraps=api._sign_order) as sign:
+                order = await api.send_order(prepared)
+        finally:
+            await api.aclose()
+
+        acquire.assert_called_once_with("async-signed-key", "/v5/order/create")
+        sign.assert_called_once_with(prepared.order)
+        self.assertEqual(order["attempts"], 1)
+        self.assertEqual(len(self.server.fills), 1)
+
+    async def test_async_prepared_order(self):
+        api = AsyncTradingApi("async-signed-key", "secret")
+        try:
+            prepared = await api.prepare_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy", balance=1000)
+            order = await api.send_order(prepared)
+        finally:
+            await api.aclose()
+
+        self.assertTrue(order["order_id"])
+        self.assertEqual(self.server.calls["/v5/order/create"], 1)
+        self.assertEqual(len(self.server.fills), 1)
+
+
+class MockBybitBroadcastTests(MockExchangeMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(sessions.clear)
+        self.addCleanup(book.clear)
+        for i in range(3):
+            user = User.objects.create(username=f"mock-{i}")
+            TradingUser.objects.create(user=user, api_key=f"mock-key-{i}", api_secret="secret")
+            Leverage.objects.create(user=user, symbol="BTCUSDT", leverage=5)
+
+    def place_order(self):
+        return self.client.post("/trading/place-order/", data=json.dumps({
+            "percent": 1, "symbol": "BTCUSDT", "profit": 2, "max_loss": 1, "side": "Buy"
+        }), content_type="application/json").json()
+
+    @override_settings(TRADING_BROADCAST_DEADLINE=0.35)
+    def test_prepare_and_send_share_one_broadcast_deadline(self):
+        prepare, send = TradingApi.prepare_order_tp_sl, TradingApi.send_order
+        slow = lambda method, delay: lambda *args, **kwargs: time.sleep(delay) or method(*args, **kwargs)
+
+        with mock.patch.object(TradingApi, "prepare_order_tp_sl", slow(prepare, 0.25)), \
+                mock.patch.object(TradingApi, "send_order", slow(send, 0.2)):
+            start = time.monotonic()
+            data = self.place_order()
+            elapsed = time.monotonic() - start
+
+        # Cada fase cabe sozinha no prazo, mas as duas juntas não
+        self.assertEqual(data["successful_orders"], 0)
+        self.assertTrue(all("Prazo total excedido" in r["message"] for r in data["results"]))
+        self.assertLess(elapsed, 0.45)
+
+    def test_place_order_fills_every_account_with_one_ticker_call(self):
+        data = self.place_order()
+
+        self.assertEqual(data["successful_orders"], 3)
+        self.assertEqual(sorted(api_key for api_key, _, _ in self.server.fills),
+                         ["mock-key-0", "mock-key-1", "mock-key-2"])
+        self.assertEqual(self.server.calls["/v5/market/tickers"], 1)
+        self.assertEqual(self.server.calls["/v5/order/create"], 3)
+
+    def test_orders_are_prepared_before_the_first_send(self):
+        data = self.place_order()
+        first_order = min(at for _, path, at in self.server.received if path == "/v5/order/create")
+
+        self.assertEqual(data["successful_orders"], 3)
+        # Com o saldo consultado no preparo, toda leitura de carteira chega antes da 1ª ordem
+        wallet = [at for _, path, at in self.server.received if path == "/v5/account/wallet-balance"]
+        self.assertEqual(len(wallet), 3)
+        self.assertLess(max(wallet), first_order)
+
+    def test_known_balances_are_sized_in_one_pass(self):
+        for account in TradingUser.objects.all():
+            book.set_balance(account.pk, 10000)
+
+        with mock.patch("trading.views.size_orders", wraps=size_orders) as batch:
+            data = self.place_order()
+
+        batch.assert_called_once()
+        self.assertEqual(batch.call_args.args[:2], ([10000] * 3, [5] * 3))
+        self.assertEqual(data["successful_orders"], 3)
+        self.assertEqual(self.server.calls["/v5/account/wallet-balance"], 0)
+        rule = instruments.get("BTCUSDT", get_market_data())
+        expected = calc_tp_sl(10000, 50000, rule, 1, 2, 1, "Buy", 5)
+        for result in data["results"]:
+            order = result["message"]
+            self.assertEqual((order["qty"], order["tp"], order["sl"], order["order_amount"]), expected)
+
+    def test_injected_error_fails_only_one_account(self):
+        self.server.inject("/v5/order/create", code=110007, message="ab not enough for new order")
+
+        data = self.place_order()
+
+        self.assertEqual(data["successful_orders"], 2)
+        errors = [r["message"] for r in data["results"] if r["status"] == "error"]
+        self.assertEqual(len(errors), 1)
+        self.assertIn("ab not enough", errors[0])
+        self.assertEqual(len(self.server.fills), 2)
+
+    @override_settings(TRADING_ORDER_RETRY_BACKOFF=0.01)
+    def test_transient_error_is_retried(self):
+        self.server.inject("/v5/order/create", code=10016, times=2)
+
+        data = self.place_order()
+
+        self.assertEqual(data["successful_orders"], 3)
+        self.assertEqual(sum(r["message"]["attempts"] for r in data["results"]), 5)
+        self.assertEqual(len(self.server.fills), 3)
+
+    def test_resent_signal_does_not_double_positions(self):
+        body = json.dumps({"percent": 1, "symbol": "BTCUSDT", "profit": 2, "max_loss": 1, "side": "Buy",
+                           "signal_id": "signal-42"})
+        first = self.client.post("/trading/place-order/", data=body, content_type="application/json").json()
+        again = self.client.post("/trading/place-order/", data=body, content_type="application/json").json()
+
+        self.assertEqual(again["successful_orders"], 3)
+        self.assertTrue(all(r["message"]["reconciled"] for r in again["results"]))
+        self.assertEqual(
+            sorted(r["message"]["order_id"] for r in again["results"]),
+            sorted(r["message"]["order_id"] for r in first["results"])
+        )
+        self.assertEqual(len(self.server.fills), 3)
+
+    async def test_async_view_streams_ndjson(self):
+        response = await self.async_client.get("/trading/async/get-balance/?stream=ndjson")
+
+        lines = b"".join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(sorted(r["username"] for r in records[:-1]), ["mock-0", "mock-1", "mock-2"])
+        self.assertEqual(records[-1], {"status": "completed", "total_users": 3, "successful_orders": 3})
+
+    def batch_legs(self):
+        # 21 pernas com alavancagem (2 lotes de place_batch_order) e uma sem
+        legs = [{"symbol": "BTCUSDT", "side": "Buy", "percent": 1, "profit": 2, "max_loss": 1}] * 21
+        return legs + [{"symbol": "SOLUSDT", "side": "Sell", "percent": 1, "profit": 2, "max_loss": 1}]
+
+    def test_batch_order_sends_legs_in_chunks(self):
+        data = self.client.post("/trading/place-batch-order/", data=json.dumps({"legs": self.batch_legs()}),
+                                content_type="application/json").json()
+
+        self.assertEqual(data["total_users"], 3)
+        for result in data["results"]:
+            self.assertEqual(result["status"], "partial")
+            self.assertEqual(result["successful_legs"], 21)
+            self.assertTrue(result["legs"][0]["order_id"])
+            self.assertIn("Leverage", result["legs"][-1]["error"])
+        self.assertEqual(self.server.calls["/v5/order/create-batch"], 6)
+        self.assertEqual(self.server.calls["/v5/order/create"], 0)
+        self.assertEqual(len(self.server.fills), 63)
+
+    def test_batch_order_rejects_invalid_legs(self):
+        response = self.client.post("/trading/place-batch-order/", data=json.dumps({"legs": [{"symbol": "BTCUSDT"}]}),
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_order_rejects_missing_legs_and_non_post(self):
+        for prefix in ("/trading/", "/trading/async/"):
+            missing = self.client.post(f"{prefix}place-batch-order/", data=json.dumps({"symbol": "BTCUSDT"}),
+                                       content_type="application/json")
+            self.assertEqual(missing.status_code, 400)
+            self.assertIn("Missing required keys", missing.json()["message"])
+            self.assertEqual(self.client.get(f"{prefix}place-batch-order/").status_code, 405)
+        self.assertEqual(self.server.calls["/v5/order/create-batch"], 0)
+
+    async def test_async_batch_order(self):
+        response = await self.async_client.post("/trading/async/place-batch-order/",
+                                                data=json.dumps({"legs": self.batch_legs()}),
+                                                content_type="application/json")
+        data = json.loads(response.content)
+
+        self.assertEqual([r["successful_legs"] for r in data["results"]], [21, 21, 21])
+        self.assertEqual(self.server.calls["/v5/order/create-batch"], 6)
+
+    def test_exposure_sums_positions_of_every_account(self):
+        self.place_order()
+        self.client.get("/trading/get-positions/")
+
+        data = self.client.get("/trading/exposure/").json()
+
+        self.assertEqual(data["accounts"], 3)
+        btc = data["symbols"]["BTCUSDT"]
+        qty = Decimal(self.server.account("mock-key-0")["positions"]["BTCUSDT"]["size"])
+        self.assertEqual((btc["accounts"], Decimal(btc["net_qty"]), btc["short_qty"]), (3, qty * 3, "0"))
+
+        # A exposição acompanha as posições conhecidas: a próxima leitura (ou o stream) tira as fechadas
+        self.client.post("/trading/close-all/", data=b"{}", content_type="application/json")
+        self.client.get("/trading/get-positions/")
+        self.assertEqual(self.client.get("/trading/exposure/").json()["symbols"], {})
+
+    def open_two_symbols(self):
+        self.server.prices["ETHUSDT"] = 3000
+        for account in TradingUser.objects.all():
+            Leverage.objects.create(user=account.user, symbol="ETHUSDT", leverage=5)
+        legs = [{"symbol": "BTCUSDT", "side": "Buy", "percent": 1, "profit": 2, "max_loss": 1},
+                {"symbol": "ETHUSDT", "side": "Sell", "percent": 1, "profit": 2, "max_loss": 1}]
+        self.client.post("/trading/place-batch-order/", data=json.dumps({"legs": legs}),
+                         content_type="application/json")
+        self.server.calls.clear()
+
+    @override_settings(TRADING_HISTORY_BACKGROUND=False)
+    def test_close_all_flattens_every_position_in_one_batch_per_account(self):
+        self.open_two_symbols()
+
+        data = self.client.post("/trading/close-all/", data=json.dumps({"signal_id": "panic-1"}),
+                                content_type="application/json").json()
+
+        self.assertEqual([r["closed_positions"] for r in data["results"]], [2, 2, 2])
+        position = data["results"][0]["positions"][0]
+        self.assertEqual((position["symbol"], position["side"]), ("BTCUSDT", "Buy"))
+        self.assertIn("PnL", position)
+        self.assertTrue(all(not account["positions"] for account in self.server.accounts.values()))
+        self.assertEqual(self.server.calls["/v5/position/list"], 3)
+        self.assertEqual(self.server.calls["/v5/order/create-batch"], 3)
+        self.assertEqual(self.server.calls["/v5/order/create"], 0)
+        closes = Order.objects.filter(execution__kind="close_all")
+        self.assertEqual(sorted(closes.values_list("symbol", "side")), [("BTCUSDT", "Sell")] * 3 + [("ETHUSDT", "Buy")] * 3)
+
+        # Reenviar o mesmo sinal não encontra mais posições para fechar
+        again = self.client.post("/trading/close-all/", data=json.dumps({"signal_id": "panic-1"}),
+                                 content_type="application/json").json()
+        self.assertEqual([r["closed_positions"] for r in again["results"]], [0, 0, 0])
+
+    def test_close_all_reports_each_position(self):
+        self.open_two_symbols()
+        self.server.inject("/v5/order/create-batch", code=10001, message="params error")
+
+        data = self.client.post("/trading/close-all/", data=b"", content_type="application/json").json()
+
+        self.assertEqual(sorted(r["status"] for r in data["results"]), ["error", "success", "success"])
+        failed = next(r for r in data["results"] if r["status"] == "error")["positions"]
+        self.assertEqual([(p["symbol"], p["side"]) for p in failed], [("BTCUSDT", "Buy"), ("ETHUSDT", "Sell")])
+        self.assertTrue(all("params error" in p["error"] for p in failed))
+        self.assertEqual(sum(len(account["positions"]) for account in self.server.accounts.values()), 2)
+
+    async def test_async_close_all(self):
+        await sync_to_async(self.open_two_symbols)()
+
+        response = await self.async_client.post("/trading/async/close-all/", data=b"{}",
+                                                content_type="application/json")
+        data = json.loads(response.content)
+
+        self.assertEqual([r["closed_positions"] for r in data["results"]], [2, 2, 2])
+        self.assertEqual(self.server.calls["/v5/order/create-batch"], 3)
+
+
+class ReadCacheTests(MockExchangeMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(sessions.clear)
+        self.addCleanup(book.clear)
+        for i in range(3):
+            user = User.objects.create(username=f"poll-{i}")
+            TradingUser.objects.create(user=user, api_key=f"poll-key-{i}", api_secret="secret")
+            Leverage.objects.create(user=user, symbol="BTCUSDT", leverage=5)
+
+    def test_repeated_polls_share_one_read_and_answer_304(self):
+        first = self.client.get("/trading/get-balance/?max_age=10")
+        second = self.client.get("/trading/get-balance/?max_age=10")
+
+        self.assertEqual(self.server.calls["/v5/account/wallet-balance"], 3)
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertTrue(all("cached_age" in r for r in second.json()["results"]))
+        self.assertFalse(any("cached_age" in r for r in first.json()["results"]))
+
+        unchanged = self.client.get("/trading/get-balance/?max_age=10", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual((unchanged.status_code, unchanged.content), (304, b""))
+        self.assertEqual(self.server.calls["/v5/account/wallet-balance"], 3)
+
+        self.client.get("/trading/get-balance/?max_age=0")
+        self.assertEqual(self.server.calls["/v5/account/wallet-balance"], 6)
+        self.assertEqual(self.client.get("/trading/get-balance/?max_age=-1").status_code, 400)
+
+    def test_orders_invalidate_cached_positions(self):
+        before = self.client.get("/trading/get-positions/?max_age=10")
+        self.client.post("/trading/place-order/", data=json.dumps({
+            "percent": 1, "symbol": "BTCUSDT", "profit": 2, "max_loss": 1, "side": "Buy"
+        }), content_type="application/json")
+
+        after = self.client.get("/trading/get-positions/?max_age=10", HTTP_IF_NONE_MATCH=before["ETag"])
+
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after["ETag"], before["ETag"])
+        self.assertTrue(all("BTCUSDT" in r["message"] for r in after.json()["results"]))
+
+    def test_concurrent_reads_of_one_account_are_coalesced(self):
+        cache, calls = ReadCache(), []
+        account = SimpleNamespace(pk=1)
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.05)
+            return 1234.5
+
+        results = fan_out(range(8), lambda _: cache.get("balance", account, 5, fetch))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual({value.value for _, value, _ in results}, {1234.5})
+
+    async def test_async_balance_reads_feed_the_account_book(self):
+        await self.async_client.get("/trading/async/get-balance/?max_age=0")
+
+        with mock.patch("trading.async_views.reads_saturated", return_value=True):
+            shed = await self.async_client.get("/trading/async/get-balance/?max_age=0")
+
+        self.assertEqual(self.server.calls["/v5/account/wallet-balance"], 3)
+        self.assertEqual([r["saldo"] for r in shed.json()["results"]], [10000.0] * 3)
+        self.assertTrue(all("cached_age" in r for r in shed.json()["results"]))
+
+    async def test_async_polls_answer_304(self):
+        first = await self.async_client.get("/trading/async/get-positions/?max_age=10")
+        unchanged = await self.async_client.get("/trading/async/get-positions/?max_age=10",
+                                                headers={"If-None-Match": first["ETag"]})
+
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(self.server.calls["/v5/position/list"], 3)
+
+
+@override_settings(TRADING_SHARDS=2, TRADING_HISTORY_BACKGROUND=False)
+class ShardTests(MockExchangeMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(shards.stop)
+        self.addCleanup(sessions.clear)
+        for i in range(5):
+            user = User.objects.create(username=f"shard-{i}")
+            TradingUser.objects.create(user=user, api_key=f"shard-key-{i}", api_secret="secret")
+            if i:
+                Leverage.objects.create(user=user, symbol="BTCUSDT", leverage=5)
+
+    def post(self, path, body):
+        return self.client.post(path, data=json.dumps(body), content_type="application/json").json()
+
+    def test_signal_runs_each_account_in_the_process_of_its_shard(self):
+        data = self.post("/trading/place-order/", {
+            "signal_id": "sharded-1", "percent": 1, "symbol": "BTCUSDT", "profit": 2, "max_loss": 1, "side": "Buy"
+        })
+
+        self.assertEqual(len(shards), 2)
+        self.assertEqual([r["user"] for r in data["results"]], [f"shard-{i}" for i in range(5)])
+        self.assertEqual(data["successful_orders"], 4)
+        self.assertEqual(data["results"][0]["message"], "Leverage matching query does not exist.")
+        for account in TradingUser.objects.exclude(user__username="shard-0"):
+            orders = self.server.account(account.api_key)["orders"]
+            self.assertEqual([o["orderLinkId"] for o in orders], [order_link_id("sharded-1", account.pk)])
+        # As sessões ficam nos processos dos shards, não no processo do request
+        self.assertEqual(sessions._sessions, {})
+        self.assertEqual(Order.objects.filter(execution__signal_id="sharded-1").count(), 5)
+
+        closed = self.post("/trading/close-all/", {})
+        self.assertEqual([r["closed_positions"] for r in closed["results"]], [0, 1, 1, 1, 1])
+        self.assertFalse(any(account["positions"] for account in self.server.accounts.values()))
+
+    def test_known_balances_are_sent_to_the_shards(self):
+        for account in TradingUser.objects.all():
+            book.account(account.pk).set_balance(10000.0)
+        self.addCleanup(book.clear)
+
+        data = self.post("/trading/place-order/", {
+            "signal_id": "sharded-known", "percent": 1, "symbol": "BTCUSDT", "profit": 2, "max_loss": 1, "side": "Buy"
+        })
+
+        self.assertEqual(data["successful_orders"], 4)
+        self.assertTrue(all("balance_age" in r["message"] for r in data["results"][1:]))
+        self.assertEqual(self.server.calls["/v5/account/wallet-balance"], 0)
+
+    def test_shard_prepare_and_send_share_one_deadline(self):
+        accounts = [ShardAccount(account.pk, account.api_key, account.api_secret, account.demo, 5)
+                    for account in TradingUser.objects.all()]
+        params = {"percent": 1, "symbol": "BTCUSDT", "profit": 2, "max_loss": 1, "side": "Buy"}
+        prepare, send = TradingApi.prepare_order_tp_sl, TradingApi.send_order
+        slow = lambda method, delay: lambda *args, **kwargs: time.sleep(delay) or method(*args, **kwargs)
+
+        with mock.patch.object(TradingApi, "prepare_order_tp_sl", slow(prepare, 0.25)), \
+                mock.patch.object(TradingApi, "send_order", slow(send, 0.2)):
+            _, results = run_signal((1, ShardTask("place_order", params, "shard-deadline"), accounts, 0.35))
+
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(error is not None and "Prazo total excedido" in error[0] for _, _, error in results))
+
+    def test_settings_changes_apply_only_after_an_explicit_restart(self):
+        users = list(TradingUser.objects.for_broadcast())
+        shards.warm(users)
+        started = list(shards._shards)
+
+        # O caminho do sinal só confere se os processos estão vivos
+        with override_settings(TRADING_SHARDS=3), \
+                mock.patch.object(shards, "_overrides", side_effect=AssertionError("configurações relidas")):
+            shards.warm(users)
+        self.assertEqual(shards._shards, started)
+
+        shards.stop()
+        with override_settings(TRADING_SHARDS=3):
+            results = shards.warm(users)
+        self.assertEqual(len(shards), 3)
+        self.assertEqual([error for _, _, error in results], [None] * 5)
+
+    def test_dry_run_stays_in_the_request_process(self):
+        data = self.client.post("/trading/place-order/?dry_run=1", data=json.dumps({
+            "percent": 1, "symbol": "BTCUSDT", "profit": 2, "max_loss": 1, "side": "Buy"
+        }), content_type="application/json").json()
+
+        self.assertTrue(data["dry_run"])
+        self.assertEqual(len(shards), 0)
+
+    def test_dead_shard_is_restarted_on_the_next_signal(self):
+        users = list(TradingUser.objects.for_broadcast())
+        shards.warm(users)
+        shards._shards[1].process.kill()
+        shards._shards[1].process.join()
+
+        with self.assertLogs("trading.shards", "WARNING"):
+            results = shards.warm(users)
+
+        self.assertEqual([error for _, _, error in results], [None] * 5)
+        self.assertTrue(all(shard.alive for shard in shards._shards))
+
+
+class FastJsonTests(MockExchangeMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(fast_json.use, fast_json.backend)
+
+    def test_backends_encode_the_same_values_as_django(self):
+        payload = {
+            "qty": Decimal("0.010"), "at": dt(2026, 1, 2, 3, 4, 5, 678901, tzinfo=dt_timezone.utc),
+            "id": uuid.UUID(int=7), "legs": {1: "BTCUSDT"}, "price": np.float64(50000.5), "ok": True,
+        }
+        expected = json.loads(json.dumps(payload, cls=DjangoJSONEncoder))
+
+        for backend in fast_json.BACKENDS:
+            fast_json.use(backend)
+            self.assertEqual(fast_json.loads(fast_json.dumps(payload)), expected)
+            self.assertEqual(json.loads(fast_json.JsonResponse(payload).content), expected)
+            self.assertEqual(list(fast_json.loads(fast_json.dumps({"b": 1, "a": 2}, sort_keys=True))), ["a", "b"])
+
+        with self.assertRaises(ValueError):
+            fast_json.use("simplejson")
+
+    def test_invalid_signal_bodies_are_rejected_with_either_backend(self):
+        for backend in fast_json.BACKENDS:
+            fast_json.use(backend)
+            invalid = self.client.post("/trading/jobs/close-order/", data=b"{not json",
+                                       content_type="application/json")
+            missing = self.client.post("/trading/jobs/close-order/", data=b"[1]", content_type="application/json")
+
+            self.assertEqual(invalid.status_code, 400)
+            self.assertTrue(invalid.json()["message"].startswith("Invalid JSON"))
+            self.assertEqual(missing.status_code, 400)
+
+    def test_exchange_responses_are_decoded_by_the_backend(self):
+        with mock.patch.object(fast_json, "_loads", wraps=fast_json._loads) as loads:
+            self.assertEqual(TradingApi("json-key", "secret").get_usdt_balance(), 10000.0)
+
+        self.assertTrue(any(b"retCode" in call.args[0] for call in loads.call_args_list))
+
+
+class SignalJobTests(MockExchangeMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(sessions.clear)
+        self.addCleanup(book.clear)
+        for i in range(3):
+            user = User.objects.create(username=f"job-{i}")
+            TradingUser.objects.create(user=user, api_key=f"job-key-{i}", api_secret="secret")
+            Leverage.objects.create(user=user, symbol="BTCUSDT", leverage=5)
+
+    def enqueue(self, signal_id="signal-7"):
+        return self.client.post("/trading/jobs/place-order/", data=json.dumps({
+            "percent": 1, "symbol": "BTCUSDT", "profit": 2, "max_loss": 1, "side": "Buy", "signal_id": signal_id
+        }), content_type="application/json")
+
+    def test_enqueue_returns_job_id_before_execution(self):
+        response = self.enqueue()
+
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        self.assertEqual((data["status"], data["total_tasks"], data["done"]), ("pending", 3, 0))
+        self.assertEqual(self.server.fills, [])
+        # Reenviar o mesmo sinal devolve o mesmo job
+        again = self.enqueue()
+        self.assertEqual((again.status_code, again.json()["job_id"]), (200, data["job_id"]))
+
+        self.assertEqual(run_worker(once=True), 3)
+        progress = self.client.get(data["progress_url"]).json()
+        self.assertEqual((progress["status"], progress["tasks"]["success"]), ("completed", 3))
+        self.assertEqual(len(progress["results"]), 3)
+        self.assertEqual(len(self.server.fills), 3)
+
+    def test_tasks_of_a_dead_worker_are_retried_without_double_fills(self):
+        job_id = self.enqueue().json()["job_id"]
+        # Um worker reservou duas tarefas, executou a primeira na Bybit e morreu antes de gravar
+        claimed = claim_tasks(limit=2)
+        JOB_KINDS["place_order"][1](claimed[0])
+        SignalTask.objects.filter(claim=claimed[0].claim).update(lease_until=timezone.now())
+
+        self.assertEqual(run_worker(once=True), 3)
+
+        tasks = SignalTask.objects.filter(job_id=job_id).order_by("pk")
+        self.assertEqual([task.status for task in tasks], ["success"] * 3)
+        self.assertTrue(tasks[0].result["reconciled"])
+        self.assertEqual([task.attempts for task in tasks], [2, 2, 1])
+        self.assertEqual(len(self.server.fills), 3)
+        self.assertEqual(SignalJob.objects.get(pk=job_id).status, "completed")
+
+    @override_settings(TRADING_JOB_MAX_ATTEMPTS=1, TRADING_HISTORY_BACKGROUND=False)
+    def test_tasks_abandoned_on_the_last_attempt_finish_the_job(self):
+        job_id = self.enqueue("signal-abandoned").json()["job_id"]
+        # O worker reservou todas as tarefas na última tentativa e morreu antes de executá-las
+        claimed = claim_tasks()
+        SignalTask.objects.filter(claim=claimed[0].claim).update(lease_until=timezone.now())
+
+        self.assertEqual(run_worker(once=True), 0)
+
+        tasks = SignalTask.objects.filter(job_id=job_id)
+        self.assertEqual({(task.status, task.claim) for task in tasks}, {("error", "")})
+        self.assertEqual(SignalJob.objects.get(pk=job_id).status, "completed")
+        orders = Order.objects.filter(execution__signal_id="signal-abandoned")
+        self.assertEqual([order.status for order in orders], [Order.ERROR] * 3)
+        self.assertTrue(all("abandonada" in order.error for order in orders))
+        self.assertEqual(self.server.fills, [])
+
+    def test_progress_streams_results_and_summary(self):
+        job_id = self.enqueue().json()["job_id"]
+        run_worker(once=True)
+
+        response = self.client.get(f"/trading/jobs/{job_id}/?stream=ndjson")
+        records = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+        self.assertEqual(sorted(r["user"] for r in records[:3]), ["job-0", "job-1", "job-2"])
+        self.assertEqual(records[3]["done"], 3)
+        self.assertEqual(records[-1], {"status": "completed", "total_users": 3, "successful_orders": 3})
+
+
+@override_settings(TRADING_HISTORY_BACKGROUND=False)
+class OrderHistoryTests(MockExchangeMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(sessions.clear)
+        self.addCleanup(book.clear)
+        for i in range(3):
+            user = User.objects.create(username=f"history-{i}")
+            TradingUser.objects.create(user=user, api_key=f"history-key-{i}", api_secret="secret")
+            Leverage.objects.create(user=user, symbol="BTCUSDT", leverage=5)
+
+    def post(self, path, body):
+        return self.client.post(path, data=json.dumps(body), content_type="application/json").json()
+
+    def test_signal_is_stored_with_one_insert_per_table(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.post("/trading/place-order/", {
+                "percent": 1, "symbol": "BTCUSDT", "profit": 2, "max_loss": 1, "side": "Buy", "signal_id": "s-1"
+            })
+        inserts = [q["sql"] for q in queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 2)
+
+        execution = SignalExecution.objects.get(signal_id="s-1")
+        self.assertEqual((execution.kind, execution.total_accounts, execution.successful), ("place_order", 3, 3))
+        orders = Order.objects.filter(execution=execution)
+        self.assertEqual({(o.kind, o.side, o.status) for o in orders}, {("open", "Buy", "success")})
+        self.assertTrue(all(o.order_id and o.order_link_id for o in orders))
+        self.assertEqual(Order.objects.filter(symbol="BTCUSDT").window(execution.created_at).count(), 3)
+
+    def test_close_and_errors_are_stored(self):
+        self.post("/trading/place-order/", {"percent": 1, "symbol": "BTCUSDT", "profit": 2, "max_loss": 1, "side": "Sell"})
+        self.server.inject("/v5/order/create", code=110017, message="reduce-only rejected")
+        self.post("/trading/close-order/", {"symbol": "BTCUSDT"})
+
+        closes = Order.objects.filter(kind=Order.CLOSE)
+        self.assertEqual(sorted(o.status for o in closes), ["error", "success", "success"])
+        self.assertIn("reduce-only", closes.get(status="error").error)
+        self.assertEqual(closes.filter(side="Buy", status="success").count(), 2)
+        account = TradingUser.objects.get(user__username="history-0")
+        self.assertEqual(Order.objects.filter(account=account).count(), 2)
+
+    @override_settings(TRADING_HISTORY_BACKGROUND=True)
+    def test_background_writes_happen_after_commit(self):
+        with mock.patch("trading.history.write") as write:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.post("/trading/update-tp-sl/", {"symbol": "BTCUSDT", "tp": "52000", "sl": "49000"})
+            write.assert_not_called()
+            for callback in callbacks:
+                callback()
+            history.flush()
+
+        execution, rows = write.call_args.args
+        self.assertEqual(execution["kind"], "update_tp_sl")
+        self.assertEqual([row["status"] for row in rows], ["error"] * 3)  # sem posição aberta
+
+
+@override_settings(TRADING_ORDER_RETRY_BACKOFF=0.01)
+class OrderRetryTests(MockExchangeMixin, SimpleTestCase):
+    def test_lost_response_is_reconciled_not_resent(self):
+        self.server.inject("/v5/order/create", code=10016, after=True)
+
+        order = TradingApi("retry-key", "secret").place_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy", balance=1000)
+
+        self.assertEqual((order["attempts"], order["reconciled"]), (1, True))
+        self.assertEqual(len(self.server.fills), 1)
+        self.assertEqual(self.server.calls["/v5/order/create"], 1)
+
+    @override_settings(TRADING_ORDER_RETRIES=1)
+    def test_gives_up_after_retries(self):
+        self.server.inject("/v5/order/create", code=10016, times=3)
+
+        with self.assertRaisesMessage(RuntimeError, "Internal System Error"):
+            TradingApi("retry-key", "secret").place_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy", balance=1000)
+        self.assertEqual(self.server.calls["/v5/order/create"], 2)
+        self.assertEqual(self.server.fills, [])
+
+    def test_batch_leg_sent_twice_is_reconciled(self):
+        api = TradingApi("retry-key", "secret")
+        legs = [{"symbol": "BTCUSDT", "side": "Buy", "percent": 10, "profit": 2, "max_loss": 1}]
+
+        first = api.place_batch_order_tp_sl(legs, {"BTCUSDT": 5}, 1000, ["leg-0"])
+        again = api.place_batch_order_tp_sl(legs, {"BTCUSDT": 5}, 1000, ["leg-0"])
+
+        self.assertNotIn("error", again[0])
+        self.assertTrue(again[0]["reconciled"])
+        self.assertEqual(again[0]["order_link_id"], first[0]["order_link_id"])
+        self.assertEqual(len(self.server.fills), 1)
+
+
+class RateLimitedTradingApiTests(MockExchangeMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_limiter()
+        self.addCleanup(reset_limiter)
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_order_burst_is_paced_under_uid_limit(self):
+        api = TradingApi("burst-key", "secret")
+        for _ in range(12):
+            api.place_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy", balance=1000)
+
+        self.assertEqual(len(self.server.fills), 12)
+        self.assertEqual(metrics.get("rate_limit_throttled_total", endpoint_class="order"), 2)
+        self.assertGreater(metrics.get("rate_limit_blocked_seconds_total", endpoint_class="order"), 0.1)
+        counters = self.client.get("/trading/metrics/").json()["counters"]
+        self.assertIn('rate_limit_throttled_total{endpoint_class="order"}', counters)
+
+
+class StageTimingTests(MockExchangeMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(sessions.clear)
+        self.addCleanup(book.clear)
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        for i in range(3):
+            user = User.objects.create(username=f"timed-{i}")
+            TradingUser.objects.create(user=user, api_key=f"timed-key-{i}", api_secret="secret")
+            Leverage.objects.create(user=user, symbol="BTCUSDT", leverage=5)
+
+    def place_order(self, query=""):
+        return self.client.post(f"/trading/place-order/{query}", data=json.dumps({
+            "percent": 1, "symbol": "BTCUSDT", "profit": 2, "max_loss": 1, "side": "Buy"
+        }), content_type="application/json").json()
+
+    def test_timing_breakdown_per_account(self):
+        data = self.place_order("?timing=1")
+
+        self.assertEqual(set(data["timing"]["stages_ms"]), {"orm_load", "prewarm", "batch_sizing", "prepare"})
+        self.assertGreater(data["timing"]["total_ms"], 0)
+        for result in data["results"]:
+            stages = result["timing"]["stages_ms"]
+            self.assertTrue({"account", "balance", "sizing", "order_submit"}.issubset(stages))
+            # saldo + ordem; ticker e instrumento vêm do cache aquecido antes do fan-out
+            self.assertEqual(result["timing"]["exchange_calls"], 2)
+        self.assertNotIn("timing", self.place_order()["results"][0])
+
+    def test_histograms_and_error_classes(self):
+        self.server.inject("/v5/order/create", code=110007, message="ab not enough for new order")
+        self.place_order()
+
+        histograms = metrics.histograms()
+        self.assertEqual(histograms['trading_stage_seconds{stage="order_submit"}']["count"], 3)
+        self.assertEqual(histograms['trading_request_seconds{view="place_order"}']["buckets"]["+Inf"], 1)
+        self.assertEqual(metrics.get("bybit_requests_total", endpoint="/v5/order/create", status="200"), 3)
+        self.assertEqual(metrics.get("trading_account_errors_total", view="place_order", error_class="exchange"), 1)
+
+    def test_metrics_endpoint_prometheus_format(self):
+        self.place_order()
+
+        response = self.client.get("/trading/metrics/", HTTP_ACCEPT="text/plain")
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        text = response.content.decode()
+        self.assertIn("# TYPE trading_stage_seconds histogram", text)
+        self.assertIn('trading_request_seconds_bucket{view="place_order",le="+Inf"} 1', text)
+        self.assertIn('trading_request_seconds_count{view="place_order"} 1', text)
+        self.assertIn("histograms", self.client.get("/trading/metrics/").json())
+
+    async def test_async_view_timing(self):
+        response = await self.async_client.get("/trading/async/get-balance/?timing=1")
+        data = json.loads(response.content)
+
+        for result in data["results"]:
+            self.assertIn("balance", result["timing"]["stages_ms"])
+            self.assertEqual(result["timing"]["exchange_calls"], 1)
+        self.assertIn("orm_load", data["timing"]["stages_ms"])
+
+
+class InstrumentRuleTests(MockExchangeMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.server.prices.update({"ETHUSDT": 3000, "XRPUSDT": 0.5})
+        self.server.instruments["ETHUSDT"] = {
+            "priceFilter": {"tickSize": "0.5"}, "lotSizeFilter": {"qtyStep": "0.001", "minNotionalValue": "20"}
+        }
+
+    def test_refresh_pages_through_all_symbols_and_persists(self):
+        with mock.patch("trading.market_data.INSTRUMENTS_PAGE_SIZE", 2):
+            self.assertEqual(instruments.refresh(get_market_data()), 3)
+        self.assertEqual(self.server.calls["/v5/market/instruments-info"], 2)
+        self.assertEqual(InstrumentRule.objects.get(symbol="ETHUSDT").tick_size, Decimal("0.5"))
+
+        # Símbolo deslistado sai da tabela; a tabela do processo vem do banco sem chamar a Bybit
+        del self.server.prices["XRPUSDT"]
+        instruments.refresh(get_market_data())
+        self.assertEqual(set(InstrumentRule.objects.values_list("symbol", flat=True)), {"BTCUSDT", "ETHUSDT"})
+        instruments.clear()
+        instruments.ensure_loaded()
+        self.assertEqual(len(instruments), 2)
+
+    def test_sizing_quantizes_to_tick_size_and_qty_step(self):
+        instruments.refresh(get_market_data())
+        rule = instruments.get("ETHUSDT", get_market_data())
+        # 1000 * 3 * 7% / 3000.3 = 0.06999... -> 0.069 (para baixo); TP 3000.3 * 1.0333 = 3100.31 -> 3100.5
+        qty, tp, sl, amount = calc_tp_sl(1000, 3000.3, rule, 7, 3.333, 1.5, "Buy", leverage=3)
+        self.assertEqual((qty, tp, sl, amount), ("0.069", "3100.5", "2955.5", "207.02"))
+
+    def test_invalid_order_is_rejected_before_any_network_call(self):
+        api = TradingApi("rules-key", "secret")
+        instruments.refresh(get_market_data())
+        self.server.calls.clear()
+
+        # 1000 * 1% = 10 USDT, abaixo do valor mínimo de 20 USDT de ETHUSDT
+        with self.assertRaisesMessage(RuntimeError, "abaixo do mínimo") as raised:
+            api.place_order_tp_sl(1, "ETHUSDT", 2, 1, "Buy", balance=1000)
+        self.assertIsInstance(raised.exception.__cause__.__cause__, InvalidOrderError)
+        self.assertEqual(self.server.calls["/v5/order/create"], 0)
+        self.assertEqual(len(self.server.fills), 0)
+
+
+def sizing_rule(tick_size, qty_step, min_qty, min_notional, max_qty):
+    return InstrumentRule(
+        symbol="TESTUSDT", tick_size=Decimal(tick_size), qty_step=Decimal(qty_step), min_order_qty=Decimal(min_qty),
+        max_order_qty=Decimal(max_qty), max_mkt_order_qty=Decimal(max_qty),
+        min_notional=Decimal(min_notional) if min_notional else None, min_price=Decimal(tick_size),
+    )
+
+money = st.decimals(min_value=0, max_value=10 ** 7, places=2, allow_nan=False).map(float)
+
+
+class BatchSizingTests(SimpleTestCase):
+    def scalar(self, balances, leverages, rule, price, *signal):
+        results = []
+        for balance, leverage in zip(balances, leverages):
+            try:
+                results.append(calc_tp_sl(balance, price, rule, *signal, leverage))
+            except InvalidOrderError as e:
+                results.append(("error", str(e)))
+        return results
+
+    def batch(self, *args):
+        return [("error", str(r)) if isinstance(r, InvalidOrderError) else r for r in size_orders(*args)]
+
+    @hypothesis_settings(max_examples=300, deadline=None)
+    @given(
+        balances=st.lists(money, min_size=1, max_size=40),
+        leverage=st.integers(min_value=1, max_value=125),
+        rule=st.builds(
+            sizing_rule, st.sampled_from(["0.0001", "0.01", "0.5", "5"]),
+            st.sampled_from(["0.001", "0.01", "0.1", "1", "0.0010000000", "10"]),
+            st.sampled_from(["0.001", "0.1", "1", "10"]), st.sampled_from(["", "5", "100"]),
+            st.sampled_from(["50", "1000", "1000000"]),
+        ),
+        price=st.decimals(min_value="0.0001", max_value=200000, places=4, allow_nan=False).map(float),
+        percent=st.sampled_from([0.1, 1, 2.5, 10, 33.3, 100]),
+        profit=st.decimals(min_value="0.1", max_value=50, places=2).map(float),
+        max_loss=st.decimals(min_value="0.1", max_value=99, places=2).map(float),
+        side=st.sampled_from(["Buy", "Sell"]),
+    )
+    def test_matches_scalar_sizing(self, balances, leverage, rule, price, percent, profit, max_loss, side):
+        leverages = [leverage] * len(balances)
+        signal = (percent, profit, max_loss, side)
+        self.assertEqual(self.batch(balances, leverages, rule, price, *signal),
+                         self.scalar(balances, leverages, rule, price, *signal))
+
+    def test_step_boundaries_match_scalar(self):
+        # 10 * 3% / 100 / 0.001 em float64 é 2.9999999999999996: a conta vai para o Decimal e dá 3 steps
+        rule = sizing_rule("0.01", "0.001", "0.001", "", "1000")
+        balances = [10, 9.99, 10.01, 1, 10 ** 7]
+        args = (balances, [1] * len(balances), rule, 100, 3, 2, 1, "Buy")
+        self.assertEqual(self.batch(*args), self.scalar(*args))
+        self.assertEqual(self.batch(*args)[0][0], "0.003")
+        self.assertEqual(self.batch(*args)[-1][0], "error")
+
+
+class SimulationTests(SimpleTestCase):
+    def setUp(self):
+        self.engine = MatchingEngine(prices={"BTCUSDT": 50000}, balance=10000)
+        self.api = SimulatedTradingApi(self.engine, "sim-0")
+
+    def test_order_fills_and_take_profit_realises_pnl(self):
+        order = self.api.place_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy", 1, order_link_id="sig-0")
+
+        self.assertEqual(order["qty"], "0.020")
+        position, = self.engine.positions("sim-0")
+        self.assertEqual((position["side"], position["size"], position["takeProfit"]), ("Buy", "0.02", "51000"))
+        self.assertEqual(self.engine.set_price("BTCUSDT", 50500), [])
+        fired, = self.engine.set_price("BTCUSDT", 51200)
+
+        # Fecha no preço do TP, não no do tick que o atingiu
+        self.assertEqual((fired["kind"], fired["price"], fired["pnl"]), ("tp", Decimal("51000"), Decimal("20.000")))
+        self.assertEqual(self.engine.positions("sim-0"), [])
+        fees = Decimal("0.020") * (50000 + 51000) * TAKER_FEE
+        self.assertEqual(self.engine.accounts["sim-0"]["balance"], 10000 + Decimal(20) - fees)
+
+    def test_duplicate_link_id_is_reconciled(self):
+        first = self.api.place_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy", 1, order_link_id="sig-1")
+        again = self.api.place_order_tp_sl(10, "BTCUSDT", 2, 1, "Buy", 1, order_link_id="sig-1")
+
+        self.assertEqual(again["order_id"], first["order_id"])
+        self.assertEqual(self.engine.positions("sim-0")[0]["size"], "0.02")
+
+    def test_close_and_refused_orders(self):
+        self.api.place_order_tp_sl(10, "BTCUSDT", 2, 1, "Sell", 1, order_link_id="sig-2")
+        self.engine.set_price("BTCUSDT", 49500)
+        closed = self.api.close_order("BTCUSDT", "sig-3")
+
+        self.assertEqual(Decimal(closed["uPnL"]), Decimal("10"))
+        self.assertEqual(self.engine.positions("sim-0"), [])
+        with self.assertRaisesMessage(SimulationError, "reduce-only"):
+            self.engine.submit("sim-0", {"symbol": "BTCUSDT", "side": "Buy", "qty": "0.02", "reduceOnly": True})
+        with self.assertRaisesMessage(RuntimeError, "ab not enough"):
+            self.api.place_order_tp_sl(100, "BTCUSDT", 2, 1, "Buy", 2, order_link_id="sig-5")
+
+    def test_replay_interleaves_prices_and_signals(self):
+        apis = [self.api, SimulatedTradingApi(self.engine, "sim-1", balance=1)]
+        signal = {"percent": 10, "symbol": "BTCUSDT", "profit": 2, "max_loss": 1, "side": "Buy"}
+        report = replay(self.engine, apis, [(2, "sig-6", "place_order", signal)],
+                        [(1, "BTCUSDT", 50000), (3, "BTCUSDT", 49000)])
+
+        self.assertEqual((report["signals"], report["orders"], report["errors"]), (1, 1, 1))
+        self.assertEqual((report["sl_triggers"], report["open_positions"]), (1, 0))
+        self.assertLess(report["realised_pnl"], 0)
+
+
+class DryRunViewTests(MockExchangeMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(dry_run_sessions.reset)
+        for i in range(3):
+            user = User.objects.create(username=f"dry-{i}")
+            TradingUser.objects.create(user=user, api_key=f"dry-key-{i}", api_secret="secret")
+            Leverage.objects.create(user=user, symbol="BTCUSDT", leverage=5)
+
+    def test_dry_run_orders_never_reach_the_exchange(self):
+        data = self.client.post("/trading/place-order/?dry_run=1", data=json.dumps({
+            "percent": 1, "symbol": "BTCUSDT", "profit": 2, "max_loss": 1, "side": "Buy"
+        }), content_type="application/json").json()
+        history.flush()
+
+        self.assertTrue(data["dry_run"])
+        self.assertEqual(data["successful_orders"], 3)
+        self.assertEqual(self.server.calls["/v5/order/create"], 0)
+        self.assertEqual(self.server.calls["/v5/account/wallet-balance"], 0)
+        self.assertFalse(SignalExecution.objects.exists())
+        positions = self.client.get("/trading/get-positions/?dry_run=1").json()
+        self.assertEqual(len(positions["results"]), 3)
+        self.assertEqual(dry_run_sessions.engine.summary()["open_positions"], 3)
+
+    def test_async_dry_run_uses_the_same_simulated_accounts(self):
+        data = self.client.post("/trading/async/place-order/?dry_run=1", data=json.dumps({
+            "percent": 1, "symbol": "BTCUSDT", "profit": 2, "max_loss": 1, "side": "Sell"
+        }), content_type="application/json").json()
+
+        self.assertTrue(data["dry_run"])
+        self.assertEqual(data["successful_orders"], 3)
+        self.assertEqual(self.server.calls["/v5/order/create"], 0)
+        self.assertEqual([p["side"] for p in dry_run_sessions.engine.positions(f"user-{TradingUser.objects.first().pk}")], ["Sell"])
+
+    def test_async_dry_run_reads_market_data_off_the_event_loop(self):
+        market_data = dry_run_sessions.engine.market_data
+        get_ticker, on_loop = market_data.get_ticker, []
+
+        def ticker(symbol):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(symbol)
+            except RuntimeError:
+                pass
+            return get_ticker(symbol)
+
+        with mock.patch.object(market_data, "get_ticker", side_effect=ticker) as patched:
+            data = self.client.post("/trading/async/place-order/?dry_run=1", data=json.dumps({
+                "percent": 1, "symbol": "BTCUSDT", "profit": 2, "max_loss": 1, "side": "Buy"
+            }), content_type="application/json").json()
+
+        self.assertEqual(data["successful_orders"], 3)
+        self.assertTrue(patched.called)
+        self.assertEqual(on_loop, [])
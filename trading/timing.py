@@ -0,0 +1,196 @@
+import contextvars
+import functools
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import httpx
+import requests
+from asgiref.sync import iscoroutinefunction
+from django.core.exceptions import ObjectDoesNotExist
+from pybit.exceptions import FailedRequestError, InvalidRequestError
+
+from .executor import AccountTimeoutError
+from .metrics import metrics
+from .rate_limit import RateLimitExceeded
+
+# Tempos do request (thread do request) ou da conta (thread do pool / task asyncio) atual
+_current = contextvars.ContextVar("trading_timings", default=None)
+
+
+class Timings():
+    """
+    Tempo gasto em cada etapa (segundos) e chamadas à Bybit de um request ou de uma conta.
+    Etapas que rodam em paralelo (ex: asyncio.gather) somam o tempo de cada uma.
+    """
+    def __init__(self, view: str = "") -> None:
+        self.view = view
+        self.stages = defaultdict(float)
+        self.calls = 0
+        self.started = time.perf_counter()
+
+    def merge(self, other: "Timings") -> None:
+        """Soma as etapas e chamadas de `other` (ex: preparação da ordem feita antes)."""
+        for name, seconds in other.stages.items():
+            self.stages[name] += seconds
+        self.calls += other.calls
+
+    def as_dict(self, total: bool = False) -> dict:
+        """:param total: (bool) Inclui "total_ms", o tempo desde a criação (request inteiro)."""
+        timing = {
+            "stages_ms": {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()},
+            "exchange_calls": self.calls,
+        }
+        if total:
+            timing["total_ms"] = round((time.perf_counter() - self.started) * 1000, 3)
+        return timing
+
+
+def current() -> Timings | None:
+    return _current.get()
+
+
+# ============================================================
+# Mede uma etapa do caminho crítico
+# ============================================================
+@contextmanager
+def stage(name: str):
+    """
+    Mede o bloco como a etapa `name`: vai para o histograma trading_stage_seconds
+    e, se houver, para os Timings do request/conta atual.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe("trading_stage_seconds", elapsed, stage=name)
+        timings = _current.get()
+        if timings is not None:
+            timings.stages[name] += elapsed
+
+
+def timed_task(task, view: str = "", asynchronous: bool | None = None, name: str = "account"):
+    """
+    Envolve `task(account)` (função ou corrotina) para medir cada conta separadamente.
+
+    :param asynchronous: (bool) Se `task` devolve um awaitable (ex: lambda que chama um
+        método async); None decide por iscoroutinefunction(task).
+    :param name: (str) Etapa que mede a tarefa inteira da conta.
+    :return: (tuple) (task envolvida, dict {id(account): Timings}).
+    """
+    by_account = {}
+
+    def start(account):
+        timings = by_account[id(account)] = Timings(view)
+        return _current.set(timings)
+
+    if asynchronous is None:
+        asynchronous = iscoroutinefunction(task)
+    if asynchronous:
+        async def run(account):
+            token = start(account)
+            try:
+                with stage(name):
+                    return await task(account)
+            finally:
+                _current.reset(token)
+    else:
+        def run(account):
+            token = start(account)
+            try:
+                with stage(name):
+                    return task(account)
+            finally:
+                _current.reset(token)
+    return run, by_account
+
+
+def timed_view(view):
+    """
+    Decorator das views de broadcast: mede o request inteiro (trading_request_seconds)
+    e deixa os Timings do request disponíveis para as etapas feitas na thread do request
+    (ex: orm_load) e para o _respond.
+    """
+    name = view.__name__.removesuffix("_view")
+
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            token = _current.set(Timings(name))
+            start = time.perf_counter()
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                metrics.observe("trading_request_seconds", time.perf_counter() - start, view=name)
+                _current.reset(token)
+    else:
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            token = _current.set(Timings(name))
+            start = time.perf_counter()
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                metrics.observe("trading_request_seconds", time.perf_counter() - start, view=name)
+                _current.reset(token)
+    return wrapper
+
+
+# ============================================================
+# Classes de erro por conta
+# ============================================================
+def error_class(error: Exception) -> str:
+    """
+    Classe do erro de uma conta, para o contador trading_account_errors_total.
+    Os erros do TradingApi vêm embrulhados em RuntimeError; vale a causa original.
+    """
+    while error.__cause__ is not None:
+        error = error.__cause__
+    if isinstance(error, RateLimitExceeded) or (
+            isinstance(error, InvalidRequestError) and error.status_code in (10006, 10429)):
+        return "rate_limit"
+    if isinstance(error, InvalidRequestError):
+        return "exchange"
+    if isinstance(error, (AccountTimeoutError, TimeoutError, requests.Timeout, httpx.TimeoutException)):
+        return "timeout"
+    if isinstance(error, (ConnectionError, requests.ConnectionError, httpx.TransportError)):
+        return "connection"
+    if isinstance(error, FailedRequestError):
+        return "http"
+    if isinstance(error, (ValueError, ObjectDoesNotExist)):
+        return "validation"
+    return "other"
+
+
+# ============================================================
+# Contagem e latência das chamadas à Bybit (pybit/requests e httpx)
+# ============================================================
+def _count_call(path: str, status: int, elapsed: float) -> None:
+    metrics.increment("bybit_requests_total", endpoint=path, status=str(status))
+    metrics.observe("bybit_request_seconds", elapsed, endpoint=path)
+    timings = _current.get()
+    if timings is not None:
+        timings.calls += 1
+
+
+def _on_response(response, *args, **kwargs):
+    _count_call(requests.utils.urlparse(response.url).path, response.status_code, response.elapsed.total_seconds())
+
+
+def install(http) -> None:
+    """Conta cada resposta da sessão HTTP do pybit (hook de resposta do requests.Session)."""
+    http.client.hooks["response"].append(_on_response)
+
+
+def httpx_event_hooks() -> dict:
+    """event_hooks de um httpx.AsyncClient que contam cada chamada à Bybit."""
+    async def before(request):
+        request.extensions["trading_started"] = time.perf_counter()
+
+    async def after(response):
+        request = response.request
+        started = request.extensions.get("trading_started", time.perf_counter())
+        _count_call(request.url.path, response.status_code, time.perf_counter() - started)
+
+    return {"request": [before], "response": [after]}
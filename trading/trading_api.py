@@ -1,4 +1,224 @@
+import hashlib
+import random
+import time
+import uuid
+from datetime import datetime as dt, timezone
+from decimal import Decimal
+
+import requests
+from django.conf import settings
+from pybit.exceptions import FailedRequestError, InvalidRequestError
 from pybit.unified_trading import HTTP
+from utils import fast_json
+from . import rate_limit, timing
+from .instruments import CENT, instruments, round_price, round_qty, validate_order
+from .market_data import get_market_data
+from .timing import stage
+
+# ============================================================
+# Converte uma posição da Bybit (REST ou WebSocket) para o formato da API
+# ============================================================
+def format_position(order: dict) -> dict:
+    """
+    Converte um item de posição da Bybit para o formato retornado por get_positions.
+    O stream privado envia entryPrice no lugar de avgPrice.
+
+    :param order: (dict) Posição como vem de get_positions ou do tópico "position".
+    :return: (dict) posição formatada.
+    """
+    return {
+        "leverage": order["leverage"],
+        "side": order["side"],
+        "avg_price": order.get("avgPrice", order.get("entryPrice")),
+        "liq_price": order["liqPrice"],
+        "tp": order["takeProfit"],
+        "sl": order["stopLoss"],
+        "qty": order["size"],
+        "value": order["positionValue"],
+        "rPnL": order["curRealisedPnl"],
+        "uPnL": order["unrealisedPnl"],
+        "market_price": order["markPrice"]
+    }
+
+# ============================================================
+# Calcula tamanho do lote, TP e SL a partir de saldo e preço
+# ============================================================
+def _dec(value) -> Decimal:
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+def calc_tp_sl(balance: float, price: float, rule, percent: float,
+               profit: float, max_loss: float, side: str, leverage: int = 1) -> tuple:
+    """
+    Calcula quantidade, TP, SL e valor da ordem sem acessar a API, em Decimal: a
+    quantidade é arredondada para baixo no qtyStep e TP/SL para o tickSize do símbolo.
+
+    :param balance: (float) Saldo USDT da conta.
+    :param price: (float) Preço atual do símbolo.
+    :param rule: (InstrumentRule) Regras do símbolo (ver trading/instruments.py).
+    :return: (tuple) (qty, tp, sl, order_amount) em formato string.
+    :raises InvalidOrderError: se a ordem não passa nas regras do instrumento.
+    """
+    price = _dec(price)
+    qty = round_qty(rule, _dec(balance) * _dec(leverage) * _dec(percent) / 100 / price)
+    tp, sl = tp_sl_prices(rule, price, profit, max_loss, side)
+    validate_order(rule, qty, price, tp, sl)
+
+    return f"{qty:f}", f"{tp:f}", f"{sl:f}", f"{(qty * price).quantize(CENT):f}"
+
+def tp_sl_prices(rule, price: Decimal, profit: float, max_loss: float, side: str) -> tuple:
+    """
+    :return: (tuple) (tp, sl) em Decimal, no tickSize do símbolo; iguais para todas as contas.
+    """
+    if side.lower() == "buy":
+        return (round_price(rule, price * (1 + _dec(profit) / 100)),
+                round_price(rule, price * (1 - _dec(max_loss) / 100)))
+    # "Sell"
+    return (round_price(rule, price * (1 - _dec(profit) / 100)),
+            round_price(rule, price * (1 + _dec(max_loss) / 100)))
+
+# ============================================================
+# Ordens idempotentes: orderLinkId determinístico e retries seguros
+# ============================================================
+DUPLICATE_ORDER_LINK_ID = 110072  # "OrderLinkedID is duplicate": a ordem já existe
+# Timeout interno, assinatura fora do recv_window, limite de requisições, erro interno e
+# sobrecarga da Bybit; toda nova tentativa é assinada de novo
+RETRYABLE_CODES = {10000, 10002, 10006, 10016, 10429}
+
+def order_link_id(signal_id: str, account_id, leg: int | str | None = None) -> str:
+    """
+    orderLinkId determinístico de (sinal, conta[, perna]): reenviar o mesmo sinal gera
+    o mesmo id, e a Bybit recusa a segunda ordem em vez de dobrar a posição.
+    A perna é o índice da perna de um sinal em lote ou o símbolo no close_all.
+
+    :return: (str) 32 caracteres hexadecimais (a Bybit aceita até 36).
+    """
+    key = f"{signal_id}:{account_id}" if leg is None else f"{signal_id}:{account_id}:{leg}"
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+def is_duplicate_order(error: Exception) -> bool:
+    return isinstance(error, InvalidRequestError) and error.status_code == DUPLICATE_ORDER_LINK_ID
+
+def is_retryable(error: Exception) -> bool:
+    """Falha transitória, em que não se sabe se a ordem chegou: pode ser repetida com o mesmo orderLinkId."""
+    if isinstance(error, InvalidRequestError):
+        return error.status_code in RETRYABLE_CODES
+    return isinstance(error, (FailedRequestError, rate_limit.RateLimitExceeded, requests.RequestException,
+                              ConnectionError, TimeoutError))
+
+def retry_delay(attempt: int) -> float:
+    """Backoff exponencial com jitter total: entre 0 e TRADING_ORDER_RETRY_BACKOFF * 2^attempt segundos."""
+    return random.uniform(0, settings.TRADING_ORDER_RETRY_BACKOFF * 2 ** attempt)
+
+def sent_order(order_id: str | None, link_id: str, attempts: int, reconciled: bool) -> dict:
+    return {"order_id": order_id, "order_link_id": link_id, "attempts": attempts, "reconciled": reconciled}
+
+class PreparedOrder():
+    """
+    Ordem de uma conta já dimensionada, serializada e assinada, pronta para ir ao fio.
+
+    :param order: (dict) Parâmetros da ordem (place_order).
+    :param sized: (dict) qty, tp, sl e order_amount calculados.
+    :param request: Requisição assinada (requests.PreparedRequest ou httpx.Request), ou
+        None para a ordem ser assinada só no envio.
+    """
+    def __init__(self, order: dict, sized: dict, request) -> None:
+        self.order = order
+        self.sized = sized
+        self.request = request
+        self.signed_at = time.monotonic()
+
+    def fresh(self, recv_window: int) -> bool:
+        """True enquanto a assinatura está na primeira metade do recv_window (ms) da Bybit."""
+        return self.request is not None and time.monotonic() - self.signed_at < recv_window / 2000
+
+# Ordens por chamada de place_batch_order (limite da Bybit para linear)
+BATCH_ORDER_LIMIT = 20
+
+# ============================================================
+# Monta a ordem de uma perna de um sinal em lote
+# ============================================================
+def batch_leg_order(leg: dict, balance: float, price: float, rule, leverage: int,
+                    link_id: str | None = None) -> tuple:
+    """
+    Calcula quantidade, TP e SL de uma perna e monta o item de `request` do
+    place_batch_order.
+
+    :param leg: (dict) symbol, side, percent, profit e max_loss da perna.
+    :return: (tuple) (item do request, dict com qty/tp/sl/order_amount).
+    """
+    qty, tp, sl, amount = calc_tp_sl(
+        balance, price, rule, leg["percent"], leg["profit"], leg["max_loss"], leg["side"], leverage
+    )
+    order = {
+        "symbol": leg["symbol"],
+        "side": leg["side"],
+        "orderType": "Market",
+        "qty": qty,
+        "takeProfit": tp,
+        "stopLoss": sl,
+        "timeInForce": "GoodTillCancel",
+    }
+    if link_id is not None:
+        order["orderLinkId"] = link_id
+    return order, {"qty": qty, "tp": tp, "sl": sl, "order_amount": amount}
+
+def batch_chunks(items: list, size: int = BATCH_ORDER_LIMIT):
+    """Divide as ordens em lotes de no máximo `size` itens."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def flatten_orders(positions: dict, link_id=None) -> list:
+    """
+    Uma ordem reduce-only a mercado por posição aberta, no lado oposto e com a
+    quantidade inteira, no formato do `request` do place_batch_order.
+
+    :param positions: (dict) {symbol: posição formatada} (ver format_position).
+    :param link_id: (callable) symbol -> orderLinkId; None usa ids aleatórios.
+    :return: (list) tuplas (index, item do request, posição), como em batch_chunks.
+    """
+    orders = []
+    for index, (symbol, position) in enumerate(positions.items()):
+        orders.append((index, {
+            "symbol": symbol,
+            "side": "Buy" if position["side"].lower() == "sell" else "Sell",
+            "orderType": "Market",
+            "qty": position["qty"],
+            "reduceOnly": True,
+            "orderLinkId": link_id(symbol) if link_id is not None else uuid.uuid4().hex,
+        }, position))
+    return orders
+
+def flatten_results(orders: list, results: list) -> list:
+    """
+    Resultado de cada posição do close_all: a posição fechada (lado e quantidade da
+    posição, como no close_order) com order_id/order_link_id, ou o erro da ordem.
+    """
+    return [
+        {**result, "side": position["side"], "qty": position["qty"]}
+        for (_, _, position), result in zip(orders, results)
+    ]
+
+def batch_leg_results(chunk: list, response: dict) -> list:
+    """
+    Casa cada perna de um lote com o retorno da Bybit: result.list traz os ids e
+    retExtInfo.list o código de cada ordem, na mesma ordem do request.
+
+    :param chunk: (list) tuplas (index, item do request, dict calculado).
+    :return: (list) tuplas (index, resultado da perna).
+    """
+    created = response["result"]["list"]
+    statuses = response["retExtInfo"]["list"]
+    results = []
+    for (index, order, sized), created_order, status in zip(chunk, created, statuses):
+        leg = {"symbol": order["symbol"], "side": order["side"], "order_link_id": order.get("orderLinkId")}
+        if status["code"] == DUPLICATE_ORDER_LINK_ID:
+            # Perna já enviada por um reenvio anterior do mesmo sinal
+            results.append((index, {**leg, **sized, "order_id": created_order.get("orderId") or None, "reconciled": True}))
+        elif status["code"]:
+            results.append((index, {**leg, "error": status["msg"]}))
+        else:
+            results.append((index, {**leg, **sized, "order_id": created_order["orderId"]}))
+    return results
 
 class TradingApi():
     """
@@ -7,14 +227,40 @@ class TradingApi():
     :param api_key: (str) Sua API key gerada na conta da Bybit.
     :param api_secret: (str) Sua API secret gerada na conta da Bybit.
     :param testnet: (bool) Se True, usa o ambiente sandbox/testnet da Bybit.
+    :param timeout: (float) Tempo limite de cada requisição HTTP, em segundos.
+    :param state: (AccountState) Estado local da conta; enquanto o stream privado estiver
+        ativo, saldo e posições são lidos dele em vez de consultar a API.
     """
-    def __init__(self, api_key:str, api_secret:str, demo:bool=False) -> None:
+    def __init__(self, api_key:str, api_secret:str, demo:bool=False, timeout:float=10, state=None) -> None:
         self._session = HTTP(
             testnet=False,
             api_key=api_key,
             api_secret=api_secret,
-            demo=demo
+            demo=demo,
+            timeout=timeout
         )
+        if settings.TRADING_BYBIT_HTTP_URL:
+            self._session.endpoint = settings.TRADING_BYBIT_HTTP_URL
+        if settings.TRADING_RATE_LIMIT:
+            rate_limit.install(self._session)
+        timing.install(self._session)
+        fast_json.install(self._session)
+        self._market_data = get_market_data(demo)
+        self._state = state
+
+    # ============================================================
+    # Abre a conexão com a Bybit (aquecimento da sessão)
+    # ============================================================
+    def ping(self) -> int:
+        """
+        Faz uma chamada leve (server time) para abrir a conexão keep-alive da sessão.
+
+        :return: (int) horário do servidor da Bybit, em segundos.
+        """
+        try:
+            return int(self._session.get_server_time()["result"]["timeSecond"])
+        except Exception as e:
+            raise RuntimeError(f"Erro ao conectar com a Bybit: {e}") from e
 
     # ============================================================
     # Obtém saldo atual em USDT
@@ -22,8 +268,25 @@ class TradingApi():
     def get_usdt_balance(self) -> float:
         """
         Obtém o saldo em USDT da conta (Unified Account).
+        Com o stream privado ativo, o saldo vem do estado local sem chamada à API.
 
         :param session: Sessão HTTP criada pelo get_session().
+        :return: (float) valor do saldo em USDT.
+        """
+        if self._state is not None and self._state.streaming:
+            known = self._state.get_balance()
+            if known is not None:
+                return known[0]
+        with stage("balance"):
+            balance = self._fetch_usdt_balance()
+        if self._state is not None:
+            self._state.set_balance(balance)
+        return balance
+
+    def _fetch_usdt_balance(self) -> float:
+        """
+        Consulta o saldo em USDT na API da Bybit.
+
         :return: (float) valor do saldo em USDT.
         """
         try:
@@ -41,41 +304,41 @@ class TradingApi():
     def _get_symbol_price(self, symbol: str):
         """
         Obtém o último preço (lastPrice) de um instrumento de trading.
+        O ticker vem do cache de mercado compartilhado entre as contas.
 
         :param session: Sessão HTTP autenticada.
         :param symbol: (str) Nome do instrumento, ex: "BTCUSDT".
         :return: (float) último preço (MARKET LAST PRICE).
         """
         try:
-            return float(
-                self._session.get_tickers(category="linear", symbol=symbol)["result"]["list"][0]["lastPrice"]
-            )
+            with stage("ticker"):
+                return float(self._market_data.get_ticker(symbol)["lastPrice"])
         except Exception as e:
             raise RuntimeError(f"Erro ao obter preço de {symbol}: {e}") from e
 
     # ============================================================
-    # Retorna informações do símbolo, como tick_size e qty_step.
+    # Retorna as regras do símbolo (tickSize, qtyStep, limites)
     # ============================================================
     def _get_symbol_info(self, symbol:str):
         """
-        Retorna informações sobre o símbolo, como tick_size e qty_step.
-        
+        Retorna as regras de negociação do símbolo: tickSize, qtyStep, quantidades
+        mínima e máxima e valor mínimo da ordem.
+        As regras vêm da tabela de instrumentos compartilhada entre as contas.
+
         :param symbol: (str) Nome do ativo, ex: "ETHUSDT".
-        :return: (tuple) (tick_size, qty_step) em formato int.
+        :return: (InstrumentRule) regras do símbolo.
         """
         try:
-            symbol_info = self._session.get_instruments_info(category="linear", symbol=symbol)["result"]["list"][0]
-            tick_size = 4
-            qty_step = str(symbol_info["lotSizeFilter"]["qtyStep"]).split(".")
-            qty_step = len(qty_step[1]) if len(qty_step) > 1 else 0
-            return tick_size, qty_step
+            with stage("instrument"):
+                return instruments.get(symbol, self._market_data)
         except Exception as e:
             raise RuntimeError(f"Erro ao obter informações do símbolo {symbol}: {e}") from e
 
     # ============================================================
     # Calcula tamanho do lote, TP e SL com base em % da conta
     # ============================================================
-    def _get_tp_sl(self, percent: float, symbol: str, profit: float, max_loss: float, side: str, leverage:int=1):
+    def _get_tp_sl(self, percent: float, symbol: str, profit: float, max_loss: float, side: str, leverage:int=1,
+                   balance: float | None = None, sized=None):
         """
         Calcula a quantidade de contratos, preço de Take Profit (TP) e Stop Loss (SL).
 
@@ -85,23 +348,21 @@ class TradingApi():
         :param profit: (float) Percentual de lucro desejado (ex: 2 → Take Profit em +2%).
         :param max_loss: (float) Percentual máximo de perda permitido (ex: 1 → Stop Loss em -1%).
         :param side: (str) Direção da ordem, valores aceitos: "Buy" ou "Sell".
+        :param balance: (float) Saldo USDT já conhecido; se None, consulta a carteira.
+        :param sized: Resultado da conta em sizing.size_orders (tupla ou InvalidOrderError), se já calculado.
         :return: (tuple) (qty, tp, sl) em formato string.
         """
         try:
-            balance = self.get_usdt_balance()
+            if sized is not None:
+                if isinstance(sized, Exception):
+                    raise sized
+                return sized
+            if balance is None:
+                balance = self.get_usdt_balance()
             price = self._get_symbol_price(symbol)
-            tick_size, qty_step = self._get_symbol_info(symbol)
-            qty = round(float((balance * leverage * (percent) / 100) / price), qty_step)
-            if qty_step == 0:
-                qty = int(qty)
-            if side.lower() == "buy":
-                tp = round(price * (1 + profit / 100), tick_size)
-                sl = round(price * (1 - max_loss / 100), tick_size)
-            else:  # "Sell"
-                tp = round(price * (1 - profit / 100), tick_size)
-                sl = round(price * (1 + max_loss / 100), tick_size)
-
-            return str(qty), str(tp), str(sl), str(round(qty*price, 2))
+            rule = self._get_symbol_info(symbol)
+            with stage("sizing"):
+                return calc_tp_sl(balance, price, rule, percent, profit, max_loss, side, leverage)
         except Exception as e:
             raise RuntimeError(f"Erro ao calcular TP e SL: {e}") from e
 
@@ -150,11 +411,149 @@ class TradingApi():
         except Exception as e:
             raise RuntimeError(f"Erro ao mudar modo de posição: {e}") from e
 
+    # ============================================================
+    # Envia uma ordem com orderLinkId, repetindo falhas transitórias
+    # ============================================================
+    def _find_order(self, link_id: str) -> dict | None:
+        """Procura a ordem pelo orderLinkId; None se não existir ou se a consulta falhar."""
+        try:
+            orders = self._session.get_open_orders(category="linear", orderLinkId=link_id)["result"]["list"]
+            return orders[0] if orders else None
+        except Exception:
+            return None
+
+    def _send_order(self, prepared: PreparedOrder | None = None, **order) -> dict:
+        """
+        Envia a ordem com orderLinkId e repete falhas transitórias (timeout, erro interno,
+        limite de requisições) com backoff e jitter, até TRADING_ORDER_RETRIES tentativas
+        extras e dentro de TRADING_ORDER_RETRY_DEADLINE segundos.
+
+        Antes de reenviar, procura a ordem pelo orderLinkId: se a tentativa anterior
+        chegou à Bybit, nada é reenviado. Um orderLinkId duplicado significa que a ordem
+        já existe (ex: sinal reenviado) e também conta como sucesso.
+
+        :param prepared: (PreparedOrder) Se a assinatura ainda vale, a primeira tentativa
+            envia a requisição já assinada; as seguintes são assinadas de novo pelo pybit.
+        :return: (dict) order_id, order_link_id, attempts e reconciled.
+        """
+        link_id = order["orderLinkId"]
+        deadline = time.monotonic() + settings.TRADING_ORDER_RETRY_DEADLINE
+        attempt = 1
+        while True:
+            try:
+                if attempt == 1 and prepared is not None and prepared.fresh(self._session.recv_window):
+                    result = self._send_prepared(prepared)["result"]
+                else:
+                    result = self._session.place_order(**order)["result"]
+                return sent_order(result["orderId"], link_id, attempt, False)
+            except Exception as e:
+                if is_duplicate_order(e):
+                    existing = self._find_order(link_id)
+                    return sent_order(existing and existing["orderId"], link_id, attempt, True)
+                delay = retry_delay(attempt - 1)
+                if not is_retryable(e) or attempt > settings.TRADING_ORDER_RETRIES \
+                        or time.monotonic() + delay > deadline:
+                    raise
+            time.sleep(delay)
+            existing = self._find_order(link_id)
+            if existing is not None:
+                return sent_order(existing["orderId"], link_id, attempt, True)
+            attempt += 1
+
+    def _sign_order(self, order: dict) -> requests.PreparedRequest:
+        """
+        Monta a requisição do place_order como o pybit faz (corpo JSON, cabeçalhos
+        X-BAPI-* com a assinatura HMAC), sem enviá-la.
+        """
+        http = self._session
+        payload = http.prepare_payload("POST", http._clean_query(dict(order)))
+        headers = http._prepare_headers(payload, http.recv_window)
+        return http._prepare_request("POST", f"{http.endpoint}/v5/order/create", payload, headers)
+
+    def _send_prepared(self, prepared: PreparedOrder) -> dict:
+        """
+        Envia uma ordem pré-assinada. Com o RateLimiter, a vez é tomada antes de conferir
+        a assinatura: se a espera a deixou velha, a ordem é assinada de novo, em vez de
+        chegar à Bybit fora do recv_window.
+        """
+        http = self._session
+        if not isinstance(http.client, rate_limit.RateLimitedSession):
+            return self._send_signed(prepared.request)
+        http.client.acquire(prepared.request)
+        request = prepared.request if prepared.fresh(http.recv_window) else self._sign_order(prepared.order)
+        return self._send_signed(request, http.client.send_acquired)
+
+    def _send_signed(self, request: requests.PreparedRequest, send=None) -> dict:
+        """
+        Envia uma requisição já assinada pela conexão da sessão e trata a resposta como
+        o pybit: FailedRequestError para HTTP != 200 e InvalidRequestError para retCode != 0.
+
+        :param send: Função de envio; padrão http.client.send.
+        """
+        http = self._session
+        response = (send or http.client.send)(request, timeout=http.timeout)
+        http._check_status_code(response, request.method, request.url, request.body)
+        data = fast_json.loads(response.content)
+        if data.get("retCode"):
+            raise InvalidRequestError(
+                request=f"{request.method} {request.url}: {request.body}", message=data["retMsg"],
+                status_code=data["retCode"], time=dt.now(timezone.utc).strftime("%H:%M:%S"),
+                resp_headers=response.headers
+            )
+        return data
+
     # ============================================================
     # Coloca ordem com TP/SL automáticos calculados
     # ============================================================
+    def prepare_order_tp_sl(self, percent: float, symbol: str, profit: float, max_loss: float, side: str,
+                            leverage: int = 1, balance: float | None = None,
+                            order_link_id: str | None = None, sign: bool = True, sized=None) -> PreparedOrder:
+        """
+        Dimensiona a ordem e deixa a requisição assinada, sem enviá-la (ver send_order).
+        Mesmos parâmetros de place_order_tp_sl.
+
+        :param sign: (bool) Se False, só dimensiona; o pybit assina no envio.
+        :param sized: Resultado da conta em sizing.size_orders; se None, dimensiona aqui.
+
+        :return: (PreparedOrder) ordem pronta para envio.
+        """
+        try:
+            qty, tp, sl, amount = self._get_tp_sl(percent, symbol, profit, max_loss, side, leverage, balance, sized)
+            order = {
+                "category": "linear",
+                "symbol": symbol,
+                "side": side,
+                "orderType": "Market",   # "Market" ou "Limit"
+                "qty": qty,
+                "takeProfit": tp,
+                "stopLoss": sl,
+                "timeInForce": "GoodTillCancel",
+                "orderLinkId": order_link_id or uuid.uuid4().hex,
+            }
+            request = None
+            if sign:
+                with stage("sign"):
+                    request = self._sign_order(order)
+            return PreparedOrder(order, {"qty": qty, "tp": tp, "sl": sl, "order_amount": amount}, request)
+        except Exception as e:
+            raise RuntimeError(f"Erro ao colocar ordem: {e}") from e
+
+    def send_order(self, prepared: PreparedOrder) -> dict:
+        """
+        Envia uma ordem preparada por prepare_order_tp_sl, com os mesmos retries de _send_order.
+
+        :return: (dict) qty, tp, sl, order_amount, order_id, order_link_id, attempts e reconciled.
+        """
+        try:
+            with stage("order_submit"):
+                sent = self._send_order(prepared, **prepared.order)
+            return {**prepared.sized, **sent}
+        except Exception as e:
+            raise RuntimeError(f"Erro ao colocar ordem: {e}") from e
+
     def place_order_tp_sl(self, percent: float, symbol: str,
-                        profit: float, max_loss: float, side: str, leverage: int = 1):
+                        profit: float, max_loss: float, side: str, leverage: int = 1,
+                        balance: float | None = None, order_link_id: str | None = None):
         """
         Cria uma ordem no mercado/limit com Take Profit (TP) e Stop Loss (SL).
 
@@ -165,28 +564,80 @@ class TradingApi():
         :param max_loss: (float) Percentual de Stop Loss.
         :param side: (str) "Buy" para Long / "Sell" para Short.
         :param order_type: (str) Tipo de ordem: "Market" ou "Limit".
+        :param balance: (float) Saldo USDT já conhecido. Com ele, e com preço e instrumento
+            em cache, a única chamada à Bybit é o place_order.
+        :param order_link_id: (str) Id da ordem no cliente (ver order_link_id()); se None,
+            um id aleatório ainda torna os retries desta chamada seguros.
         :return: resposta da API (dict).
         """
+        return self.send_order(
+            self.prepare_order_tp_sl(percent, symbol, profit, max_loss, side, leverage, balance, order_link_id, False)
+        )
+
+    # ============================================================
+    # Coloca várias ordens com TP/SL em lotes (sinal multi-símbolo)
+    # ============================================================
+    def place_batch_order_tp_sl(self, legs: list, leverages: dict, balance: float | None = None,
+                                link_ids: list | None = None) -> list:
+        """
+        Cria uma ordem a mercado com TP/SL para cada perna, enviando-as pelo
+        place_batch_order em lotes de BATCH_ORDER_LIMIT.
+
+        Uma perna que falha (sem alavancagem, erro de cálculo ou recusada pela Bybit)
+        não impede as outras; o erro fica no resultado dela.
+
+        :param legs: (list) dicts com symbol, side, percent, profit e max_loss.
+        :param leverages: (dict) Alavancagem da conta por símbolo.
+        :param balance: (float) Saldo USDT já conhecido; se None, consulta a carteira uma vez.
+        :param link_ids: (list) orderLinkId de cada perna; uma perna já enviada antes volta
+            com reconciled=True em vez de ser executada de novo.
+        :return: (list) um dict por perna, na ordem recebida: symbol, side e
+            qty/tp/sl/order_amount/order_id, ou error.
+        """
         try:
-            qty, tp, sl, amount = self._get_tp_sl(percent, symbol, profit, max_loss, side, leverage)
-            self._session.place_order(
-                    category="linear",
-                    symbol=symbol,
-                    side=side,
-                    orderType="Market",   # "Market" ou "Limit"
-                    qty=qty,
-                    takeProfit=tp,
-                    stopLoss=sl,
-                    timeInForce="GoodTillCancel",
-                )
-            return {
-                "qty": qty,
-                "tp": tp,
-                "sl": sl,
-                "order_amount": amount
-            }
+            if balance is None:
+                balance = self.get_usdt_balance()
         except Exception as e:
-            raise RuntimeError(f"Erro ao colocar ordem: {e}") from e
+            raise RuntimeError(f"Erro ao colocar ordens em lote: {e}") from e
+
+        results = [None] * len(legs)
+        orders = []
+        for index, leg in enumerate(legs):
+            try:
+                if leg["symbol"] not in leverages:
+                    raise ValueError("Leverage matching query does not exist.")
+                price = self._get_symbol_price(leg["symbol"])
+                rule = self._get_symbol_info(leg["symbol"])
+                order, sized = batch_leg_order(
+                    leg, balance, price, rule, leverages[leg["symbol"]], link_ids and link_ids[index]
+                )
+                orders.append((index, order, sized))
+            except Exception as e:
+                results[index] = {"symbol": leg["symbol"], "side": leg["side"], "error": str(e)}
+
+        self._send_batch(orders, results, "Erro ao colocar ordens em lote")
+        return results
+
+    def _send_batch(self, orders: list, results: list, error: str) -> None:
+        """
+        Envia as ordens pelo place_batch_order em lotes de BATCH_ORDER_LIMIT e grava o
+        resultado de cada uma em results[index]. Um lote que falha inteiro marca todas
+        as suas ordens com `error` e a causa.
+
+        :param orders: (list) tuplas (index, item do request, dados devolvidos no sucesso).
+        """
+        for chunk in batch_chunks(orders):
+            try:
+                with stage("order_submit"):
+                    response = self._session.place_batch_order(
+                        category="linear",
+                        request=[order for _, order, _ in chunk]
+                    )
+                for index, result in batch_leg_results(chunk, response):
+                    results[index] = result
+            except Exception as e:
+                for index, order, _ in chunk:
+                    results[index] = {"symbol": order["symbol"], "side": order["side"], "error": f"{error}: {e}"}
 
     # ============================================================
     # Retorna informações sobre posições abertas
@@ -198,57 +649,95 @@ class TradingApi():
         :return: A dictionary containing position details.
         """
         try:
-            orders = self._session.get_positions(category="linear", settleCoin="USDT")["result"]["list"]
-            # print(orders)
-            positions = {}
-            for order in orders:
-                if order["side"]:
-                    positions[order["symbol"]] = {
-                    "leverage": order["leverage"],
-                    "side": order["side"],
-                    "avg_price": order["avgPrice"],
-                    "liq_price": order["liqPrice"],
-                    "tp": order["takeProfit"],
-                    "sl": order["stopLoss"],
-                    "qty": order["size"],
-                    "value": order["positionValue"],
-                    "rPnL": order["curRealisedPnl"],
-                    "uPnL": order["unrealisedPnl"],
-                    "market_price": order["markPrice"]
-                }
+            positions = self._positions()
             if not positions:
                 return "Não há posições abertas."
             return positions
         except Exception as e:
             raise RuntimeError(f"Erro ao obter posições: {e}") from e
+
+    def _positions(self) -> dict:
+        """
+        Posições abertas por símbolo: do estado local se o stream privado estiver
+        ativo, senão consultando a API (e guardando o resultado no estado local).
+
+        :return: (dict) {symbol: posição formatada}.
+        """
+        if self._state is not None and self._state.streaming:
+            return self._state.get_positions()
+        positions = self._fetch_positions()
+        if self._state is not None and not self._state.streaming:
+            self._state.set_positions(positions)  # snapshot para leituras servidas do cache
+        return positions
+
+    def _fetch_positions(self) -> dict:
+        """
+        Consulta as posições lineares em USDT na API da Bybit.
+
+        :return: (dict) {symbol: posição formatada}.
+        """
+        orders = self._session.get_positions(category="linear", settleCoin="USDT")["result"]["list"]
+        return {order["symbol"]: format_position(order) for order in orders if order["side"]}
+
     # ============================================================
     # Fecha ordem/posição aberta existente
     # ============================================================
-    def close_order(self, symbol:str):
+    def close_order(self, symbol:str, order_link_id: str | None = None):
         """
         Fecha posição atual de um determinado símbolo enviando ordem oposta.
+        Com o stream privado ativo, o tamanho da posição vem do estado local e a única
+        chamada à API é a ordem reduce-only.
 
         :param session: Sessão HTTP autenticada.
         :param symbol: (str) Ativo, ex: "BTCUSDT".
-        :return: resposta da API (dict).
+        :param order_link_id: (str) Id da ordem reduce-only no cliente (ver order_link_id()).
+        :return: (dict) posição fechada, com order_id/order_link_id da ordem reduce-only.
         """
         try:
-            order = self.get_positions().get(symbol, False)
+            with stage("positions"):
+                order = self._positions().get(symbol, False)
             if not order:
                 raise ValueError(f"Não há posição para {symbol}")
             order_side = "Buy" if order["side"].lower() == "sell" else "Sell"
-            self._session.place_order(
-                category="linear",
-                symbol=symbol,
-                side=order_side,
-                orderType="Market",
-                qty=order["qty"],
-                reduceOnly=True
-            )
-            return order
+            with stage("order_submit"):
+                sent = self._send_order(
+                    category="linear",
+                    symbol=symbol,
+                    side=order_side,
+                    orderType="Market",
+                    qty=order["qty"],
+                    reduceOnly=True,
+                    orderLinkId=order_link_id or uuid.uuid4().hex
+                )
+            return {**order, **sent}
         except Exception as e:
             raise RuntimeError(f"Erro ao fechar ordem: {e}") from e
 
+    # ============================================================
+    # Fecha todas as posições abertas da conta (panic / flatten)
+    # ============================================================
+    def close_all(self, link_id=None) -> list:
+        """
+        Fecha todas as posições abertas com uma leitura de posições e ordens
+        reduce-only a mercado enviadas juntas pelo place_batch_order (uma chamada para
+        até BATCH_ORDER_LIMIT posições). Uma posição recusada não impede as outras.
+
+        :param link_id: (callable) symbol -> orderLinkId da ordem de fechamento (ver
+            order_link_id); reenviar o mesmo sinal reconcilia em vez de fechar de novo.
+        :return: (list) um dict por posição: a posição fechada com order_id e
+            order_link_id, ou symbol/side/qty e error. Lista vazia sem posições.
+        """
+        try:
+            with stage("positions"):
+                positions = self._positions()
+        except Exception as e:
+            raise RuntimeError(f"Erro ao fechar posições: {e}") from e
+
+        orders = flatten_orders(positions, link_id)
+        results = [None] * len(orders)
+        self._send_batch(orders, results, "Erro ao fechar posições")
+        return flatten_results(orders, results)
+
     # ============================================================
     # Muda o take profit e stop loss para uma posição aberta
     # ============================================================
@@ -261,13 +750,14 @@ class TradingApi():
         :return: resposta da API (dict).
         """
         try:
-            return self._session.set_trading_stop(
-                category="linear",
-                symbol=symbol,
-                takeProfit=tp,
-                stopLoss=sl,
-                tpTriggerBy="LastPrice",
-                slTriggerBy="LastPrice"
-            )
+            with stage("tp_sl_submit"):
+                return self._session.set_trading_stop(
+                    category="linear",
+                    symbol=symbol,
+                    takeProfit=tp,
+                    stopLoss=sl,
+                    tpTriggerBy="LastPrice",
+                    slTriggerBy="LastPrice"
+                )
         except Exception as e:
             raise RuntimeError(f"Erro ao configurar TP e SL: {e}") from e
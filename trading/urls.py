@@ -1,12 +1,31 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('get-balance/', views.get_balance_view, name='get_balance'),
     path('place-order/', views.place_order_view, name='place_order'),
+    path('place-batch-order/', views.place_batch_order_view, name='place_batch_order'),
     path('close-order/', views.close_order_view, name='close_order'),
+    path('close-all/', views.close_all_view, name='close_all'),
     path('switch-position-mode/', views.switch_position_mode_view, name='switch_position_mode'),
     path('set-leverage/', views.set_leverage_view, name='set_leverage'),
     path('update-tp-sl/', views.update_tp_sl_view, name='update_tp_sl'),
-    path('get-positions/', views.get_positions_view, name='get_positions')
+    path('get-positions/', views.get_positions_view, name='get_positions'),
+    path('exposure/', views.exposure_view, name='exposure'),
+    path('metrics/', views.metrics_view, name='metrics'),
+
+    # Sinais em segundo plano: respondem com o id do job, executado pelo run_signal_worker
+    path('jobs/place-order/', views.place_order_job_view, name='place_order_job'),
+    path('jobs/close-order/', views.close_order_job_view, name='close_order_job'),
+    path('jobs/<int:job_id>/', views.signal_job_view, name='signal_job'),
+
+    # Versões assíncronas (ASGI)
+    path('async/get-balance/', async_views.get_balance_view, name='async_get_balance'),
+    path('async/place-order/', async_views.place_order_view, name='async_place_order'),
+    path('async/place-batch-order/', async_views.place_batch_order_view, name='async_place_batch_order'),
+    path('async/close-order/', async_views.close_order_view, name='async_close_order'),
+    path('async/close-all/', async_views.close_all_view, name='async_close_all'),
+    path('async/set-leverage/', async_views.set_leverage_view, name='async_set_leverage'),
+    path('async/update-tp-sl/', async_views.update_tp_sl_view, name='async_update_tp_sl'),
+    path('async/get-positions/', async_views.get_positions_view, name='async_get_positions'),
 ]
@@ -1,109 +1,625 @@
 # pylint: disable=no-member, unreachable
 
-from django.http import JsonResponse
+import time
+import uuid
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
-from utils.request_methods import post
-from .models import TradingUser, Leverage
-from .trading_api import TradingApi
+from utils.fast_json import JsonResponse, dumps
+from utils.request_methods import post, request_json
+from .account_state import book
+from .executor import check_deadline, fan_out, iter_fan_out, reads_saturated
+from .history import order_row, record
+from .instruments import instruments
+from .jobs import JOB_KINDS, enqueue_signal, job_progress
+from .market_data import get_market_data
+from .metrics import metrics
+from .models import TradingUser, Leverage, Order, SignalJob, SignalTask
+from .read_cache import etag, invalidate, max_age, not_modified, read_cache, snapshot
+from .sessions import sessions
+from .shards import ShardTask, shards
+from .simulation import dry_run_sessions
+from .sizing import size_orders
+from .timing import current, error_class, stage, timed_task, timed_view
+from .trading_api import order_link_id
 
-def get_balance_view(request):
-    if request.method != "GET":
-        return JsonResponse({"status": "error", "message": "Only GET allowed"}, status=405)
+# Formatos de streaming aceitos em ?stream= (ou pelo header Accept)
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _respond(request, users, task, on_success=None, entry=None, on_complete=None, lane="write", deadline=None,
+             conditional=False):
+    """
+    Roda `task(user)` em paralelo para todas as contas e monta a resposta no formato
+    padrão das views. `on_success(user, value)` devolve os campos extras de um
+    resultado bem sucedido; `entry(user, value, error)` substitui o formato inteiro.
+
+    Sem streaming, responde um único JSON com todas as contas, na ordem das contas.
+    Com ?stream=ndjson ou ?stream=sse, cada conta é enviada assim que termina e o
+    último registro é o resumo (status "completed").
+
+    `on_complete(outcomes)` recebe a lista de (user, entry) depois da última conta,
+    ainda na thread do request (pode acessar o banco). `lane` é a lane do fan-out
+    (ver executor.get_lane) e `deadline` o prazo total (padrão TRADING_BROADCAST_DEADLINE).
+
+    Com ?timing=1, cada conta e o resumo levam o "timing" (ver _instrument).
+    Em dry-run (ver _dry_run) `on_complete` não roda: nada vai para o histórico nem para o banco.
+
+    Com `conditional`, `task` devolve um read_cache.Snapshot e a resposta JSON leva um
+    ETag; se o If-None-Match do cliente for o mesmo, responde 304 sem montar o corpo.
+    As views de ordens (lane "write") descartam as leituras em cache das contas.
+
+    `task` também pode ser um ShardTask (ver _sharded): as contas rodam nos processos do
+    ShardPool e a resposta sai igual, só sem o "timing" por conta.
+    """
+    if entry is None:
+        entry = lambda user, value, error: _entry(user, value, error, on_success)
+    shard = task if isinstance(task, ShardTask) else None
+    task, entry, timings = _instrument(request, task, entry)
+    stream = _stream_format(request)
+    dry_run = _dry_run(request)
+    if dry_run:
+        on_complete = None
+
+    if stream is None:
+        if shard is not None:
+            outcomes = shards.fan_out(users, shard, deadline)
+        else:
+            outcomes = fan_out(users, task, deadline=deadline, lane=lane)
+        if lane == "write":
+            invalidate(users)
+        tag = etag(outcomes) if conditional and timings is None else None
+        if tag is not None and not_modified(request, tag):
+            return _not_modified(tag)
+        result = [entry(user, value, error) for user, value, error in outcomes]
+        if on_complete is not None:
+            on_complete(list(zip(users, result)))
+        response = _completed(users, result, timings, dry_run)
+        if tag is not None:
+            response["ETag"] = tag
+        return response
+
+    def content():
+        outcomes = []
+        results = shards.iter_fan_out(users, shard, deadline) if shard is not None else \
+            iter_fan_out(users, task, deadline=deadline, lane=lane)
+        for user, value, error in results:
+            outcomes.append((user, entry(user, value, error)))
+            yield _encode_record(stream, "result", outcomes[-1][1])
+        if lane == "write":
+            invalidate(users)
+        if on_complete is not None:
+            on_complete(outcomes)
+        yield _encode_record(stream, "completed", _summary(users, [r for _, r in outcomes], timings, dry_run))
+
+    return _streaming_response(stream, content())
+
+def _not_modified(tag):
+    response = HttpResponseNotModified()
+    response["ETag"] = tag
+    return response
+
+def _snapshot_entry(entry, started):
+    """
+    Entrada de uma leitura com cache: `entry` recebe o valor do Snapshot, e leituras que
+    não foram buscadas por este request levam "cached_age" (segundos).
+    """
+    def snapshot_entry(user, value, error):
+        result = entry(user, None if value is None else value.value, error)
+        if value is not None and value.at < started:
+            result["cached_age"] = round(value.age(), 3)
+        return result
+    return snapshot_entry
+
+def _read_lane(cache, kind, users, ttl):
+    """Sem fan-out quando todas as contas estão no cache; senão a lane de leitura."""
+    return None if cache is not None and cache.all_fresh(kind, users, ttl) else "read"
+
+def _instrument(request, task, entry, asynchronous=False):
+    """
+    Mede cada conta por etapa (ver trading/timing.py) e conta os erros por classe em
+    trading_account_errors_total. Com ?timing=1, cada registro leva o "timing" da conta.
+
+    :return: (tuple) (task medida, entry medido, Timings do request se ?timing=1, senão None).
+    """
+    timings = current()
+    view = timings.view if timings is not None else ""
+    task, by_account = timed_task(task, view, asynchronous)
+    detailed = request.GET.get("timing") in ("1", "true")
+
+    def timed_entry(user, value, error):
+        if error is not None:
+            metrics.increment("trading_account_errors_total", view=view, error_class=error_class(error))
+        result = entry(user, value, error)
+        if detailed and id(user) in by_account:
+            result["timing"] = by_account[id(user)].as_dict()
+        return result
+
+    return task, timed_entry, timings if detailed else None
+
+def _dry_run(request):
+    """
+    Dry-run (?dry_run=1 ou TRADING_DRY_RUN): as contas operam no MatchingEngine de
+    trading/simulation.py, com preços e regras reais, sem enviar nada à Bybit.
+    """
+    return settings.TRADING_DRY_RUN or request.GET.get("dry_run") in ("1", "true")
+
+def _sharded(request):
+    """Sinais de ordens nos processos do ShardPool (TRADING_SHARDS), exceto em dry-run."""
+    return shards.enabled() and not _dry_run(request)
+
+def _registry(request):
+    """Sessões das contas: as da Bybit ou, em dry-run, as simuladas."""
+    return dry_run_sessions if _dry_run(request) else sessions
+
+def _stream_format(request):
+    """Formato de streaming pedido pelo cliente, ou None para a resposta JSON única."""
+    requested = request.GET.get("stream")
+    if requested in STREAM_FORMATS:
+        return requested
+    accept = request.headers.get("Accept", "")
+    for stream, content_type in STREAM_FORMATS.items():
+        if content_type in accept:
+            return stream
+    return None
+
+def _encode_record(stream, event, record):
+    data = dumps(record).decode()
+    if stream == "sse":
+        return f"event: {event}\ndata: {data}\n\n"
+    return data + "\n"
+
+def _streaming_response(stream, content):
+    response = StreamingHttpResponse(content, content_type=STREAM_FORMATS[stream])
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # o nginx não deve segurar os registros
+    return response
+
+def _entry(user, value, error, on_success):
+    if error is None:
+        return {
+            "user": user.user.username,
+            "status": "success",
+            **on_success(user, value)
+        }
+    return {
+        "user": user.user.username,
+        "status": "error",
+        "message": str(error)
+    }
+
+def _balance_entry(user, balance, error):
+    entry = {
+        "id": user.id,
+        "username": user.user.username,   # pega username do User
+        "is_active": user.is_active,
+        "demo": user.demo,
+    }
+    if error is None:
+        entry["saldo"] = balance
+    else:
+        entry["error"] = str(error)
+    return entry
+
+class ReadShedError(RuntimeError):
+    """Leitura recusada: o servidor está ocupado com ordens e não há valor em cache."""
+
+def _cached_balance(user):
+    known = book.get_balance(user.pk)
+    if known is None:
+        raise ReadShedError("Servidor ocupado com ordens e saldo sem cache; tente novamente.")
+    return known
+
+def _cached_balance_entry(user, known, error):
+    entry = _balance_entry(user, None if known is None else known[0], error)
+    if known is not None:
+        entry["cached_age"] = round(known[1], 3)
+    return entry
+
+def _cached_positions(user):
+    known = book.get_positions(user.pk)
+    if known is None:
+        raise ReadShedError("Servidor ocupado com ordens e posições sem cache; tente novamente.")
+    return known
 
-    users = TradingUser.objects.all()
-    result = []
+def _cached_positions_success(user, known):
+    return {"message": known[0] or "Não há posições abertas.", "cached_age": round(known[1], 3)}
 
-    for user in users:
-        session = TradingApi(user.api_key, user.api_secret, user.demo)
+def _save_leverages(outcomes, symbol, leverage):
+    """Grava em lote a alavancagem das contas que aceitaram a mudança."""
+    updated = {user.user_id for user, r in outcomes if r["status"] == "success"}
+    existing = {obj.user_id: obj for obj in Leverage.objects.filter(symbol=symbol, user_id__in=updated)}
+    now = timezone.now()
+    for obj in existing.values():
+        obj.leverage = leverage
+        obj.updated_at = now
+    Leverage.objects.bulk_update(existing.values(), ["leverage", "updated_at"])
+    Leverage.objects.bulk_create([
+        Leverage(user_id=user_id, symbol=symbol, leverage=leverage)
+        for user_id in updated - existing.keys()
+    ])
 
+def _record_orders(kind, signal_id, params, order_kind, details):
+    """
+    on_complete que envia ao histórico uma linha por conta (ver trading/history.py).
+    `details(entry)` extrai da resposta de sucesso a ordem (ou {"tp", "sl"}).
+    """
+    symbol, side = params["symbol"], params.get("side", "")
+
+    def on_complete(outcomes):
+        record(kind, signal_id, params, symbol, [
+            order_row(user, order_kind, symbol, side, details(entry))
+            if _succeeded(entry) else order_row(user, order_kind, symbol, side, error=entry.get("message"))
+            for user, entry in outcomes
+        ])
+    return on_complete
+
+def _record_batch(signal_id, legs):
+    """on_complete do sinal em lote: uma linha de histórico por perna de cada conta."""
+    def on_complete(outcomes):
+        rows = []
+        for user, entry in outcomes:
+            if "legs" not in entry:
+                rows += [order_row(user, Order.OPEN, leg["symbol"], leg["side"], error=entry.get("message"))
+                         for leg in legs]
+                continue
+            rows += [
+                order_row(user, Order.OPEN, leg["symbol"], leg["side"], None if "error" in leg else leg,
+                          leg.get("error"))
+                for leg in entry["legs"]
+            ]
+        record("place_batch_order", signal_id, {"legs": legs}, "", rows)
+    return on_complete
+
+def _dispatch(users, prepare, send):
+    """
+    Task do _respond para ordens. Com TRADING_PRESIGNED_ORDERS, `prepare(user)` roda para
+    todas as contas antes (dimensiona e assina a ordem) e a task só faz `send(user, preparada)`:
+    as ordens saem juntas, sem o JSON e o HMAC de uma conta atrasando o envio da próxima.
+    Sem, cada conta prepara e envia na mesma tarefa.
+
+    Uma conta que falha na preparação é reportada pela task com o mesmo erro, e as
+    etapas da preparação entram nos tempos da conta (etapa "account_prepare").
+
+    Preparação e envio dividem um único TRADING_BROADCAST_DEADLINE: o envio fica com o
+    tempo que sobrou, e nenhuma conta envia depois do prazo.
+
+    :return: (tuple) (task, prazo restante em segundos, para o `deadline` do _respond).
+    """
+    deadline = settings.TRADING_BROADCAST_DEADLINE
+    if not settings.TRADING_PRESIGNED_ORDERS:
+        return lambda user: send(user, prepare(user)), deadline
+
+    end = time.monotonic() + deadline
+    prepare, timings = _timed_prepare(prepare)
+    with stage("prepare"):
+        prepared = {id(user): (value, error) for user, value, error in fan_out(users, prepare, deadline=deadline)}
+
+    def task(user):
+        _merge_prepare_timings(timings, user)
+        value, error = prepared[id(user)]
+        if error is not None:
+            raise error
+        check_deadline(end, deadline)
+        return send(user, value)
+    return task, max(end - time.monotonic(), 0.0)
+
+def _timed_prepare(prepare, asynchronous=False):
+    request_timings = current()
+    view = request_timings.view if request_timings is not None else ""
+    return timed_task(prepare, view, asynchronous, name="account_prepare")
+
+def _merge_prepare_timings(timings, user):
+    account_timings = current()
+    if account_timings is not None and id(user) in timings:
+        account_timings.merge(timings[id(user)])
+
+def _load_instruments():
+    """Carrega a tabela de regras dos instrumentos do banco (só na primeira vez do processo)."""
+    try:
+        instruments.ensure_loaded()
+    except Exception:
+        pass  # sem tabela, cada símbolo é buscado na Bybit na primeira ordem
+
+def _prewarm_market_data(users, symbols):
+    """Coloca ticker e regras dos instrumentos em cache antes do fan-out."""
+    _load_instruments()
+    for demo in {user.demo for user in users}:
+        for symbol in symbols:
+            try:
+                get_market_data(demo).get_ticker(symbol)
+                instruments.get(symbol, get_market_data(demo))
+            except Exception:
+                pass  # cada conta vai reportar o erro ao tentar de novo
+
+def _known_balance(user):
+    """(saldo, idade) do AccountBook se for recente o bastante, senão (None, 0.0)."""
+    known = book.get_balance(user.pk, settings.TRADING_BALANCE_MAX_AGE)
+    return known if known else (None, 0.0)
+
+def _quotes(users, symbol):
+    """{demo: (preço, InstrumentRule)} do símbolo, dos caches já aquecidos; ambientes com erro ficam de fora."""
+    quotes = {}
+    for demo in {user.demo for user in users}:
         try:
-            balance = session.get_usdt_balance()
-
-            result.append({
-                "id": user.id,
-                "username": user.user.username,   # pega username do User
-                "is_active": user.is_active,
-                "demo": user.demo,
-                "saldo": balance,
-            })
-        except Exception as e:
-            result.append({
-                "id": user.id,
-                "username": user.user.username,
-                "is_active": user.is_active,
-                "demo": user.demo,
-                "error": str(e)
-            })
+            market_data = get_market_data(demo)
+            quotes[demo] = (float(market_data.get_ticker(symbol)["lastPrice"]), instruments.get(symbol, market_data))
+        except Exception:
+            pass  # essas contas dimensionam sozinhas e reportam o erro
+    return quotes
+
+def _presize(users, leverages, quotes, percent, profit, max_loss, side):
+    """
+    Dimensiona de uma vez (sizing.size_orders) as contas com saldo recente no AccountBook.
 
-    return JsonResponse({
+    :param quotes: (dict) {demo: (preço, InstrumentRule)}.
+    :return: (dict) {user.pk: (saldo, idade do saldo, resultado de size_orders)}.
+    """
+    if not settings.TRADING_BATCH_SIZING:
+        return {}
+    presized = {}
+    for demo, (price, rule) in quotes.items():
+        accounts = []
+        for user in users:
+            if user.demo == demo and user.user_id in leverages:
+                balance, age = _known_balance(user)
+                if balance is not None:
+                    accounts.append((user.pk, balance, age, leverages[user.user_id]))
+        if not accounts:
+            continue
+        sized = size_orders([account[1] for account in accounts], [account[3] for account in accounts],
+                            rule, price, percent, profit, max_loss, side)
+        for (pk, balance, age, _), result in zip(accounts, sized):
+            presized[pk] = (balance, age, result)
+    return presized
+
+BATCH_LEG_KEYS = ["symbol", "side", "percent", "profit", "max_loss"]
+
+def _invalid_legs(legs):
+    """Mensagem de erro se `legs` não for uma lista de pernas completas, senão None."""
+    if not isinstance(legs, list) or not legs:
+        return "legs must be a non-empty list"
+    for leg in legs:
+        if not isinstance(leg, dict) or not set(BATCH_LEG_KEYS).issubset(leg):
+            return f"Each leg needs: {BATCH_LEG_KEYS}"
+    return None
+
+def _batch_entry(user, legs, error):
+    if error is not None:
+        return _entry(user, legs, error, None)
+    failed = len([leg for leg in legs if "error" in leg])
+    if not failed:
+        status = "success"
+    elif failed == len(legs):
+        status = "error"
+    else:
+        status = "partial"
+    return {
+        "user": user.user.username,
+        "status": status,
+        "successful_legs": len(legs) - failed,
+        "legs": legs
+    }
+
+def _flatten_entry(user, positions, error):
+    """Resultado de uma conta no close-all: uma entrada por posição, como no _batch_entry."""
+    if error is not None:
+        return _entry(user, positions, error, None)
+    for position in positions:
+        if "uPnL" in position:
+            position["PnL"] = position.pop("uPnL")
+    failed = len([position for position in positions if "error" in position])
+    return {
+        "user": user.user.username,
+        "status": "success" if not failed else "error" if failed == len(positions) else "partial",
+        "closed_positions": len(positions) - failed,
+        "positions": positions
+    }
+
+def _record_flatten(signal_id):
+    """on_complete do close-all: uma linha de histórico por posição de cada conta."""
+    def on_complete(outcomes):
+        rows = []
+        for user, entry in outcomes:
+            if "positions" not in entry:
+                rows.append(order_row(user, Order.CLOSE, "", error=entry.get("message")))
+                continue
+            rows += [order_row(user, Order.CLOSE, position["symbol"], order=position, error=position.get("error"))
+                     for position in entry["positions"]]
+        record("close_all", signal_id, {}, "", rows)
+    return on_complete
+
+def _signal_id(request):
+    """
+    Id do sinal: "signal_id" do corpo, se o cliente mandar, senão um id novo.
+    Reenviar o mesmo signal_id gera os mesmos orderLinkId e não duplica as ordens.
+    """
+    try:
+        signal_id = request_json(request).get("signal_id")
+    except (ValueError, AttributeError):
+        signal_id = None
+    return str(signal_id) if signal_id else uuid.uuid4().hex
+
+def _succeeded(entry):
+    return entry.get("status", "success") == "success" and "error" not in entry
+
+def _summary(users, result, timings=None, dry_run=False):
+    summary = {
         "status": "completed",
-        "results": result,
         "total_users": len(users),
-        "successful_orders": len([r for r in result if not "error" in r])
-    })
+        "successful_orders": len([r for r in result if _succeeded(r)])
+    }
+    if timings is not None:
+        summary["timing"] = timings.as_dict(total=True)
+    if dry_run:
+        summary["dry_run"] = True
+    return summary
+
+def _completed(users, result, timings=None, dry_run=False):
+    summary = _summary(users, result, timings, dry_run)
+    return JsonResponse({"status": summary.pop("status"), "results": result, **summary})
+
+@timed_view
+def get_balance_view(request):
+    if request.method != "GET":
+        return JsonResponse({"status": "error", "message": "Only GET allowed"}, status=405)
+
+    try:
+        ttl = max_age(request)
+    except ValueError as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    with stage("orm_load"):
+        users = list(TradingUser.objects.for_broadcast())
+
+    registry = _registry(request)
+    cache = read_cache if registry is sessions else None
+    lane = _read_lane(cache, "balance", users, ttl)
+    # Com ordens em andamento ou a lane de leitura cheia, responde do AccountBook sem consultar a Bybit
+    if lane is not None and registry is sessions and reads_saturated():
+        metrics.increment("reads_served_from_cache_total", view="get_balance")
+        return _respond(request, users, _cached_balance, entry=_cached_balance_entry, lane=None)
+
+    def task(user):
+        fetch = lambda: registry.get(user).get_usdt_balance()
+        return snapshot(fetch()) if cache is None else cache.get("balance", user, ttl, fetch)
+
+    return _respond(request, users, task, entry=_snapshot_entry(_balance_entry, time.monotonic()), lane=lane,
+                    conditional=True)
 
 @csrf_exempt
+@timed_view
 def place_order_view(request):
     wanted_keys = ["percent", "symbol", "profit", "max_loss", "side"]
     percent, symbol, profit, max_loss, side = post(request, wanted_keys)
-    users = TradingUser.objects.filter(is_active=True)
-    result = []
+    with stage("orm_load"):
+        users = list(TradingUser.objects.for_broadcast().filter(is_active=True))
 
-    for user in users:
-        session = TradingApi(user.api_key, user.api_secret, user.demo)
-        try:
-            leverage = Leverage.objects.get(user=user.user, symbol=symbol)
-            order = session.place_order_tp_sl(percent, symbol, profit, max_loss, side, leverage.leverage)
-            result.append({
-                "user": user.user.username,
-                "status": "success",
-                "message": order
-            })
-        except Exception as e:
-            result.append({
-                "user": user.user.username,
-                "status": "error",
-                "message": str(e)
-            })
+        # Alavancagens são lidas antes do fan-out, em uma única query: as threads do pool não acessam o banco
+        leverages = Leverage.objects.by_user(symbol)
+    signal_id = _signal_id(request)
+    params = {"percent": percent, "symbol": symbol, "profit": profit, "max_loss": max_loss, "side": side}
+    success = lambda user, order: {"message": order}
+    on_complete = _record_orders("place_order", signal_id, params, Order.OPEN, lambda entry: entry["message"])
+    if _sharded(request):
+        # Cada shard aquece preço e regras e dimensiona e assina as próprias contas, com o saldo conhecido aqui
+        return _respond(request, users, ShardTask("place_order", params, signal_id, leverages), success,
+                        on_complete=on_complete)
 
-    return JsonResponse({
-        "status": "completed",
-        "results": result,
-        "total_users": len(users),
-        "successful_orders": len([r for r in result if r["status"] == "success"])
-    })
+    # Com preço, regras do instrumento e saldo já em memória, o caminho crítico de cada conta é só o place_order
+    with stage("prewarm"):
+        _prewarm_market_data(users, [symbol])
+    registry = _registry(request)
+    with stage("batch_sizing"):
+        # Em dry-run cada conta dimensiona com o saldo simulado
+        presized = {} if registry is not sessions else \
+            _presize(users, leverages, _quotes(users, symbol), percent, profit, max_loss, side)
+    known_balance = _known_balance if registry is sessions else lambda user: (None, 0.0)
+
+    def prepare(user):
+        if user.user_id not in leverages:
+            raise Leverage.DoesNotExist("Leverage matching query does not exist.")
+        balance, balance_age, sized = presized.get(user.pk) or (*known_balance(user), None)
+        return balance_age, registry.get(user).prepare_order_tp_sl(
+            percent, symbol, profit, max_loss, side, leverages[user.user_id], balance,
+            order_link_id(signal_id, user.pk), sized=sized
+        )
+
+    def send(user, prepared):
+        balance_age, order = prepared
+        order = registry.get(user).send_order(order)
+        order["balance_age"] = round(balance_age, 3)
+        return order
+
+    task, deadline = _dispatch(users, prepare, send)
+    return _respond(request, users, task, success, on_complete=on_complete, deadline=deadline)
 
 @csrf_exempt
+@timed_view
+def place_batch_order_view(request):
+    wanted_keys = ["legs"]
+    values = post(request, wanted_keys)
+    if isinstance(values, JsonResponse):
+        return values
+    legs = values[0]
+    invalid = _invalid_legs(legs)
+    if invalid:
+        return JsonResponse({"status": "error", "message": invalid}, status=400)
+    symbols = list(dict.fromkeys(leg["symbol"] for leg in legs))
+    with stage("orm_load"):
+        users = list(TradingUser.objects.for_broadcast().filter(is_active=True))
+        leverages = Leverage.objects.by_user_and_symbol(symbols)
+    signal_id = _signal_id(request)
+    if _sharded(request):
+        return _respond(request, users, ShardTask("place_batch_order", {"legs": legs}, signal_id, leverages),
+                        entry=_batch_entry, on_complete=_record_batch(signal_id, legs))
+    with stage("prewarm"):
+        _prewarm_market_data(users, symbols)
+    registry = _registry(request)
+
+    def task(user):
+        known = book.get_balance(user.pk, settings.TRADING_BALANCE_MAX_AGE) if registry is sessions else None
+        balance = known[0] if known else None
+        link_ids = [order_link_id(signal_id, user.pk, leg) for leg in range(len(legs))]
+        return registry.get(user).place_batch_order_tp_sl(legs, leverages.get(user.user_id, {}), balance, link_ids)
+
+    return _respond(request, users, task, entry=_batch_entry, on_complete=_record_batch(signal_id, legs))
+
+@csrf_exempt
+@timed_view
 def close_order_view(request):
     wanted_keys = ["symbol"]
     symbol = post(request, wanted_keys)[0]
 
-    users = TradingUser.objects.filter(is_active=True)
-    result = []
+    with stage("orm_load"):
+        users = list(TradingUser.objects.for_broadcast().filter(is_active=True))
+    signal_id = _signal_id(request)
+    if _sharded(request):
+        task = ShardTask("close_order", {"symbol": symbol}, signal_id)
+    else:
+        registry = _registry(request)
 
-    for user in users:
-        session = TradingApi(user.api_key, user.api_secret, user.demo)
-        try:
-            order = session.close_order(symbol=symbol)
+        def task(user):
+            order = registry.get(user).close_order(symbol=symbol, order_link_id=order_link_id(signal_id, user.pk))
             order["PnL"] = order.pop("uPnL")
-            result.append({
-                "user": user.user.username,
-                "status": "success",
-                "message": "Order closed successfully.",
-                "details": order
-            })
-        except Exception as e:
-            result.append({
-                "user": user.user.username,
-                "status": "error",
-                "message": str(e)
-            })
-    return JsonResponse({
-        "status": "completed",
-        "results": result,
-        "total_users": len(users),
-        "successful_orders": len([r for r in result if r["status"] == "success"])
-    })
+            return order
+
+    return _respond(request, users, task, lambda user, order: {
+        "message": "Order closed successfully.",
+        "details": order
+    }, on_complete=_record_orders("close_order", signal_id, {"symbol": symbol}, Order.CLOSE,
+                                  lambda entry: entry["details"]))
+
+@csrf_exempt
+@timed_view
+def close_all_view(request):
+    """
+    Fecha todas as posições de todas as contas ativas: uma leitura de posições por conta
+    e as ordens reduce-only enviadas em lote (ver TradingApi.close_all), dentro do prazo
+    TRADING_FLATTEN_DEADLINE.
+    """
+    if request.method != "POST":
+        return JsonResponse({"status": "error", "message": "Only POST allowed"}, status=405)
+
+    with stage("orm_load"):
+        users = list(TradingUser.objects.for_broadcast().filter(is_active=True))
+    signal_id = _signal_id(request)
+    if _sharded(request):
+        task = ShardTask("close_all", {}, signal_id)
+    else:
+        registry = _registry(request)
+
+        def task(user):
+            return registry.get(user).close_all(lambda symbol: order_link_id(signal_id, user.pk, symbol))
+
+    return _respond(request, users, task, entry=_flatten_entry, on_complete=_record_flatten(signal_id),
+                    deadline=settings.TRADING_FLATTEN_DEADLINE)
 
 @csrf_exempt
 def switch_position_mode_view(request):
@@ -112,121 +628,176 @@ def switch_position_mode_view(request):
     wanted_keys = ["mode"]
     mode = post(request, wanted_keys)
 
-    users = TradingUser.objects.filter(is_active=True)
-    result = []
+    users = list(TradingUser.objects.for_broadcast().filter(is_active=True))
+    mode_name = "One-Way Mode" if mode == 0 else "Hedge Mode"
 
-    for user in users:
-        session = TradingApi(user.api_key, user.api_secret, user.demo)
-        try:
-            switched = session.switch_position_mode(mode=mode)
-            result.append({
-                "user": user.user.username,
-                "status": "success",
-                "message": f"Position mode switched successfully to {"One-Way Mode" if mode == 0 else "Hedge Mode"}",
-            })
-        except Exception as e:
-            result.append({
-                "user": user.user.username,
-                "status": "error",
-                "message": str(e)
-            })
-    return JsonResponse({
-        "status": "completed",
-        "results": result,
-        "total_users": len(users),
-        "successful_orders": len([r for r in result if r["status"] == "success"])
-    })
+    return _respond(
+        request,
+        users,
+        lambda user: sessions.get(user).switch_position_mode(mode=mode),
+        lambda user, switched: {"message": f"Position mode switched successfully to {mode_name}"}
+    )
 
 @csrf_exempt
+@timed_view
 def set_leverage_view(request):
     wanted_keys = ["leverage", "symbol"]
     leverage, symbol = post(request, wanted_keys)
 
-    users = TradingUser.objects.all()
-    result = []
+    with stage("orm_load"):
+        users = list(TradingUser.objects.for_broadcast())
+    registry = _registry(request)
 
-    for user in users:
-        session = TradingApi(user.api_key, user.api_secret, user.demo)
-        try:
-            session.set_leverage(leverage=leverage, symbol=symbol)
-            Leverage.objects.update_or_create(
-                user = user.user,
-                symbol = symbol,
-                defaults = {"leverage": leverage}
-            )
-            result.append({
-                "user": user.user.username,
-                "status": "success",
-                "message": f"Leverage successfully set to {leverage} for symbol {symbol}",
-            })
-        except Exception as e:
-            result.append({
-                "user": user.user.username,
-                "status": "error",
-                "message": str(e)
-            })
-    return JsonResponse({
-        "status": "completed",
-        "results": result,
-        "total_users": len(users),
-        "successful_orders": len([r for r in result if r["status"] == "success"])
-    })
+    return _respond(
+        request,
+        users,
+        lambda user: registry.get(user).set_leverage(leverage=leverage, symbol=symbol),
+        lambda user, response: {"message": f"Leverage successfully set to {leverage} for symbol {symbol}"},
+        on_complete=lambda outcomes: _save_leverages(outcomes, symbol, leverage)
+    )
 
 @csrf_exempt
+@timed_view
 def update_tp_sl_view(request):
     wanted_keys = ["symbol", "tp", "sl"]
     symbol, tp, sl = post(request, wanted_keys)
 
-    users = TradingUser.objects.filter(is_active=True)
-    result = []
+    with stage("orm_load"):
+        users = list(TradingUser.objects.for_broadcast().filter(is_active=True))
+    registry = _registry(request)
 
-    for user in users:
-        session = TradingApi(user.api_key, user.api_secret, user.demo)
-        try:
-            session.change_tp_sl(symbol=symbol, tp=tp, sl=sl)
-            result.append({
-                "user": user.user.username,
-                "status": "success",
-                "message": f"TP/SL successfully updated to TP: {tp}, SL: {sl} for symbol {symbol}",
-            })
-        except Exception as e:
-            result.append({
-                "user": user.user.username,
-                "status": "error",
-                "message": str(e)
-            })
-    return JsonResponse({
-        "status": "completed",
-        "results": result,
-        "total_users": len(users),
-        "successful_orders": len([r for r in result if r["status"] == "success"])
-    })
+    return _respond(
+        request,
+        users,
+        lambda user: registry.get(user).change_tp_sl(symbol=symbol, tp=tp, sl=sl),
+        lambda user, response: {"message": f"TP/SL successfully updated to TP: {tp}, SL: {sl} for symbol {symbol}"},
+        on_complete=_record_orders("update_tp_sl", _signal_id(request), {"symbol": symbol, "tp": tp, "sl": sl},
+                                   Order.TP_SL, lambda entry: {"tp": tp, "sl": sl})
+    )
 
+@timed_view
 def get_positions_view(request):
     if request.method != "GET":
         return JsonResponse({"status": "error", "message": "Only GET allowed"}, status=405)
 
-    users = TradingUser.objects.all()
-    result = []
+    try:
+        ttl = max_age(request)
+    except ValueError as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    with stage("orm_load"):
+        users = list(TradingUser.objects.for_broadcast())
 
-    for user in users:
-        session = TradingApi(user.api_key, user.api_secret, user.demo)
-        try:
-            position = session.get_positions()
-            result.append({
-                "user": user.user.username,
-                "status": "success",
-                "message": position
-            })
-        except Exception as e:
-            result.append({
-                "user": user.user.username,
-                "status": "error",
-                "message": str(e)
+    registry = _registry(request)
+    cache = read_cache if registry is sessions else None
+    lane = _read_lane(cache, "positions", users, ttl)
+    if lane is not None and registry is sessions and reads_saturated():
+        metrics.increment("reads_served_from_cache_total", view="get_positions")
+        return _respond(request, users, _cached_positions, _cached_positions_success, lane=None)
+
+    def task(user):
+        fetch = lambda: registry.get(user).get_positions()
+        return snapshot(fetch()) if cache is None else cache.get("positions", user, ttl, fetch)
+
+    entry = lambda user, position, error: _entry(user, position, error, lambda user, position: {"message": position})
+    return _respond(request, users, task, entry=_snapshot_entry(entry, time.monotonic()), lane=lane,
+                    conditional=True)
+
+def exposure_view(request):
+    """
+    Exposição agregada por símbolo de todas as contas: contas com posição, quantidade
+    comprada, vendida e líquida, valor bruto e líquido e uPnL. Vem das posições
+    conhecidas no AccountBook (stream privado ou última leitura de posições), somadas
+    de forma incremental: a resposta custa O(símbolos), sem consultar a Bybit.
+    """
+    if request.method != "GET":
+        return JsonResponse({"status": "error", "message": "Only GET allowed"}, status=405)
+    return JsonResponse({"status": "success", **book.exposure.snapshot()})
+
+def metrics_view(request):
+    """
+    Contadores e histogramas do processo. Em JSON por padrão; no formato texto do
+    Prometheus com ?format=prometheus ou Accept: text/plain (o que o scraper envia).
+    """
+    if request.method != "GET":
+        return JsonResponse({"status": "error", "message": "Only GET allowed"}, status=405)
+    accept = request.headers.get("Accept", "")
+    if request.GET.get("format") == "prometheus" or "text/plain" in accept or "openmetrics" in accept:
+        return HttpResponse(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+    return JsonResponse({"counters": metrics.snapshot(), "histograms": metrics.histograms()})
+
+# ============================================================
+# Sinais em segundo plano (fila no banco, ver trading/jobs.py)
+# ============================================================
+# Campos extras de uma tarefa bem sucedida, no mesmo formato das views síncronas
+JOB_SUCCESS = {
+    "place_order": lambda user, order: {"message": order},
+    "close_order": lambda user, order: {"message": "Order closed successfully.", "details": order},
+}
+
+def _task_entry(task, kind):
+    error = task.error if task.status == SignalTask.ERROR else None
+    return _entry(task.account, task.result, error, JOB_SUCCESS[kind])
+
+def _enqueue(request, kind):
+    """Grava o sinal como job e responde na hora com o id e o endereço do progresso."""
+    wanted_keys = JOB_KINDS[kind][0]
+    values = post(request, wanted_keys)
+    if isinstance(values, JsonResponse):
+        return values
+    job, created = enqueue_signal(kind, dict(zip(wanted_keys, values)), _signal_id(request))
+    return JsonResponse(
+        {**job_progress(job), "progress_url": reverse("signal_job", args=[job.pk])},
+        status=202 if created else 200
+    )
+
+@csrf_exempt
+def place_order_job_view(request):
+    return _enqueue(request, "place_order")
+
+@csrf_exempt
+def close_order_job_view(request):
+    return _enqueue(request, "close_order")
+
+def _job_records(stream, job):
+    """
+    Acompanha o job no banco a cada TRADING_JOB_POLL_INTERVAL segundos: envia cada
+    conta assim que termina, o progresso quando muda e, por último, o resumo.
+    """
+    seen, last = set(), None
+    while True:
+        job.refresh_from_db(fields=["status", "finished_at"])
+        finished = set(job.tasks.filter(status__in=SignalTask.FINISHED).values_list("pk", flat=True)) - seen
+        new = sorted(finished)
+        for start in range(0, len(new), 500):
+            chunk = job.tasks.filter(pk__in=new[start:start + 500]).select_related("account__user")
+            for task in chunk:
+                yield _encode_record(stream, "result", _task_entry(task, job.kind))
+        seen |= finished
+
+        progress = job_progress(job)
+        if progress != last:
+            yield _encode_record(stream, "progress", progress)
+            last = progress
+        if job.status == SignalJob.COMPLETED:
+            yield _encode_record(stream, "completed", {
+                "status": "completed",
+                "total_users": job.total_tasks,
+                "successful_orders": progress["tasks"][SignalTask.SUCCESS]
             })
-    return JsonResponse({
-        "status": "completed",
-        "results": result,
-        "total_users": len(users),
-        "successful_orders": len([r for r in result if r["status"] == "success"])
-    })
+            return
+        time.sleep(settings.TRADING_JOB_POLL_INTERVAL)
+
+def signal_job_view(request, job_id):
+    if request.method != "GET":
+        return JsonResponse({"status": "error", "message": "Only GET allowed"}, status=405)
+    try:
+        job = SignalJob.objects.get(pk=job_id)
+    except SignalJob.DoesNotExist:
+        return JsonResponse({"status": "error", "message": "Job not found"}, status=404)
+
+    stream = _stream_format(request)
+    if stream is not None:
+        return _streaming_response(stream, _job_records(stream, job))
+
+    tasks = job.tasks.filter(status__in=SignalTask.FINISHED).select_related("account__user").order_by("pk")
+    return JsonResponse({**job_progress(job), "results": [_task_entry(task, job.kind) for task in tasks]})
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+
+
+class TTLCache:
+    """
+    Cache em memória com tempo de vida por chave e coalescência de requisições
+    (single-flight): chamadas concorrentes para a mesma chave expirada esperam uma
+    única execução de `fetch` em vez de repetirem a busca.
+    """
+    def __init__(self) -> None:
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, key, ttl):
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < ttl:
+            return entry
+        return None
+
+    def get(self, key, ttl: float, fetch):
+        """
+        Retorna o valor da chave se tiver menos de `ttl` segundos, senão chama `fetch()`.
+
+        :param key: Chave do cache.
+        :param ttl: (float) Idade máxima aceita, em segundos.
+        :param fetch: (callable) Função sem argumentos que busca o valor.
+        :return: valor em cache ou recém buscado.
+        """
+        entry = self._fresh(key, ttl)
+        if entry is not None:
+            return entry[1]
+
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            entry = self._fresh(key, ttl)
+            if entry is not None:
+                return entry[1]
+            value = fetch()
+            self._entries[key] = (time.monotonic(), value)
+            return value
+
+    def set(self, key, value) -> None:
+        self._entries[key] = (time.monotonic(), value)
+
+    def fresh(self, key, ttl: float) -> bool:
+        """True se a chave tem valor com menos de `ttl` segundos (get não chamaria fetch)."""
+        return self._fresh(key, ttl) is not None
+
+    def age(self, key) -> float | None:
+        """Idade da entrada em segundos, ou None se a chave não está no cache."""
+        entry = self._entries.get(key)
+        return None if entry is None else time.monotonic() - entry[0]
+
+    def invalidate(self, key=None) -> None:
+        """Remove uma chave, ou todas se `key` for None."""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+
+class AsyncTTLCache:
+    """
+    Versão asyncio do TTLCache: corrotinas concorrentes que pedem a mesma chave
+    expirada aguardam uma única execução de `fetch`. Deve ser usado em um único event loop.
+    """
+    def __init__(self) -> None:
+        self._entries = {}
+        self._inflight = {}
+
+    async def get(self, key, ttl: float, fetch):
+        """
+        Retorna o valor da chave se tiver menos de `ttl` segundos, senão aguarda `fetch()`.
+
+        :param fetch: (callable) Função sem argumentos que retorna uma corrotina.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < ttl:
+            return entry[1]
+        if key not in self._inflight:
+            self._inflight[key] = asyncio.ensure_future(self._load(key, fetch))
+        return await asyncio.shield(self._inflight[key])
+
+    def fresh(self, key, ttl: float) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and time.monotonic() - entry[0] < ttl
+
+    def invalidate(self, key=None) -> None:
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    async def _load(self, key, fetch):
+        try:
+            value = await fetch()
+            self._entries[key] = (time.monotonic(), value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
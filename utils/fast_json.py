@@ -0,0 +1,85 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse as DjangoJsonResponse
+
+try:
+    import orjson
+except ImportError:  # sem orjson, tudo passa pelo json da biblioteca padrão
+    orjson = None
+
+BACKENDS = ("orjson", "json")
+
+_default = DjangoJSONEncoder().default
+# Datetimes passam pelo DjangoJSONEncoder (mesmo formato do JsonResponse); chaves int viram
+# string e tipos do numpy são serializados, como no json da biblioteca padrão
+_ORJSON_OPTIONS = 0 if orjson is None else \
+    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+# ============================================================
+# Codificação JSON com orjson, ou com o json padrão como fallback
+# ============================================================
+def _orjson_dumps(value, sort_keys=False) -> bytes:
+    return orjson.dumps(value, default=_default,
+                        option=(_ORJSON_OPTIONS | orjson.OPT_SORT_KEYS) if sort_keys else _ORJSON_OPTIONS)
+
+def _json_dumps(value, sort_keys=False) -> bytes:
+    return json.dumps(value, cls=DjangoJSONEncoder, sort_keys=sort_keys).encode()
+
+backend = None
+_dumps = _loads = None
+
+
+def dumps(value, sort_keys: bool = False) -> bytes:
+    """Serializa `value` em JSON (bytes UTF-8) com o backend do processo."""
+    return _dumps(value, sort_keys)
+
+def loads(data):
+    """Decodifica JSON (bytes ou str) com o backend do processo."""
+    return _loads(data)
+
+def use(name: str) -> str:
+    """
+    Escolhe o backend de loads/dumps do processo: "orjson" (se instalado) ou "json".
+
+    :param name: (str) Backend pedido (TRADING_JSON_BACKEND).
+    :return: (str) Backend em uso; "json" se o orjson não estiver instalado.
+    """
+    global backend, _dumps, _loads
+    if name not in BACKENDS:
+        raise ValueError(f"Backend JSON inválido: {name} (use um de {BACKENDS})")
+    if name == "orjson" and orjson is not None:
+        backend, _dumps, _loads = "orjson", _orjson_dumps, orjson.loads
+    else:
+        backend, _dumps, _loads = "json", _json_dumps, json.loads
+    return backend
+
+use("orjson")
+
+
+class JsonResponse(DjangoJsonResponse):
+    """
+    JsonResponse do Django codificado pelo backend do módulo: mesmos tipos do
+    DjangoJSONEncoder (Decimal, datetime, UUID), sem espaços entre os campos.
+    """
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError("In order to allow non-dict objects to be serialized set the safe parameter to False.")
+        kwargs.setdefault("content_type", "application/json")
+        HttpResponse.__init__(self, content=dumps(data), **kwargs)
+
+
+# ============================================================
+# Respostas da Bybit decodificadas pelo mesmo backend
+# ============================================================
+def _decode_with_backend(response, *args, **kwargs):
+    response.json = lambda **_: loads(response.content)
+    return response
+
+def install(http) -> None:
+    """
+    Faz o pybit decodificar as respostas da sessão HTTP com `loads` (hook de resposta do
+    requests.Session). Erros do orjson são JSONDecodeError, então o retry do pybit continua igual.
+    """
+    http.client.hooks["response"].append(_decode_with_backend)
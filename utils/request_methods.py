@@ -1,21 +1,30 @@
-import json
-from django.http import JsonResponse
+from utils.fast_json import JsonResponse, loads
+
+def request_json(request):
+    """
+    Corpo JSON do request, decodificado uma única vez: post() e quem mais ler o corpo
+    (ex: o signal_id) usam o mesmo dict.
+
+    :raises ValueError: corpo que não é JSON válido (json.JSONDecodeError ou o do orjson).
+    """
+    if not hasattr(request, "_json_body"):
+        request._json_body = loads(request.body)
+    return request._json_body
 
 def post(request, wanted_keys):  # ✅ Remove type hint ou use list/tuple
     if request.method != "POST":
         return JsonResponse({"status": "error", "message": "Only POST allowed"}, status=405)
     try:
-        request_info = json.loads(request.body.decode('utf-8'))
-    except json.JSONDecodeError as e:
+        request_info = request_json(request)
+    except ValueError as e:
         return JsonResponse({"status": "error", "message": f"Invalid JSON: {str(e)}"}, status=400)
 
-    received_keys = set(request_info.keys())
-    wanted_keys_set = set(wanted_keys)  # ✅ Converte para set apenas para validação
-
-    if not wanted_keys_set.issubset(received_keys):
+    # ✅ Sets só para montar a mensagem de erro
+    if not isinstance(request_info, dict) or any(key not in request_info for key in wanted_keys):
+        received_keys = set(request_info) if isinstance(request_info, dict) else set()
         return JsonResponse({
             "status": "error",
-            "message": f"Missing required keys. Received: {received_keys}, Needed: {wanted_keys_set}"
+            "message": f"Missing required keys. Received: {received_keys}, Needed: {set(wanted_keys)}"
         }, status=400)
 
     return tuple(request_info.get(key) for key in wanted_keys)